@@ -1,195 +1,432 @@
+import time
+# Início da execução do script: base do relatório de inicialização
+_INICIO_SCRIPT = time.perf_counter()
+
 import streamlit as st
-from streamlit_option_menu import option_menu
 import pandas as pd
+import numpy as np
 import datetime
 import os
 import json
-import time
-from fpdf import FPDF
-import base64
+import threading
+import uuid
+import collections
+import contextlib
+import hashlib
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from streamlit.logger import get_logger
 
 # --- Configuração inicial ---
 st.set_page_config(page_title="CVT App", layout="centered", page_icon="⚙️")
+logger = get_logger(__name__)
 
 # --- Constantes e configurações ---
-SHEET_NAME = "CVT_DB"
-CVT_SHEET = "CVT"
-REQ_SHEET = "REQUISICOES"
-USERS_SHEET = "USERS"
-CLIENTES_SHEET = "CLIENTES"
-PECAS_SHEET = "PECAS"
-
-# Arquivos CSV fallback
-CVT_CSV = "cvt_local.csv"
-REQ_CSV = "requisicoes_local.csv"
-USERS_CSV = "users_local.csv"
-CLIENTES_CSV = "clientes_local.csv"
-PECAS_CSV = "pecas_local.csv"
-
-# Colunas das planilhas
-CVT_COLUMNS = [
-    "created_at", "tecnico", "cliente", "endereco", "servico_realizado", 
-    "obs", "pecas_requeridas", "elevador", "status_cvt", "numero_cvt"
-]
+from storage import (
+    SHEET_NAME, CVT_SHEET, REQ_SHEET, USERS_SHEET, CLIENTES_SHEET, PECAS_SHEET,
+    CVT_CSV, REQ_CSV, USERS_CSV, CLIENTES_CSV, PECAS_CSV, SQLITE_DB,
+    CVT_COLUMNS, REQ_COLUMNS, USERS_COLUMNS, CLIENTES_COLUMNS, PECAS_COLUMNS,
+    TABELAS, CSVStorage, SQLiteStorage, MemoryStorage, SheetsStorage,
+    AlocadorNumeros, OUTBOX_DB, Outbox, StorageComOutbox,
+    tipar_tabela, concatenar_tipado, unir_tipados,
+)
+from pdf_cvt import gerar_pdf_cvt, renderizar_pdf_cvt, exportar_zip
+from sheets_cota import ClienteProtegido, ControleCota
+from busca import IndiceBusca
+from diagnostico import Telemetria, gravar_arquivo
+from senhas import (
+    gerar_hash as gerar_hash_senha, verificar as verificar_senha,
+    precisa_atualizar as senha_precisa_atualizar, verificar_ficticio,
+)
 
-REQ_COLUMNS = [
-    "created_at", "tecnico", "numero_cvt", "ordem_id", "peca_codigo", 
-    "peca_descricao", "quantidade", "status", "prioridade", "observacoes"
-]
+# Armazenamento usado quando o Google Sheets não está disponível:
+# "csv", "sqlite" ou "memoria"
+LOCAL_BACKEND = os.environ.get("CVT_LOCAL_BACKEND", "csv")
 
-CLIENTES_COLUMNS = [
-    "codigo", "nome", "endereco", "telefone", "email", "responsavel", "ativo"
-]
+# CVT e REQUISICOES divididas em partições mensais (worksheet ou CSV por mês):
+# as telas padrão leem só o mês atual e o histórico é consultado por período
+PARTICOES_ATIVAS = os.environ.get("CVT_PARTICOES", "1") != "0"
+# Linhas por worksheet mensal antes de abrir a próxima parte do mês
+SHEETS_PARTICAO_MAX_LINHAS = 100000
+# Células por planilha do Google Sheets (limite da API); acima disso as
+# partições novas vão para uma planilha auxiliar
+SHEETS_LIMITE_CELULAS = 10_000_000
 
-PECAS_COLUMNS = [
-    "codigo", "descricao", "categoria", "campos_especificos", "ativo"
-]
+# Períodos das consultas de histórico: rótulo -> meses antes do atual (None = tudo)
+PERIODOS = {
+    "Mês atual": 0,
+    "Últimos 3 meses": 2,
+    "Últimos 12 meses": 11,
+    "Todo o histórico": None,
+}
 
-# --- FUNÇÃO PARA GERAR PDF ---
-def gerar_pdf_cvt(dados_cvt, pecas=None):
-    """Gera um PDF da CVT com todas as informações"""
-    
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Configurações
-    pdf.set_font("Arial", size=12)
+# Snapshots Parquet mensais de CVT e REQUISICOES (exigem o pyarrow, opcional):
+# consultas de histórico e estatísticas leem deles os meses anteriores ao cache
+SNAPSHOTS_ATIVOS = os.environ.get("CVT_SNAPSHOTS", "1") != "0"
+SNAPSHOT_PASTA = os.environ.get("CVT_SNAPSHOT_PASTA", "snapshots")
+# Segundos entre gerações automáticas (0 = só pelo painel ou linha de comando)
+SNAPSHOT_INTERVALO = int(os.environ.get("CVT_SNAPSHOT_INTERVALO", 6 * 3600))
+
+# Intervalo (segundos) entre reconciliações completas das tabelas sincronizadas
+# de forma incremental (CVT e REQUISICOES são append-only na prática)
+SYNC_RECONCILIACAO = 900
+
+# Chamadas por minuto permitidas à API do Google Sheets (cota por usuário)
+SHEETS_COTA_POR_MINUTO = int(os.environ.get("CVT_SHEETS_COTA", 60))
+# Tentativas por chamada em erros temporários (429/5xx)
+SHEETS_TENTATIVAS = 5
+# Segundos máximos aguardando uma planilha recém-criada responder
+SHEETS_ESPERA_CRIACAO = 10
+
+# Gravações de CVT e requisições no Google Sheets em segundo plano: confirmadas
+# primeiro no diário local (outbox) e enviadas com novas tentativas
+OUTBOX_ATIVO = os.environ.get("CVT_OUTBOX", "1") != "0"
+# Segundos entre rodadas de envio do outbox
+OUTBOX_INTERVALO = 5
+
+# Números de CVT reservados por vez no contador do backend (por processo)
+CVT_BLOCO_NUMEROS = 10
+
+# Tempo de vida (segundos) do cache compartilhado de cada tabela
+CACHE_TTL = {
+    "cvt": 60,
+    "req": 60,
+    "users": 300,
+    "clientes": 600,
+    "pecas": 600,
+}
+
+# Máximo de opções enviadas aos seletores de peças e clientes (top-N da busca)
+BUSCA_LIMITE = 50
+
+# Cache de PDFs renderizados: itens em memória e pasta opcional em disco
+PDF_CACHE_ITENS = 64
+PDF_CACHE_DIR = os.environ.get("CVT_PDF_CACHE_DIR")
+# Incrementar ao mudar o layout de gerar_pdf_cvt (invalida PDFs em cache)
+PDF_LAYOUT_VERSAO = 1
+
+# Arquivo no formato do Prometheus atualizado com as métricas do app (ex.: para
+# o coletor textfile do node_exporter) e intervalo mínimo entre gravações
+METRICAS_PROM_ARQUIVO = os.environ.get("CVT_METRICAS_PROM")
+METRICAS_PROM_INTERVALO = 15
+
+# Processos usados na renderização de PDFs (individual e em lote)
+PDF_PROCESSOS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Segundos que a página aguarda um PDF antes de mostrá-lo como pendente
+PDF_ESPERA_RENDER = 1.5
+
+# --- Diagnóstico ---
+@st.cache_resource
+def get_telemetria():
+    """Durações dos trechos instrumentados, compartilhadas entre as sessões"""
+    return Telemetria()
+
+def medir(categoria, nome):
+    """Cronometra um trecho (storage, cache, pdf, pagina...) para o painel de diagnóstico"""
+    return get_telemetria().trecho(categoria, nome)
+
+def exportar_metricas():
+    """Atualiza o arquivo do Prometheus (CVT_METRICAS_PROM), se configurado"""
+    telemetria = get_telemetria()
+    if not METRICAS_PROM_ARQUIVO or not telemetria.exportacao_vencida(METRICAS_PROM_INTERVALO):
+        return
+    try:
+        # Métricas do Sheets direto do controle de cota: exportar não abre a conexão
+        gravar_arquivo(METRICAS_PROM_ARQUIVO, telemetria.prometheus(get_controle_cota().metricas))
+    except OSError:
+        # Falha ao exportar não deve interromper a página
+        pass
+
+# --- PDFs ---
+def criar_botao_download_pdf(pdf_bytes, nome_arquivo, key=None, rotulo="📄 Baixar PDF da CVT"):
+    """Cria um botão de download para o PDF"""
+    # download_button serve os bytes por URL própria: a página não carrega
+    # o documento embutido em base64
+    st.download_button(
+        label=rotulo,
+        data=pdf_bytes,
+        file_name=nome_arquivo,
+        mime="application/pdf",
+        key=key or f"download_{nome_arquivo}",
+        use_container_width=True
+    )
+
+# --- Cache de PDFs ---
+class CachePDF:
+    """LRU de PDFs já renderizados, endereçado pelo conteúdo da CVT e das peças.
+
+    Qualquer alteração na CVT ou nas suas requisições muda a chave, então
+    entradas antigas simplesmente deixam de ser usadas. Com `pasta` os PDFs
+    também são guardados em disco e sobrevivem a reinícios do app.
+    """
+
+    def __init__(self, max_itens, pasta=None):
+        self.max_itens = max_itens
+        self.pasta = pasta
+        self._itens = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+    @staticmethod
+    def chave(dados_cvt, pecas):
+        conteudo = json.dumps(
+            [PDF_LAYOUT_VERSAO, dados_cvt, pecas or []],
+            sort_keys=True, default=str, ensure_ascii=False
+        )
+        return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.pdf")
+
+    def _guardar_memoria(self, chave, pdf_bytes):
+        with self._lock:
+            self._itens[chave] = pdf_bytes
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def buscar(self, chave):
+        """Bytes do PDF em cache (memória ou disco) ou None"""
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return self._itens[chave]
+        
+        if self.pasta and os.path.exists(self._caminho(chave)):
+            with open(self._caminho(chave), "rb") as f:
+                pdf_bytes = f.read()
+            self._guardar_memoria(chave, pdf_bytes)
+            return pdf_bytes
+        return None
+
+    def guardar(self, chave, pdf_bytes):
+        self._guardar_memoria(chave, pdf_bytes)
+        if self.pasta:
+            # Escrita atômica: outro processo nunca lê um PDF pela metade
+            caminho_tmp = f"{self._caminho(chave)}.{os.getpid()}.tmp"
+            with open(caminho_tmp, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(caminho_tmp, self._caminho(chave))
+
+    def obter(self, dados_cvt, pecas, gerar):
+        """Bytes do PDF, chamando `gerar()` apenas se não estiver em cache"""
+        chave = self.chave(dados_cvt, pecas)
+        pdf_bytes = self.buscar(chave)
+        if pdf_bytes is None:
+            pdf_bytes = gerar()
+            self.guardar(chave, pdf_bytes)
+        return pdf_bytes
+
+@st.cache_resource
+def get_cache_pdf():
+    return CachePDF(PDF_CACHE_ITENS, PDF_CACHE_DIR)
+
+def get_pdf_cvt_bytes(dados_cvt, pecas=None):
+    """PDF da CVT em bytes, reaproveitando renderizações anteriores"""
+    def gerar():
+        with medir("pdf", "renderizar"):
+            return renderizar_pdf_cvt(dados_cvt, pecas)
+    return get_cache_pdf().obter(dados_cvt, pecas, gerar)
+
+# --- Renderização em segundo plano ---
+class FilaPDF:
+    """Fila de renderização de PDFs executada no pool de processos.
+
+    `solicitar` devolve um identificador do trabalho (a chave do conteúdo);
+    pedidos iguais feitos ao mesmo tempo compartilham a mesma renderização
+    e o resultado vai para o CachePDF.
+    """
+
+    def __init__(self, executor, cache_pdf, recriar_executor=None, telemetria=None):
+        self.executor = executor
+        self.cache_pdf = cache_pdf
+        self.recriar_executor = recriar_executor
+        self.telemetria = telemetria or Telemetria()
+        self._trabalhos = {}
+        self._lock = threading.Lock()
+
+    def solicitar(self, dados_cvt, pecas=None):
+        chave = self.cache_pdf.chave(dados_cvt, pecas)
+        if self.cache_pdf.buscar(chave) is not None:
+            self.telemetria.contar("cache_acerto:pdf")
+            return chave
+        self.telemetria.contar("cache_falta:pdf")
+        with self._lock:
+            if chave not in self._trabalhos:
+                try:
+                    futuro = self.executor.submit(renderizar_pdf_cvt, dados_cvt, pecas)
+                except BrokenProcessPool:
+                    # Um processo do pool morreu (ex.: falta de memória): o pool
+                    # não aceita mais trabalhos e precisa ser recriado
+                    if self.recriar_executor is None:
+                        raise
+                    self.executor = self.recriar_executor()
+                    futuro = self.executor.submit(renderizar_pdf_cvt, dados_cvt, pecas)
+                inicio = time.perf_counter()
+                futuro.add_done_callback(lambda f, chave=chave, inicio=inicio: self._concluir(chave, f, inicio))
+                self._trabalhos[chave] = futuro
+        return chave
+
+    def _concluir(self, chave, futuro, inicio):
+        # Tempo na fila + renderização no processo do pool
+        self.telemetria.registrar("pdf", "renderizar_pool", time.perf_counter() - inicio)
+        if futuro.exception() is None:
+            self.cache_pdf.guardar(chave, futuro.result())
+            with self._lock:
+                self._trabalhos.pop(chave, None)
+        # Em caso de erro o futuro fica registrado para que `estado` o informe
+
+    def estado(self, chave, aguardar=0):
+        """("pronto", bytes), ("pendente", None) ou ("erro", mensagem)"""
+        pdf_bytes = self.cache_pdf.buscar(chave)
+        if pdf_bytes is not None:
+            return "pronto", pdf_bytes
+        
+        with self._lock:
+            futuro = self._trabalhos.get(chave)
+        if futuro is None:
+            return "erro", "Trabalho de renderização não encontrado"
+        try:
+            pdf_bytes = futuro.result(timeout=aguardar)
+        except TimeoutError:
+            return "pendente", None
+        except Exception as e:
+            with self._lock:
+                self._trabalhos.pop(chave, None)
+            return "erro", str(e)
+        return "pronto", pdf_bytes
+
+@st.cache_resource
+def get_fila_pdf():
+    return FilaPDF(
+        get_pool_pdf(), get_cache_pdf(), recriar_executor=recriar_pool_pdf, telemetria=get_telemetria()
+    )
+
+def oferecer_pdf_cvt(dados_cvt, pecas, nome_arquivo, key=None, rotulo="📄 Baixar PDF da CVT"):
+    """Renderiza o PDF em segundo plano e mostra o download quando estiver pronto"""
+    fila = get_fila_pdf()
+    chave = fila.solicitar(dados_cvt, pecas)
+    # Espera curta: PDFs comuns ficam prontos nesse intervalo
+    with medir("pdf", "aguardar"):
+        estado, resultado = fila.estado(chave, aguardar=PDF_ESPERA_RENDER)
     
-    # Cabeçalho
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(200, 10, txt="COMPROVANTE DE VISITA TÉCNICA", ln=1, align='C')
-    pdf.ln(10)
+    if estado == "pronto":
+        criar_botao_download_pdf(resultado, nome_arquivo, key=key, rotulo=rotulo)
+    elif estado == "pendente":
+        st.info("⏳ Gerando PDF em segundo plano...")
+        if st.button("🔄 Atualizar", key=f"atualizar_{key or nome_arquivo}"):
+            st.rerun()
+    else:
+        st.error(f"Erro ao gerar PDF: {resultado}")
+
+@st.cache_resource
+def get_pool_pdf():
+    """Pool de processos para renderizar PDFs fora do processo do Streamlit"""
+    # spawn: não herda as threads do servidor (fork com threads é inseguro)
+    return ProcessPoolExecutor(
+        max_workers=PDF_PROCESSOS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+def recriar_pool_pdf():
+    """Descarta o pool de processos quebrado e cria outro"""
+    get_pool_pdf.clear()
+    return get_pool_pdf()
+
+def exportar_cvts_zip(cvts_df, ao_progredir=None):
+    """Gera um ZIP com o PDF de cada CVT de `cvts_df` e retorna seus bytes"""
+    # Peças de cada CVT pela junção mantida em cache (sem agrupar a tabela)
+    juncao, req_df = get_juncao_pecas(), read_all_requisicoes()
+    # CVTs anteriores ao período em cache: uma única consulta às partições
+    # a partir do mês da mais antiga, com a sua própria junção
+    historico = None
+    periodo = periodo_em_cache("req")
+    if periodo is not None and len(cvts_df) and cvts_df["created_at"].min() < periodo:
+        desde = cvts_df["created_at"].min().to_period("M").to_timestamp()
+        historico = consultar_tabela("req", get_indice_requisicoes, {}, desde=desde, ordem=None)
+        juncao_historico = JuncaoPecasCVT(historico)
     
-    # Informações da CVT
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(200, 10, txt="INFORMAÇÕES DA VISITA", ln=1)
-    pdf.set_font("Arial", size=11)
+    def pecas_de(numero):
+        pecas = juncao.pecas(req_df, numero)
+        if not pecas and historico is not None:
+            pecas = juncao_historico.pecas(historico, numero)
+        return pecas or None
     
-    # Dados básicos
-    pdf.cell(100, 8, txt=f"Número CVT: {dados_cvt.get('numero_cvt', 'N/A')}", ln=1)
+    itens = [
+        (f"CVT_{dados_cvt.get('numero_cvt')}.pdf", dados_cvt, pecas_de(dados_cvt.get('numero_cvt')))
+        for dados_cvt in cvts_df.to_dict('records')
+    ]
     
-    # Formata data
-    if 'created_at' in dados_cvt:
+    # O ZIP é montado em disco; na memória ficam só os PDFs em andamento
+    with medir("pdf", "exportar_zip"), tempfile.TemporaryFile() as arquivo:
         try:
-            data_obj = pd.to_datetime(dados_cvt['created_at'])
-            data_formatada = data_obj.strftime("%d/%m/%Y %H:%M")
-            pdf.cell(100, 8, txt=f"Data/Hora: {data_formatada}", ln=1)
-        except:
-            pdf.cell(100, 8, txt=f"Data/Hora: {dados_cvt.get('created_at', 'N/A')}", ln=1)
-    
-    pdf.cell(100, 8, txt=f"Técnico: {dados_cvt.get('tecnico', 'N/A')}", ln=1)
-    pdf.cell(100, 8, txt=f"Cliente: {dados_cvt.get('cliente', 'N/A')}", ln=1)
-    pdf.cell(100, 8, txt=f"Endereço: {dados_cvt.get('endereco', 'N/A')}", ln=1)
-    pdf.cell(100, 8, txt=f"Elevador: {dados_cvt.get('elevador', 'Não informado')}", ln=1)
-    pdf.ln(5)
-    
-    # Serviço Realizado
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(200, 10, txt="SERVIÇO REALIZADO / DIAGNÓSTICO", ln=1)
-    pdf.set_font("Arial", size=11)
-    
-    # Quebra o texto do serviço em múltiplas linhas
-    servico = dados_cvt.get('servico_realizado', 'Não informado')
-    pdf.multi_cell(0, 8, txt=str(servico))
-    pdf.ln(5)
-    
-    # Observações (se houver)
-    if dados_cvt.get('obs'):
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(200, 10, txt="OBSERVAÇÕES ADICIONAIS", ln=1)
-        pdf.set_font("Arial", size=11)
-        pdf.multi_cell(0, 8, txt=str(dados_cvt.get('obs', '')))
-        pdf.ln(5)
-    
-    # Seção de Peças (se houver)
-    if pecas and len(pecas) > 0:
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(200, 10, txt="PEÇAS SOLICITADAS", ln=1)
-        pdf.set_font("Arial", size=10)
-        
-        # Cabeçalho da tabela
-        pdf.set_fill_color(200, 200, 200)
-        pdf.cell(30, 8, "Código", 1, 0, 'C', True)
-        pdf.cell(80, 8, "Descrição", 1, 0, 'C', True)
-        pdf.cell(20, 8, "Qtd", 1, 0, 'C', True)
-        pdf.cell(30, 8, "Prioridade", 1, 0, 'C', True)
-        pdf.cell(30, 8, "Observações", 1, 1, 'C', True)
-        
-        # Dados das peças
-        pdf.set_font("Arial", size=9)
-        for peca in pecas:
-            # Quebra linha se a descrição for muito longa
-            descricao = peca.get('peca_descricao', '')
-            if len(descricao) > 50:
-                descricao = descricao[:47] + "..."
-            
-            pdf.cell(30, 8, str(peca.get('peca_codigo', '')), 1)
-            pdf.cell(80, 8, str(descricao), 1)
-            pdf.cell(20, 8, str(peca.get('quantidade', '')), 1, 0, 'C')
-            pdf.cell(30, 8, str(peca.get('prioridade', '')), 1, 0, 'C')
-            
-            # Trunca observações muito longas
-            obs = peca.get('observacoes', '')
-            if len(obs) > 20:
-                obs = obs[:17] + "..."
-            pdf.cell(30, 8, str(obs), 1, 1)
-        
-        pdf.ln(5)
-    
-    # Rodapé
-    pdf.ln(10)
-    pdf.set_font("Arial", 'I', 10)
-    pdf.cell(0, 10, txt="Documento gerado automaticamente pelo Sistema CVT", ln=1, align='C')
-    
-    return pdf
+            exportar_zip(itens, arquivo, get_pool_pdf(), janela=PDF_PROCESSOS * 2, ao_progredir=ao_progredir)
+        except BrokenProcessPool:
+            # Pool quebrado por um processo encerrado: recria e refaz o ZIP
+            arquivo.seek(0)
+            arquivo.truncate()
+            exportar_zip(itens, arquivo, recriar_pool_pdf(), janela=PDF_PROCESSOS * 2, ao_progredir=ao_progredir)
+        arquivo.seek(0)
+        return arquivo.read()
 
-def criar_botao_download_pdf(pdf, nome_arquivo):
-    """Cria um botão de download para o PDF"""
-    try:
-        # Método correto para obter o conteúdo do PDF
-        pdf_output = pdf.output(dest='S')
-        
-        # Se já é uma string, apenas encode
-        if isinstance(pdf_output, str):
-            pdf_bytes = pdf_output.encode('latin-1')
-        else:
-            # Se for bytes, use diretamente
-            pdf_bytes = pdf_output
-            
-        b64_pdf = base64.b64encode(pdf_bytes).decode()
-        
-        href = f'<a href="data:application/pdf;base64,{b64_pdf}" download="{nome_arquivo}" style="background-color: #4CAF50; color: white; padding: 10px 20px; text-align: center; text-decoration: none; display: inline-block; border-radius: 5px; font-weight: bold;">📄 Baixar PDF da CVT</a>'
-        st.markdown(href, unsafe_allow_html=True)
-        
-    except Exception as e:
-        st.error(f"Erro ao gerar PDF: {str(e)}")
-        # Fallback: criar um botão de download alternativo
+# --- Relatório de inicialização ---
+class RelatorioInicializacao:
+    """Duração de cada etapa da partida do processo (importações, conexão
+    com o Sheets, primeiras leituras, primeira página), na ordem em que ocorreram.
+
+    Cada etapa é registrada só na primeira vez: as execuções seguintes do
+    script já encontram tudo em cache.
+    """
+
+    def __init__(self):
+        self.etapas = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def registrar(self, etapa, segundos):
+        with self._lock:
+            self.etapas.setdefault(etapa, segundos)
+
+    @contextlib.contextmanager
+    def medir(self, etapa):
+        inicio = time.perf_counter()
         try:
-            # Salva em um arquivo temporário e lê os bytes
-            import tempfile
-            import os
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                pdf.output(tmp.name)
-                tmp.flush()
-                with open(tmp.name, 'rb') as f:
-                    pdf_bytes = f.read()
-                
-                b64_pdf = base64.b64encode(pdf_bytes).decode()
-                href = f'<a href="data:application/pdf;base64,{b64_pdf}" download="{nome_arquivo}" style="background-color: #4CAF50; color: white; padding: 10px 20px; text-align: center; text-decoration: none; display: inline-block; border-radius: 5px; font-weight: bold;">📄 Baixar PDF da CVT</a>'
-                st.markdown(href, unsafe_allow_html=True)
-                
-            # Limpa o arquivo temporário
-            os.unlink(tmp.name)
-            
-        except Exception as e2:
-            st.error(f"Erro ao criar PDF alternativo: {str(e2)}")
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - inicio)
+
+    def resumo(self):
+        """Etapa -> duração em ms"""
+        with self._lock:
+            return {etapa: round(segundos * 1000, 1) for etapa, segundos in self.etapas.items()}
+
+@st.cache_resource
+def get_relatorio_inicializacao():
+    relatorio = RelatorioInicializacao()
+    # Primeira execução do script no processo: importações e definições
+    relatorio.registrar("carregamento_script", time.perf_counter() - _INICIO_SCRIPT)
+    return relatorio
+
+def registrar_primeira_pagina():
+    """Marca o fim da primeira página servida pelo processo e publica o relatório no log"""
+    relatorio = get_relatorio_inicializacao()
+    if "primeira_pagina" in relatorio.etapas:
+        return
+    relatorio.registrar("primeira_pagina", time.perf_counter() - _INICIO_SCRIPT)
+    logger.info("Inicialização do CVT App (ms): %s", json.dumps(relatorio.resumo()))
 
 # --- Inicialização do Google Sheets ---
 def init_gsheets():
     """
     Configura conexão com Google Sheets
     """
+    if os.environ.get("CVT_FAKE_SHEETS"):
+        # API simulada em memória para medir o I/O sem conta Google
+        from fake_sheets import FakeClient
+        return FakeClient.do_ambiente()
+    
     try:
         import gspread
         from oauth2client.service_account import ServiceAccountCredentials
@@ -225,139 +462,693 @@ def init_gsheets():
         return None
 
 # --- Gerenciamento de planilhas ---
+@st.cache_resource
+def get_controle_cota():
+    """Controle de cota das chamadas ao Sheets (e suas métricas), criado sem conectar"""
+    return ControleCota(SHEETS_COTA_POR_MINUTO, tentativas=SHEETS_TENTATIVAS)
+
+def aguardar_planilha(spreadsheet):
+    """Aguarda uma planilha recém-criada responder e devolve suas worksheets"""
+    limite = time.monotonic() + SHEETS_ESPERA_CRIACAO
+    espera = 0.1
+    while True:
+        try:
+            return spreadsheet.worksheets()
+        except Exception:
+            if time.monotonic() + espera > limite:
+                raise
+            time.sleep(espera)
+            espera = min(espera * 2, 1.0)
+
 @st.cache_resource
 def get_client_and_worksheets():
-    client = init_gsheets()
+    relatorio = get_relatorio_inicializacao()
+    with relatorio.medir("conexao_sheets"):
+        client = init_gsheets()
     if not client:
         return None
-        
+    
+    # Todas as chamadas à API passam pelo controle de cota (limitador,
+    # novas tentativas em 429/5xx e coalescência de leituras)
+    client = ClienteProtegido(client, get_controle_cota())
+    
+    existentes = None
     try:
         # Tenta abrir a planilha existente
-        spreadsheet = client.open(SHEET_NAME)
+        with relatorio.medir("abrir_planilha"):
+            spreadsheet = client.open(SHEET_NAME)
     except Exception:
         # Cria nova planilha se não existir
         try:
-            spreadsheet = client.create(SHEET_NAME)
-            time.sleep(2)
+            with relatorio.medir("criar_planilha"):
+                spreadsheet = client.create(SHEET_NAME)
+                existentes = aguardar_planilha(spreadsheet)
         except Exception as e:
             st.error(f"Erro ao criar planilha: {str(e)}")
             return None
 
+    # Uma única consulta de metadados traz todas as worksheets; só as que
+    # faltam geram chamadas adicionais (criação)
+    with relatorio.medir("listar_worksheets"):
+        if existentes is None:
+            try:
+                existentes = spreadsheet.worksheets()
+            except Exception:
+                existentes = None
+    if existentes is not None:
+        existentes = {worksheet.title: worksheet for worksheet in existentes}
+
     # Garante que as worksheets existem
-    def ensure_worksheet(name):
-        try:
-            return spreadsheet.worksheet(name)
-        except Exception:
+    def ensure_worksheet(name, criar=True):
+        if existentes is not None and name in existentes:
+            return existentes[name]
+        if existentes is None:
+            # Listagem indisponível: procura a worksheet individualmente
             try:
-                return spreadsheet.add_worksheet(title=name, rows=1000, cols=20)
+                return spreadsheet.worksheet(name)
             except Exception:
-                return None
+                pass
+        if not criar:
+            return None
+        try:
+            return spreadsheet.add_worksheet(title=name, rows=1000, cols=20)
+        except Exception:
+            return None
 
-    worksheets = {
-        "client": client,
-        "spreadsheet": spreadsheet,
-        "cvt": ensure_worksheet(CVT_SHEET),
-        "req": ensure_worksheet(REQ_SHEET),
-        "users": ensure_worksheet(USERS_SHEET),
-        "clientes": ensure_worksheet(CLIENTES_SHEET),
-        "pecas": ensure_worksheet(PECAS_SHEET),
-    }
+    with relatorio.medir("preparar_worksheets"):
+        worksheets = {
+            "client": client,
+            "spreadsheet": spreadsheet,
+            # Com partições mensais as worksheets únicas são só o legado
+            "cvt": ensure_worksheet(CVT_SHEET, criar=not PARTICOES_ATIVAS),
+            "req": ensure_worksheet(REQ_SHEET, criar=not PARTICOES_ATIVAS),
+            "users": ensure_worksheet(USERS_SHEET),
+            "clientes": ensure_worksheet(CLIENTES_SHEET),
+            "pecas": ensure_worksheet(PECAS_SHEET),
+            "existentes": list(existentes.values()) if existentes is not None else None,
+        }
     
     return worksheets
 
-# --- Operações com dados ---
-def append_to_sheet(worksheet, row):
-    """Adiciona linha ao Google Sheets"""
+def get_metricas_sheets():
+    """Métricas das chamadas à API do Google Sheets (None sem Sheets)"""
+    client_info = get_client_and_worksheets()
+    if not client_info:
+        return None
+    return client_info["client"].metricas
+
+# --- Backend de armazenamento ---
+@st.cache_resource
+def get_storage():
+    """Backend ativo: Google Sheets quando disponível, senão o local configurado"""
+    if LOCAL_BACKEND == "sqlite":
+        local = SQLiteStorage(SQLITE_DB)
+    elif LOCAL_BACKEND == "memoria":
+        local = MemoryStorage()
+    else:
+        local = CSVStorage(particionar=PARTICOES_ATIVAS)
+    
+    client_info = get_client_and_worksheets()
+    if not client_info:
+        return local
+    
+    worksheets = {tabela: client_info[tabela] for tabela in TABELAS}
+    storage = SheetsStorage(
+        worksheets, local=local, intervalo_reconciliacao=SYNC_RECONCILIACAO,
+        planilha=client_info["spreadsheet"], cliente=client_info["client"],
+        existentes=client_info["existentes"], particionar=PARTICOES_ATIVAS,
+        particao_max_linhas=SHEETS_PARTICAO_MAX_LINHAS, limite_celulas=SHEETS_LIMITE_CELULAS,
+    )
+    if OUTBOX_ATIVO:
+        storage = StorageComOutbox(
+            storage, Outbox(OUTBOX_DB), intervalo_envio=OUTBOX_INTERVALO
+        ).iniciar_envio()
+    return storage
+
+def ler_tabela(tabela):
+    """Lê uma tabela do backend ativo, já com as colunas tipadas (ESQUEMA).
+
+    Tabelas particionadas por mês são lidas só a partir do período em cache
+    (o mês atual): as partições anteriores ficam para as consultas de histórico.
+    """
     try:
-        worksheet.append_row(row)
-        return True
+        storage = get_storage()
+        desde = periodo_em_cache(tabela)
+        # Só a primeira leitura de cada tabela entra no relatório de inicialização
+        with get_relatorio_inicializacao().medir(f"primeira_leitura_{tabela}"), medir("storage", f"ler_tabela:{tabela}"):
+            if desde is None:
+                df = storage.ler_tabela(tabela)
+            else:
+                df = storage.consultar(tabela, desde=desde)
     except Exception as e:
-        st.error(f"Erro ao salvar no Sheets: {str(e)}")
-        return False
+        st.error(f"Erro ao ler {TABELAS[tabela]['sheet']}: {str(e)}")
+        df = pd.DataFrame(columns=TABELAS[tabela]["colunas"])
+        # Marca a leitura como falha para que o cache não guarde o resultado vazio
+        df.attrs["erro_leitura"] = True
+    with medir("pandas", f"tipar:{tabela}"):
+        return tipar_tabela(tabela, df, medir=True)
+
+def inicio_mes(meses_atras=0):
+    """Primeiro instante do mês atual (ou de `meses_atras` meses antes)"""
+    hoje = datetime.date.today()
+    ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - meses_atras, 12)
+    return datetime.datetime(ano, mes + 1, 1)
+
+def periodo_em_cache(tabela):
+    """Início do período mantido no cache da tabela (None = tabela inteira)"""
+    return inicio_mes() if get_storage().particionada(tabela) else None
 
-def read_from_sheet(worksheet):
-    """Lê dados do Google Sheets"""
+def seletor_periodo(key, rotulo="Período"):
+    """Seletor do período de uma consulta de histórico; retorna o `desde`"""
+    opcoes = list(PERIODOS)
+    # Com partições mensais o padrão é o mês atual (uma partição lida)
+    padrao = 0 if get_storage().particionada("cvt") else len(opcoes) - 1
+    meses = PERIODOS[st.selectbox(rotulo, opcoes, index=padrao, key=key)]
+    return None if meses is None else inicio_mes(meses)
+
+def formatar_data(serie):
+    """Datas (coluna datetime) no formato de exibição; inválidas ficam vazias"""
+    return serie.dt.strftime("%d/%m/%Y %H:%M").fillna("")
+
+def gravar_linhas(tabela, rows):
+    """Grava linhas no backend ativo (uma única chamada) e atualiza o cache"""
     try:
-        records = worksheet.get_all_records()
-        return pd.DataFrame(records)
+        with medir("storage", f"inserir:{tabela}"):
+            get_storage().inserir(tabela, rows)
     except Exception as e:
-        st.error(f"Erro ao ler do Sheets: {str(e)}")
-        return pd.DataFrame()
+        st.error(f"Erro ao salvar em {TABELAS[tabela]['sheet']}: {str(e)}")
+        return False
+    with medir("cache", f"adicionar_linhas:{tabela}"):
+        get_cache_tabelas().adicionar_linhas(tabela, rows)
+    return True
 
-# --- Funções para Clientes ---
-def load_clientes():
-    """Carrega lista de clientes do Google Sheets"""
-    client_info = get_client_and_worksheets()
-    
-    if client_info and client_info["clientes"]:
-        try:
-            df = read_from_sheet(client_info["clientes"])
-            if not df.empty and 'ativo' in df.columns:
-                df = df[df['ativo'].str.upper() == 'SIM']
+def destino_gravacao():
+    """Texto usado nas mensagens de sucesso"""
+    storage = get_storage()
+    if isinstance(storage, StorageComOutbox):
+        return "(envio ao Google Sheets em segundo plano)"
+    return "no Google Sheets" if storage.remoto else "localmente"
+
+def status_sincronizacao(numeros):
+    """Situação do envio ao Google Sheets de cada CVT (None sem outbox)"""
+    storage = get_storage()
+    if not isinstance(storage, StorageComOutbox):
+        return None
+    try:
+        with medir("storage", "status_sincronizacao"):
+            return storage.status_sincronizacao(numeros)
+    except Exception:
+        return None
+
+def rotulo_sincronizacao(info):
+    """Texto exibido para a situação de envio de uma CVT"""
+    if not info or info["status"] == Outbox.ENVIADO:
+        return "✅ Sincronizada"
+    if info["tentativas"] and info["erro"]:
+        return f"⚠️ Aguardando nova tentativa ({info['tentativas']})"
+    return "⏳ Enviando"
+
+# --- Cache de dados ---
+class CacheTabelas:
+    """Cache de DataFrames compartilhado entre sessões, com TTL por tabela"""
+
+    def __init__(self, ttls, telemetria=None):
+        self.ttls = dict(ttls)
+        # Acertos, faltas e construção de derivados vão para o painel de diagnóstico
+        self.telemetria = telemetria or Telemetria()
+        self._entradas = {}
+        self._lock = threading.Lock()
+        self._locks_tabela = {}
+
+    def _lock_da_tabela(self, tabela):
+        with self._lock:
+            if tabela not in self._locks_tabela:
+                self._locks_tabela[tabela] = threading.Lock()
+            return self._locks_tabela[tabela]
+
+    def _valida(self, tabela):
+        entrada = self._entradas.get(tabela)
+        if entrada is None:
+            return None
+        if time.monotonic() - entrada["carregado_em"] > self.ttls.get(tabela, 0):
+            return None
+        return entrada["df"]
+
+    def obter(self, tabela, carregar):
+        """Retorna a tabela em cache ou executa `carregar()` e guarda o resultado.
+
+        O DataFrame retornado é compartilhado entre sessões e não deve ser
+        alterado no lugar.
+        """
+        df = self._valida(tabela)
+        if df is not None:
+            self.telemetria.contar(f"cache_acerto:{tabela}")
             return df
-        except Exception as e:
-            st.error(f"Erro ao carregar clientes: {str(e)}")
-    
-    # Fallback para CSV
-    if os.path.exists(CLIENTES_CSV):
-        df = pd.read_csv(CLIENTES_CSV)
-        if 'ativo' in df.columns:
-            df = df[df['ativo'].str.upper() == 'SIM']
-        return df
+
+        # Uma única sessão recarrega a tabela; as demais aguardam o resultado
+        with self._lock_da_tabela(tabela):
+            df = self._valida(tabela)
+            if df is not None:
+                self.telemetria.contar(f"cache_acerto:{tabela}")
+                return df
+            self.telemetria.contar(f"cache_falta:{tabela}")
+            df = carregar()
+            if not df.attrs.get("erro_leitura"):
+                self._entradas[tabela] = {"df": df, "carregado_em": time.monotonic()}
+            return df
+
+    def em_cache(self, tabela):
+        """True se a tabela está carregada e dentro do TTL (não dispara leitura)"""
+        return self._valida(tabela) is not None
+
+    def adicionar_linhas(self, tabela, linhas):
+        """Aplica no cache as linhas recém-gravadas (write-through)"""
+        with self._lock_da_tabela(tabela):
+            entrada = self._entradas.get(tabela)
+            if entrada is None:
+                return
+            df = entrada["df"]
+            if len(df.columns) == 0 or any(len(linha) != len(df.columns) for linha in linhas):
+                # Sem cabeçalho conhecido não há como alinhar as colunas: recarrega
+                del self._entradas[tabela]
+                return
+            novas = pd.DataFrame(linhas, columns=df.columns)
+            entrada["df"] = concatenar_tipado(tabela, df, novas)
+            # Derivados incrementais (ex.: agregados) recebem só as linhas novas;
+            # os demais são reconstruídos no próximo acesso
+            entrada["derivados"] = {
+                nome: derivado
+                for nome, derivado in entrada.get("derivados", {}).items()
+                if hasattr(derivado, "adicionar") and derivado.adicionar(novas) is not False
+            }
+
+    def descartar_derivado(self, tabela, nome):
+        """Força a reconstrução de um derivado a partir da tabela em cache"""
+        with self._lock_da_tabela(tabela):
+            entrada = self._entradas.get(tabela)
+            if entrada is not None:
+                entrada.get("derivados", {}).pop(nome, None)
+
+    def derivado(self, tabela, nome, carregar, construir):
+        """Estrutura derivada da tabela (índice, catálogo...) construída uma vez
+        por carga da tabela e descartada quando ela é recarregada ou alterada
+        """
+        df = self.obter(tabela, carregar)
+        with self._lock_da_tabela(tabela):
+            entrada = self._entradas.get(tabela)
+            if entrada is None or entrada["df"] is not df:
+                # Leitura com falha (não cacheada): constrói sem guardar
+                return construir(df)
+            derivados = entrada.setdefault("derivados", {})
+            if nome not in derivados:
+                self.telemetria.contar(f"cache_falta:{tabela}:{nome}")
+                with self.telemetria.trecho("cache", f"derivado:{tabela}:{nome}"):
+                    derivados[nome] = construir(df)
+            else:
+                self.telemetria.contar(f"cache_acerto:{tabela}:{nome}")
+            return derivados[nome]
+
+    def relatorio_memoria(self):
+        """Linhas e memória (bytes) de cada tabela em cache, antes e depois da tipagem"""
+        with self._lock:
+            entradas = dict(self._entradas)
+        relatorio = {}
+        for tabela, entrada in entradas.items():
+            memoria = entrada["df"].attrs.get("memoria", {})
+            relatorio[tabela] = {
+                "linhas": len(entrada["df"]),
+                "antes": memoria.get("antes"),
+                "depois": memoria.get("depois"),
+            }
+        return relatorio
+
+    def invalidar(self, tabela=None):
+        """Descarta uma tabela do cache (ou todas)"""
+        with self._lock:
+            if tabela is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(tabela, None)
+
+@st.cache_resource
+def get_cache_tabelas():
+    return CacheTabelas(CACHE_TTL, get_telemetria())
+
+class IndiceTabela:
+    """Índice de uma tabela em cache para filtros, contagens e paginação.
+
+    Guarda a ordem das linhas (mais recentes primeiro) e, para cada coluna
+    filtrável, as posições das linhas de cada valor. Contar e paginar não
+    materializam a tabela filtrada: só as linhas da página são copiadas.
+    """
+
+    def __init__(self, df, colunas, ordenar_por="created_at"):
+        self.df = df
+        self.ordenar_por = ordenar_por
+        # Datas (inteiros) em ordem crescente, para cortar por período com busca binária
+        self._datas_crescentes = None
+        if ordenar_por in df.columns and len(df):
+            chaves = df[ordenar_por]
+            datas = pd.api.types.is_datetime64_any_dtype(chaves)
+            if datas:
+                # NaT vira o menor inteiro: datas inválidas ficam por último
+                chaves = chaves.to_numpy().view("i8")
+            else:
+                chaves = chaves.astype(str).to_numpy()
+            # Empate mantém a ordem de gravação
+            self.ordem = np.argsort(chaves, kind="stable")[::-1]
+            if datas:
+                self._datas_crescentes = chaves[self.ordem[::-1]]
+        else:
+            self.ordem = np.arange(len(df))[::-1]
+        self._rank = np.empty(len(df), dtype=np.int64)
+        self._rank[self.ordem] = np.arange(len(df))
+        self._posicoes = {
+            coluna: df.groupby(coluna, sort=True, observed=True).indices if coluna in df.columns and len(df) else {}
+            for coluna in colunas
+        }
+
+    def _posicoes_de(self, coluna, valor):
+        """Posições (crescentes) das linhas com `coluna` == `valor`, ou None"""
+        indice = self._posicoes.get(coluna)
+        if indice is not None:
+            return indice.get(valor)
+        if coluna not in self.df.columns:
+            return None
+        # Coluna sem índice (ex.: numero_cvt nas requisições): varre só ela
+        posicoes = np.flatnonzero(self.df[coluna].eq(valor).to_numpy(dtype=bool, na_value=False))
+        return posicoes if len(posicoes) else None
+
+    def _selecao(self, filtros):
+        """Posições das linhas que casam com `filtros`, na ordem de exibição"""
+        conjuntos = []
+        for coluna, valor in filtros.items():
+            posicoes = self._posicoes_de(coluna, valor)
+            if posicoes is None:
+                return np.empty(0, dtype=np.int64)
+            conjuntos.append(posicoes)
+        if not conjuntos:
+            return self.ordem
+        selecao = conjuntos[0]
+        for posicoes in conjuntos[1:]:
+            selecao = np.intersect1d(selecao, posicoes, assume_unique=True)
+        return selecao[np.argsort(self._rank[selecao])]
+
+    def contar(self, **filtros):
+        if not filtros:
+            return len(self.df)
+        if len(filtros) == 1:
+            coluna, valor = next(iter(filtros.items()))
+            posicoes = self._posicoes_de(coluna, valor)
+            return 0 if posicoes is None else len(posicoes)
+        return len(self._selecao(filtros))
+
+    def valores(self, coluna, **filtros):
+        """Valores distintos de `coluna` (entre as linhas filtradas), ordenados"""
+        if not filtros:
+            return list(self._posicoes[coluna].keys())
+        selecao = self._selecao(filtros)
+        return sorted(self.df[coluna].iloc[selecao].dropna().unique())
+
+    def pagina(self, filtros, numero, tamanho):
+        """Linhas da página `numero` (a partir de 1) já ordenadas"""
+        inicio = (numero - 1) * tamanho
+        return self.df.iloc[self._selecao(filtros)[inicio:inicio + tamanho]]
+
+    def _desde(self, selecao, desde):
+        """Linhas da seleção (em ordem de exibição) com data a partir de `desde`"""
+        coluna = self.df[self.ordenar_por]
+        if self._datas_crescentes is None:
+            return selecao[(coluna.iloc[selecao] >= pd.Timestamp(desde)).to_numpy()]
+        limite = np.datetime64(pd.Timestamp(desde)).astype(coluna.to_numpy().dtype).astype(np.int64)
+        # As `recentes` primeiras posições da ordem de exibição têm data >= desde;
+        # na seleção os ranks são crescentes, então o corte é outra busca binária
+        recentes = len(self.df) - np.searchsorted(self._datas_crescentes, limite, side="left")
+        return selecao[:np.searchsorted(self._rank[selecao], recentes)]
+
+    def consultar(self, filtros, desde=None, limite=None, ordem=None):
+        """Linhas que casam com `filtros` sem varrer a tabela: O(linhas selecionadas).
+
+        `ordem` é uma coluna (prefixo "-" para decrescente); sem ordem ou com
+        a ordem do índice (mais recentes primeiro) não há ordenação extra.
+        """
+        selecao = self._selecao(filtros)
+        if desde is not None and self.ordenar_por in self.df.columns:
+            selecao = self._desde(selecao, desde)
+        if ordem and ordem != f"-{self.ordenar_por}":
+            if ordem == self.ordenar_por:
+                selecao = selecao[::-1]
+            else:
+                valores = self.df[ordem.lstrip("-")].iloc[selecao].reset_index(drop=True)
+                posicoes = valores.sort_values(ascending=not ordem.startswith("-"), kind="stable").index
+                selecao = selecao[posicoes.to_numpy()]
+        if limite is not None:
+            selecao = selecao[:limite]
+        return self.df.iloc[selecao]
+
+class AgregadosTabela:
+    """Contadores materializados de uma tabela para os painéis de estatísticas.
+
+    Construídos uma vez por carga da tabela e mantidos a cada gravação
+    (`adicionar`): a leitura é O(1).
+    """
+
+    def __init__(self, df, colunas, nao_vazias=()):
+        self.total = 0
+        self.contagens = {coluna: collections.Counter() for coluna in colunas}
+        self.preenchidas = {coluna: 0 for coluna in nao_vazias}
+        self._lock = threading.Lock()
+        self.adicionar(df)
+
+    def adicionar(self, df):
+        # value_counts só das linhas novas, fora do lock
+        # Colunas categóricas listam também as categorias sem linhas
+        contagens = {
+            coluna: {valor: n for valor, n in df[coluna].value_counts().items() if n > 0}
+            for coluna in self.contagens if coluna in df.columns
+        }
+        preenchidas = {
+            coluna: int(df[coluna].ne("").sum())
+            for coluna in self.preenchidas if coluna in df.columns
+        }
+        with self._lock:
+            self.total += len(df)
+            for coluna, contagem in contagens.items():
+                self.contagens[coluna].update(contagem)
+            for coluna, quantidade in preenchidas.items():
+                self.preenchidas[coluna] += quantidade
+
+    def contagem(self, coluna, valor):
+        return self.contagens[coluna].get(valor, 0)
+
+    def distintos(self, coluna):
+        return len(self.contagens[coluna])
+
+    def serie(self, coluna):
+        """Contagem por valor, da maior para a menor (como value_counts)"""
+        with self._lock:
+            return pd.Series(dict(self.contagens[coluna].most_common()), dtype="int64")
+
+class JuncaoPecasCVT:
+    """Junção CVT -> requisições: numero_cvt -> posições das suas linhas.
+
+    Construída uma vez por carga de REQUISICOES e mantida a cada gravação
+    (`adicionar`): buscar as peças de uma CVT custa O(peças), sem varrer a
+    tabela. As posições valem para o DataFrame em cache, que só cresce no fim.
+    """
+
+    def __init__(self, df, coluna="numero_cvt"):
+        self.coluna = coluna
+        self.linhas = len(df)
+        # Carga: posições agrupadas por CVT num único array (numero -> fatia)
+        self._ordem = np.empty(0, dtype=np.int64)
+        self._fatias = {}
+        # Gravações posteriores: numero -> lista de posições
+        self._novas = collections.defaultdict(list)
+        self._lock = threading.Lock()
+        if coluna in df.columns and len(df):
+            codigos, numeros = pd.factorize(df[coluna])
+            # Empate mantém a ordem de gravação
+            self._ordem = np.argsort(codigos, kind="stable")
+            ordenados = codigos[self._ordem]
+            inicios = np.searchsorted(ordenados, np.arange(len(numeros)), side="left")
+            fins = np.append(inicios[1:], len(ordenados))
+            self._fatias = dict(zip(numeros, zip(inicios.tolist(), fins.tolist())))
+
+    def adicionar(self, df):
+        if self.coluna not in df.columns:
+            return False
+        with self._lock:
+            for deslocamento, numero in enumerate(df[self.coluna]):
+                self._novas[numero].append(self.linhas + deslocamento)
+            self.linhas += len(df)
+
+    def posicoes(self, numero_cvt):
+        """Posições das requisições da CVT, na ordem de gravação"""
+        inicio, fim = self._fatias.get(numero_cvt, (0, 0))
+        with self._lock:
+            novas = list(self._novas.get(numero_cvt, ()))
+        return self._ordem[inicio:fim].tolist() + novas
+
+    def contar(self, numero_cvt):
+        inicio, fim = self._fatias.get(numero_cvt, (0, 0))
+        return fim - inicio + len(self._novas.get(numero_cvt, ()))
+
+    def pecas(self, df, numero_cvt):
+        """Registros de `df` (REQUISICOES em cache) da CVT, na ordem de gravação"""
+        posicoes = self.posicoes(numero_cvt)
+        if not posicoes:
+            return []
+        # Acesso linha a linha: df.iloc[posicoes] copiaria colunas Arrow
+        # inteiras quando elas têm vários blocos (após cada gravação)
+        colunas = {coluna: df[coluna].array for coluna in df.columns}
+        registros = []
+        for posicao in posicoes:
+            # Gravação ou recarga concorrente: a junção pode não corresponder
+            # exatamente a `df`; descarta posições fora dele ou de outra CVT
+            if posicao >= len(df):
+                continue
+            registro = {}
+            for coluna, valores in colunas.items():
+                valor = valores[posicao]
+                registro[coluna] = valor.item() if isinstance(valor, np.generic) else valor
+            if registro.get(self.coluna) == numero_cvt:
+                registros.append(registro)
+        return registros
+
+def exibir_paginado(indice, filtros, key, colunas=None, tamanhos=(25, 50, 100, 200)):
+    """Tabela paginada: só as linhas da página são enviadas ao navegador"""
+    total = indice.contar(**filtros)
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        tamanho = st.selectbox("Linhas por página", list(tamanhos), key=f"{key}_tamanho")
+    paginas = max(1, -(-total // tamanho))
+    # Filtro ou tamanho de página novo pode reduzir o total de páginas
+    if st.session_state.get(f"{key}_pagina", 1) > paginas:
+        st.session_state[f"{key}_pagina"] = paginas
+    with col2:
+        pagina = st.number_input("Página", min_value=1, max_value=paginas, step=1, key=f"{key}_pagina")
+    with col3:
+        st.caption(f"Página {pagina} de {paginas} · {total} registro(s)")
     
-    return pd.DataFrame()
+    pagina_df = indice.pagina(filtros, int(pagina), tamanho)
+    if colunas:
+        pagina_df = pagina_df[colunas]
+    pagina_df = pagina_df.copy()
+    if "created_at" in pagina_df.columns:
+        pagina_df["created_at"] = formatar_data(pagina_df["created_at"])
+    st.dataframe(pagina_df, use_container_width=True, hide_index=True)
+
+# --- Funções para Clientes ---
+def load_clientes():
+    """Carrega lista de clientes (com cache compartilhado)"""
+    return get_cache_tabelas().obter("clientes", _load_clientes)
+
+def _load_clientes():
+    """Carrega lista de clientes ativos do backend"""
+    df = ler_tabela("clientes")
+    if not df.empty and 'ativo' in df.columns:
+        df = df[df['ativo']]
+    return df
+
+class CatalogoClientes:
+    """Índice dos clientes ativos: nome -> registro, com busca por nome, código e endereço"""
+
+    def __init__(self, clientes_df):
+        self.por_nome = {}
+        if 'nome' in clientes_df.columns:
+            for registro in clientes_df.to_dict('records'):
+                # Nome repetido: vale o primeiro, como na busca anterior
+                self.por_nome.setdefault(registro['nome'], registro)
+        self.nomes = list(self.por_nome)
+        self.busca = IndiceBusca([
+            (nome, [registro.get('codigo', ''), nome, registro.get('endereco', '')])
+            for nome, registro in self.por_nome.items()
+        ])
+
+    def __len__(self):
+        return len(self.por_nome)
+
+    def get(self, nome):
+        return self.por_nome.get(nome)
+
+    def buscar(self, consulta, limite=BUSCA_LIMITE):
+        return self.busca.buscar(consulta, limite)
+
+def get_catalogo_clientes():
+    """Catálogo de clientes, reconstruído apenas quando a tabela CLIENTES é recarregada"""
+    return get_cache_tabelas().derivado("clientes", "catalogo", _load_clientes, CatalogoClientes)
 
 def get_cliente_by_nome(nome):
     """Busca cliente pelo nome"""
-    clientes_df = load_clientes()
-    if not clientes_df.empty and 'nome' in clientes_df.columns:
-        cliente = clientes_df[clientes_df['nome'] == nome]
-        if not cliente.empty:
-            return cliente.iloc[0]
-    return None
+    return get_catalogo_clientes().get(nome)
 
 # --- Funções para Peças ---
 def load_pecas():
-    """Carrega lista de peças do Google Sheets"""
-    client_info = get_client_and_worksheets()
-    
-    if client_info and client_info["pecas"]:
-        try:
-            df = read_from_sheet(client_info["pecas"])
-            if not df.empty and 'ativo' in df.columns:
-                df = df[df['ativo'].str.upper() == 'SIM']
-            return df
-        except Exception as e:
-            st.error(f"Erro ao carregar peças: {str(e)}")
-    
-    # Fallback para CSV
-    if os.path.exists(PECAS_CSV):
-        df = pd.read_csv(PECAS_CSV)
-        if 'ativo' in df.columns:
-            df = df[df['ativo'].str.upper() == 'SIM']
-        return df
-    
-    return pd.DataFrame()
+    """Carrega lista de peças (com cache compartilhado)"""
+    return get_cache_tabelas().obter("pecas", _load_pecas)
+
+def _load_pecas():
+    """Carrega lista de peças ativas do backend"""
+    df = ler_tabela("pecas")
+    if not df.empty and 'ativo' in df.columns:
+        df = df[df['ativo']]
+    return df
+
+class CatalogoPecas:
+    """Índice do catálogo de peças: código -> registro já preparado para a interface"""
+
+    def __init__(self, pecas_df):
+        self.por_codigo = {}
+        self.por_rotulo = {}
+        self.rotulos = []
+        
+        for registro in pecas_df.to_dict('records'):
+            # Códigos numéricos chegam como int do Sheets; a interface usa texto
+            codigo = str(registro.get('codigo', '')).strip()
+            if not codigo:
+                continue
+            campos_str = registro.get('campos_especificos', '')
+            if pd.notna(campos_str) and str(campos_str).strip() != '':
+                campos = [campo.strip() for campo in str(campos_str).split(',') if campo.strip()]
+            else:
+                campos = []
+            peca = dict(registro)
+            peca['codigo'] = codigo
+            peca['campos'] = campos
+            peca['rotulo'] = f"{codigo} - {registro.get('descricao', '')} ({registro.get('categoria', '')})"
+            
+            self.por_codigo[codigo] = peca
+            self.por_rotulo[peca['rotulo']] = peca
+            self.rotulos.append(peca['rotulo'])
+        
+        self.busca = IndiceBusca([
+            (peca['rotulo'], [peca['codigo'], peca.get('descricao', ''), peca.get('categoria', '')])
+            for peca in self.por_codigo.values()
+        ])
+
+    def __len__(self):
+        return len(self.por_codigo)
+
+    def get(self, codigo):
+        return self.por_codigo.get(str(codigo).strip())
+
+    def buscar(self, consulta, limite=BUSCA_LIMITE):
+        """(rótulos das melhores peças para a consulta, total encontrado)"""
+        return self.busca.buscar(consulta, limite)
+
+def get_catalogo_pecas():
+    """Catálogo de peças indexado, reconstruído apenas quando a tabela PECAS é recarregada"""
+    return get_cache_tabelas().derivado("pecas", "catalogo", _load_pecas, CatalogoPecas)
 
 def get_peca_by_codigo(codigo):
     """Busca peça pelo código"""
-    pecas_df = load_pecas()
-    if not pecas_df.empty:
-        peca = pecas_df[pecas_df['codigo'] == codigo]
-        if not peca.empty:
-            return peca.iloc[0]
-    return None
+    return get_catalogo_pecas().get(codigo)
 
 def get_campos_por_peca(codigo_peca):
     """Retorna os campos específicos para uma peça"""
-    pecas_df = load_pecas()
-    if not pecas_df.empty and 'campos_especificos' in pecas_df.columns:
-        peca = pecas_df[pecas_df['codigo'] == codigo_peca]
-        if not peca.empty:
-            campos_str = peca.iloc[0]['campos_especificos']
-            if pd.notna(campos_str) and campos_str != '':
-                return [campo.strip() for campo in campos_str.split(',')]
-    return []
+    peca = get_catalogo_pecas().get(codigo_peca)
+    return list(peca['campos']) if peca else []
 
 def render_campos_dinamicos(campos):
     """Renderiza campos dinâmicos baseado na lista"""
@@ -436,12 +1227,21 @@ def render_campos_dinamicos(campos):
     return valores
 
 # --- Funções para CVT ---
-def append_cvt(data):
-    """Salva CVT no Google Sheets ou CSV"""
-    client_info = get_client_and_worksheets()
-    
+@st.cache_resource
+def get_alocador_cvt():
+    return AlocadorNumeros(get_storage(), "cvt", tamanho_bloco=CVT_BLOCO_NUMEROS)
+
+def gerar_numero_cvt():
+    """Número único de CVT: data + sequência global (ex.: CVT-20251006-0000123)"""
+    # 7 dígitos na sequência: não colide com números antigos (HHMMSS)
+    with medir("storage", "reservar_numero:cvt"):
+        sequencia = get_alocador_cvt().proximo()
+    return f"CVT-{datetime.datetime.now().strftime('%Y%m%d')}-{sequencia:07d}"
+
+def append_cvt(data, notificar=True):
+    """Salva CVT no backend ativo (Google Sheets ou armazenamento local)"""
     # Gera número único para CVT
-    numero_cvt = f"CVT-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    numero_cvt = gerar_numero_cvt()
     
     row = [
         datetime.datetime.now().isoformat(),
@@ -456,40 +1256,39 @@ def append_cvt(data):
         numero_cvt
     ]
     
-    if client_info and client_info["cvt"]:
-        success = append_to_sheet(client_info["cvt"], row)
-        if success:
-            st.success(f"CVT {numero_cvt} salva com sucesso no Google Sheets!")
-            return numero_cvt
-    else:
-        # Fallback para CSV
-        df = pd.DataFrame([row], columns=CVT_COLUMNS)
-        if os.path.exists(CVT_CSV):
-            existing_df = pd.read_csv(CVT_CSV)
-            df = pd.concat([existing_df, df], ignore_index=True)
-        df.to_csv(CVT_CSV, index=False)
-        st.success(f"CVT {numero_cvt} salva localmente!")
+    if gravar_linhas("cvt", [row]):
+        if notificar:
+            st.success(f"CVT {numero_cvt} salva com sucesso {destino_gravacao()}!")
         return numero_cvt
     
     return None
 
 def read_all_cvt():
-    """Lê todas as CVTs"""
-    client_info = get_client_and_worksheets()
-    
-    if client_info and client_info["cvt"]:
-        return read_from_sheet(client_info["cvt"])
-    else:
-        if os.path.exists(CVT_CSV):
-            return pd.read_csv(CVT_CSV)
-        return pd.DataFrame(columns=CVT_COLUMNS)
+    """Lê todas as CVTs (com cache compartilhado)"""
+    return get_cache_tabelas().obter("cvt", _read_all_cvt)
+
+def _read_all_cvt():
+    """Lê todas as CVTs do backend"""
+    return ler_tabela("cvt")
+
+def get_agregados_cvt():
+    """Totais das CVTs (por técnico e com peças) mantidos a cada gravação"""
+    return get_cache_tabelas().derivado(
+        "cvt", "agregados", _read_all_cvt,
+        lambda df: AgregadosTabela(df, ["tecnico"], nao_vazias=["pecas_requeridas"])
+    )
+
+def get_indice_cvt():
+    """Índice das CVTs por técnico e status (reconstruído a cada carga)"""
+    return get_cache_tabelas().derivado(
+        "cvt", "indice", _read_all_cvt,
+        lambda df: IndiceTabela(df, ["tecnico", "status_cvt"])
+    )
 
 # --- Funções para Requisições ---
-def append_requisicao(data):
-    """Salva requisição de peças"""
-    client_info = get_client_and_worksheets()
-    
-    row = [
+def _linha_requisicao(data):
+    """Monta a linha da planilha REQUISICOES a partir dos dados da requisição"""
+    return [
         datetime.datetime.now().isoformat(),
         data["tecnico"],
         data["numero_cvt"],
@@ -501,50 +1300,291 @@ def append_requisicao(data):
         data.get("prioridade", "NORMAL"),
         data.get("observacoes", "")
     ]
+
+def append_requisicoes(lista, notificar=True):
+    """Salva várias requisições de peças em uma única gravação"""
+    rows = [_linha_requisicao(data) for data in lista]
+    if not rows:
+        return True
     
-    if client_info and client_info["req"]:
-        success = append_to_sheet(client_info["req"], row)
-        if success:
-            st.success("Requisição salva com sucesso no Google Sheets!")
-    else:
-        df = pd.DataFrame([row], columns=REQ_COLUMNS)
-        if os.path.exists(REQ_CSV):
-            existing_df = pd.read_csv(REQ_CSV)
-            df = pd.concat([existing_df, df], ignore_index=True)
-        df.to_csv(REQ_CSV, index=False)
-        st.success("Requisição salva localmente!")
+    success = gravar_linhas("req", rows)
+    if success and notificar:
+        st.success(f"{len(rows)} requisição(ões) salva(s) com sucesso {destino_gravacao()}!")
+    return success
 
-def read_all_requisicoes():
-    """Lê todas as requisições"""
-    client_info = get_client_and_worksheets()
+def append_requisicao(data):
+    """Salva requisição de peças"""
+    return append_requisicoes([data])
+
+def salvar_cvt_com_pecas(cvt_data, pecas, numero_cvt=None):
+    """Salva a CVT e todas as suas requisições (uma gravação para as peças).
+
+    Se `numero_cvt` for informado a CVT já foi gravada numa tentativa
+    anterior e apenas as requisições são enviadas.
+    Retorna (numero_cvt, pecas_salvas).
+    """
+    if not numero_cvt:
+        numero_cvt = append_cvt(cvt_data, notificar=False)
+        if not numero_cvt:
+            return None, False
     
-    if client_info and client_info["req"]:
-        return read_from_sheet(client_info["req"])
-    else:
-        if os.path.exists(REQ_CSV):
-            return pd.read_csv(REQ_CSV)
-        return pd.DataFrame(columns=REQ_COLUMNS)
+    requisicoes = []
+    for peca in pecas:
+        descricao_completa = f"{peca['descricao']} [{peca['dados_extras']}]" if peca['dados_extras'] else peca['descricao']
+        requisicoes.append({
+            "tecnico": cvt_data["tecnico"],
+            "numero_cvt": numero_cvt,
+            "peca_codigo": peca['codigo'],
+            "peca_descricao": descricao_completa,
+            "quantidade": peca['quantidade'],
+            "prioridade": peca['prioridade'],
+            "observacoes": peca['observacoes']
+        })
+    
+    return numero_cvt, append_requisicoes(requisicoes, notificar=False)
+
+def read_all_requisicoes():
+    """Lê todas as requisições (com cache compartilhado)"""
+    return get_cache_tabelas().obter("req", _read_all_requisicoes)
+
+def _read_all_requisicoes():
+    """Lê todas as requisições do backend"""
+    return ler_tabela("req")
+
+def get_agregados_requisicoes():
+    """Totais das requisições por status, prioridade e técnico"""
+    return get_cache_tabelas().derivado(
+        "req", "agregados", _read_all_requisicoes,
+        lambda df: AgregadosTabela(df, ["status", "prioridade", "tecnico"])
+    )
+
+def agregados_requisicoes_do_periodo(desde):
+    """Totais das requisições a partir de `desde`.
+
+    Período do cache: os contadores materializados. Antes dele, os meses
+    fechados vêm do snapshot (só as colunas contadas) somados ao mês em
+    cache; sem snapshot, as partições do período são lidas do backend.
+    """
+    colunas = ["status", "prioridade", "tecnico"]
+    periodo = periodo_em_cache("req")
+    if desde == periodo:
+        return get_agregados_requisicoes()
+    fora_do_cache = periodo is not None and (desde is None or pd.Timestamp(desde) < periodo)
+    snapshots = snapshot_do_historico("req") if fora_do_cache else None
+    if snapshots is not None:
+        try:
+            with medir("snapshot", "agregados:req"):
+                agregados = AgregadosTabela(snapshots.ler("req", desde=desde, ate=periodo, colunas=colunas), colunas)
+            agregados.adicionar(read_all_requisicoes())
+            return agregados
+        except Exception:
+            get_telemetria().contar("snapshot_falha:req")
+    return AgregadosTabela(consultar_tabela("req", get_indice_requisicoes, {}, desde=desde, ordem=None), colunas)
+
+def get_indice_requisicoes():
+    """Índice das requisições por técnico, status e prioridade"""
+    return get_cache_tabelas().derivado(
+        "req", "indice", _read_all_requisicoes,
+        lambda df: IndiceTabela(df, ["tecnico", "status", "prioridade"])
+    )
+
+def get_juncao_pecas():
+    """Junção CVT -> requisições, atualizada a cada requisição gravada"""
+    return get_cache_tabelas().derivado("req", "juncao_cvt", _read_all_requisicoes, JuncaoPecasCVT)
+
+def pecas_da_cvt(numero_cvt, criada_em=None):
+    """Requisições (lista de registros) de uma CVT, ou None se ela não tem peças.
+
+    CVTs anteriores ao período em cache (`criada_em`) são buscadas nas
+    partições a partir do mês da CVT.
+    """
+    with medir("cache", "pecas_da_cvt"):
+        juncao = get_juncao_pecas()
+        pecas = juncao.pecas(read_all_requisicoes(), numero_cvt)
+    if pecas:
+        return pecas
+    periodo = periodo_em_cache("req")
+    if periodo is not None and pd.notna(criada_em) and pd.Timestamp(criada_em) < periodo:
+        desde = pd.Timestamp(criada_em).to_period("M").to_timestamp()
+        pecas = consultar_tabela(
+            "req", get_indice_requisicoes, {"numero_cvt": numero_cvt}, desde=desde, ordem=None
+        ).to_dict('records')
+    return pecas or None
+
+# --- Snapshots Parquet ---
+@st.cache_resource
+def get_snapshots():
+    """Leitor dos snapshots mensais (None sem pyarrow ou com snapshots desativados)"""
+    if not SNAPSHOTS_ATIVOS:
+        return None
+    try:
+        # Importado só quando usado: o pyarrow pesa na partida do app
+        from snapshots import LeitorSnapshots
+        return LeitorSnapshots(SNAPSHOT_PASTA)
+    except (ImportError, RuntimeError):
+        # pyarrow não instalado: o histórico continua vindo do backend
+        return None
+
+@st.cache_resource
+def get_agendador_snapshots():
+    """Job que regenera os snapshots em segundo plano (None se desativado)"""
+    if get_snapshots() is None or not SNAPSHOT_INTERVALO:
+        return None
+    from snapshots import AgendadorSnapshots
+    agendador = AgendadorSnapshots(get_storage(), SNAPSHOT_PASTA, intervalo=SNAPSHOT_INTERVALO)
+    agendador.start()
+    return agendador
+
+def snapshot_do_historico(tabela):
+    """Leitor dos snapshots se eles cobrem todos os meses anteriores ao
+    período em cache da tabela; senão None (histórico lido do backend)
+    """
+    periodo = periodo_em_cache(tabela)
+    snapshots = get_snapshots()
+    if periodo is None or snapshots is None or not snapshots.cobre(tabela, periodo):
+        return None
+    return snapshots
+
+# --- Consultas filtradas ---
+def consultar_tabela(tabela, obter_indice, filtros, desde=None, limite=None, ordem="-created_at"):
+    """Linhas filtradas de `tabela` pelo caminho mais barato disponível.
+
+    Tabela fora do cache num backend com consulta nativa (SQLite): o filtro
+    vai para o banco (WHERE/ORDER BY/LIMIT nos índices) e só as linhas
+    pedidas são lidas. Período anterior ao mês em cache (partições
+    mensais): os meses fechados vêm do snapshot Parquet, se atualizado, e o
+    mês atual do cache; sem snapshot o backend lê só as partições do
+    período. Nos demais casos usa o índice da tabela em cache. Filtros com
+    valor None são ignorados.
+    """
+    filtros = {coluna: valor for coluna, valor in filtros.items() if valor is not None}
+    storage = get_storage()
+    # Período anterior ao do cache (partições mensais): lê só as partições dele
+    periodo = periodo_em_cache(tabela)
+    fora_do_cache = periodo is not None and (desde is None or pd.Timestamp(desde) < periodo)
+    if fora_do_cache or (storage.consulta_nativa and not get_cache_tabelas().em_cache(tabela)):
+        snapshots = snapshot_do_historico(tabela) if fora_do_cache else None
+        if snapshots is not None:
+            try:
+                return consultar_com_snapshot(snapshots, tabela, obter_indice, filtros, desde, limite, ordem)
+            except Exception:
+                # Snapshot ilegível (ex.: arquivo removido): segue pelo backend
+                get_telemetria().contar(f"snapshot_falha:{tabela}")
+        try:
+            with medir("storage", f"consultar:{tabela}"):
+                df = storage.consultar(tabela, desde=desde, limite=limite, ordem=ordem, **filtros)
+            return tipar_tabela(tabela, df)
+        except Exception as e:
+            if fora_do_cache:
+                st.error(f"Erro ao consultar {TABELAS[tabela]['sheet']}: {str(e)}")
+                return tipar_tabela(tabela, pd.DataFrame(columns=TABELAS[tabela]["colunas"]))
+            # Consulta direta indisponível: segue pelo índice do cache
+    with medir("cache", f"consultar:{tabela}"):
+        return obter_indice().consultar(filtros, desde=desde, limite=limite, ordem=ordem)
+
+def consultar_com_snapshot(snapshots, tabela, obter_indice, filtros, desde, limite, ordem):
+    """Meses fechados do snapshot (memory map, sem chamar o backend) mais o
+    mês em cache, com a ordem e o limite de consultar_tabela
+    """
+    periodo = periodo_em_cache(tabela)
+    with medir("snapshot", f"consultar:{tabela}"):
+        antigas = snapshots.ler(tabela, desde=desde, ate=periodo, **filtros)
+    with medir("cache", f"consultar:{tabela}"):
+        # Sem ordem pedida, a de gravação (mais antigas primeiro), como no backend
+        recentes = obter_indice().consultar(filtros, desde=periodo, ordem=None if ordem else "created_at")
+    df = unir_tipados(antigas, recentes)
+    if ordem:
+        coluna = ordem.lstrip("-")
+        df = df.sort_values(coluna, ascending=not ordem.startswith("-"), kind="stable", ignore_index=True)
+    if limite is not None:
+        df = df.head(limite)
+    return df
+
+def consultar_requisicoes(tecnico=None, status=None, prioridade=None, desde=None, limite=None, ordem="-created_at"):
+    """Requisições filtradas (mais recentes primeiro); custo proporcional às linhas selecionadas"""
+    return consultar_tabela(
+        "req", get_indice_requisicoes,
+        {"tecnico": tecnico, "status": status, "prioridade": prioridade},
+        desde=desde, limite=limite, ordem=ordem
+    )
+
+def consultar_cvts(tecnico=None, status_cvt=None, desde=None, limite=None, ordem="-created_at"):
+    """CVTs filtradas (mais recentes primeiro); custo proporcional às linhas selecionadas"""
+    return consultar_tabela(
+        "cvt", get_indice_cvt, {"tecnico": tecnico, "status_cvt": status_cvt},
+        desde=desde, limite=limite, ordem=ordem
+    )
+
+def indice_do_periodo(tabela, obter_indice, colunas, desde):
+    """Índice para filtros e paginação das linhas a partir de `desde`.
+
+    Quando o cache cobre exatamente o período usa o índice compartilhado;
+    senão indexa só as linhas consultadas (ex.: meses anteriores lidos das
+    partições, ou o mês atual de uma tabela inteira em cache).
+    """
+    if desde == periodo_em_cache(tabela):
+        return obter_indice()
+    return IndiceTabela(consultar_tabela(tabela, obter_indice, {}, desde=desde), colunas)
 
 # --- Sistema de Autenticação ---
+USUARIOS_PADRAO = [
+    {"username": "tecnico1", "password": "123", "role": "TECNICO", "nome": "João Silva"},
+    {"username": "tecnico2", "password": "123", "role": "TECNICO", "nome": "Maria Santos"},
+    {"username": "supervisor", "password": "admin", "role": "SUPERVISOR", "nome": "Carlos Oliveira"}
+]
+
 def load_users():
-    """Carrega usuários do Google Sheets ou CSV"""
-    client_info = get_client_and_worksheets()
-    
-    if client_info and client_info["users"]:
-        users_df = read_from_sheet(client_info["users"])
-        if not users_df.empty:
-            return users_df.to_dict('records')
-    
-    # Fallback para CSV
-    if os.path.exists(USERS_CSV):
-        return pd.read_csv(USERS_CSV).to_dict('records')
+    """Carrega usuários do backend ativo (com cache compartilhado)"""
+    users_df = get_cache_tabelas().obter("users", _load_users)
+    if not users_df.empty:
+        return users_df.to_dict('records')
     
     # Usuários padrão
-    return [
-        {"username": "tecnico1", "password": "123", "role": "TECNICO", "nome": "João Silva"},
-        {"username": "tecnico2", "password": "123", "role": "TECNICO", "nome": "Maria Santos"},
-        {"username": "supervisor", "password": "admin", "role": "SUPERVISOR", "nome": "Carlos Oliveira"}
-    ]
+    return USUARIOS_PADRAO
+
+def _load_users():
+    return ler_tabela("users")
+
+class IndiceCredenciais:
+    """username -> credencial (senha com hash ou texto puro legado, perfil e nome)"""
+
+    def __init__(self, users_df):
+        registros = users_df.to_dict('records') if not users_df.empty else USUARIOS_PADRAO
+        # Usuários padrão não existem no backend: não há o que migrar
+        self.padrao = users_df.empty
+        self.por_usuario = {str(u["username"]): u for u in registros}
+
+    def get(self, username):
+        return self.por_usuario.get(username)
+
+def get_indice_credenciais():
+    """Índice de login, reconstruído quando a tabela USERS é recarregada (TTL)"""
+    return get_cache_tabelas().derivado("users", "credenciais", _load_users, IndiceCredenciais)
+
+def migrar_senha_usuario(username, password):
+    """Grava o hash no lugar da senha em texto puro (após login bem-sucedido)"""
+    novo_hash = gerar_hash_senha(password)
+    try:
+        with medir("storage", "atualizar:users"):
+            atualizados = get_storage().atualizar("users", {"username": username}, {"password": novo_hash})
+        if atualizados:
+            get_cache_tabelas().invalidar("users")
+    except Exception:
+        # Falha na migração não impede o login; tenta de novo no próximo
+        pass
+
+def autenticar(username, password):
+    """Retorna o usuário se a senha confere, senão None"""
+    indice = get_indice_credenciais()
+    usuario = indice.get(username)
+    if usuario is None:
+        verificar_ficticio(password)
+        return None
+    if not verificar_senha(password, usuario["password"]):
+        return None
+    if not indice.padrao and senha_precisa_atualizar(usuario["password"]):
+        migrar_senha_usuario(username, password)
+    return usuario
 
 def login_form():
     """Formulário de login"""
@@ -556,11 +1596,7 @@ def login_form():
         submit = st.form_submit_button("Entrar")
         
         if submit:
-            users = load_users()
-            user_match = next(
-                (u for u in users if u["username"] == username and str(u["password"]) == str(password)),
-                None
-            )
+            user_match = autenticar(username, password)
             
             if user_match:
                 st.session_state.update({
@@ -587,8 +1623,8 @@ def seccion_pecas_cvt():
     st.markdown("---")
     st.subheader("⚙️ Pedido de Peças")
     
-    # Carrega lista de peças
-    pecas_df = load_pecas()
+    # Carrega o catálogo de peças (indexado por código)
+    catalogo = get_catalogo_pecas()
     
     # Inicializa listas e estados
     if 'pecas_adicionadas' not in st.session_state:
@@ -598,19 +1634,31 @@ def seccion_pecas_cvt():
     if 'peca_temp_campos' not in st.session_state:
         st.session_state.peca_temp_campos = {}
     
+    # Busca fora do formulário: filtra as opções a cada digitação
+    if len(catalogo):
+        busca_peca = st.text_input(
+            "🔎 Buscar peça", placeholder="Código, descrição ou categoria",
+            key="busca_peca_cvt"
+        )
+        opcoes_pecas, total_pecas = catalogo.buscar(busca_peca)
+        # Mantém a peça já escolhida entre as opções mesmo se a busca mudar
+        selecionada_antes = st.session_state.get("select_peca_cvt")
+        if selecionada_antes and selecionada_antes not in opcoes_pecas:
+            opcoes_pecas = [selecionada_antes] + opcoes_pecas
+        if total_pecas > BUSCA_LIMITE:
+            st.caption(f"Mostrando {BUSCA_LIMITE} de {total_pecas} peças. Refine a busca para encontrar outras.")
+        elif busca_peca and not total_pecas:
+            st.caption("Nenhuma peça encontrada para a busca.")
+    
     # ---------- FORM 1: Selecionar peça e abrir campos ----------
     with st.form("form_select_peca"):
         col1, col2 = st.columns([1, 2])
         
         with col1:
-            if not pecas_df.empty:
-                peca_options = pecas_df[['codigo', 'descricao', 'categoria']].apply(
-                    lambda x: f"{x['codigo']} - {x['descricao']} ({x['categoria']})", axis=1
-                ).tolist()
-                
+            if len(catalogo):
                 peca_selecionada = st.selectbox(
                     "Selecionar Peça", 
-                    options=[""] + peca_options,
+                    options=[""] + opcoes_pecas,
                     key="select_peca_cvt"
                 )
                 
@@ -618,9 +1666,9 @@ def seccion_pecas_cvt():
                 descricao_peca = ""
                 peca_info = None
                 if peca_selecionada:
-                    codigo_peca = peca_selecionada.split(" - ")[0]
-                    peca_info = get_peca_by_codigo(codigo_peca)
+                    peca_info = catalogo.por_rotulo.get(peca_selecionada)
                     if peca_info is not None:
+                        codigo_peca = peca_info['codigo']
                         st.text_input("Código", value=peca_info['codigo'], disabled=True)
                         st.text_input("Descrição", value=peca_info['descricao'], disabled=True)
                         st.text_input("Categoria", value=peca_info.get('categoria', 'N/A'), disabled=True)
@@ -637,7 +1685,7 @@ def seccion_pecas_cvt():
         
         if abrir_campos:
             # Valida e abre o modo de edição (não salva ainda)
-            if not pecas_df.empty and peca_selecionada:
+            if len(catalogo) and peca_selecionada:
                 if peca_info is not None:
                     st.session_state.peca_em_edicao = {
                         "codigo": peca_info['codigo'],
@@ -670,7 +1718,7 @@ def seccion_pecas_cvt():
         st.subheader(f"✍️ Detalhes da Peça: {peca_edit['descricao']}")
         
         codigo_edit = peca_edit['codigo']
-        campos_especificos = get_campos_por_peca(codigo_edit) if not pecas_df.empty else []
+        campos_especificos = get_campos_por_peca(codigo_edit)
         
         with st.form("form_editar_peca"):
             # Campos dinâmicos (se houver)
@@ -751,8 +1799,23 @@ def cvt_form():
     """Formulário para preenchimento de CVT - Peças aparecem só quando solicitado"""
     st.header(" Comprovante de Visita Técnica")
     
-    # Carrega lista de clientes
-    clientes_df = load_clientes()
+    # Carrega o catálogo de clientes (indexado por nome)
+    catalogo_clientes = get_catalogo_clientes()
+    
+    # Busca fora do formulário: filtra as opções a cada digitação
+    if len(catalogo_clientes):
+        busca_cliente = st.text_input(
+            "🔎 Buscar cliente", placeholder="Nome, código ou endereço",
+            key="busca_cliente_cvt"
+        )
+        cliente_options, total_clientes = catalogo_clientes.buscar(busca_cliente)
+        selecionado_antes = st.session_state.get("cliente_cvt")
+        if selecionado_antes and selecionado_antes not in cliente_options:
+            cliente_options = [selecionado_antes] + cliente_options
+        if total_clientes > BUSCA_LIMITE:
+            st.caption(f"Mostrando {BUSCA_LIMITE} de {total_clientes} clientes. Refine a busca para encontrar outros.")
+        elif busca_cliente and not total_clientes:
+            st.caption("Nenhum cliente encontrado para a busca.")
     
     with st.form("cvt_form", clear_on_submit=False):
         st.subheader("Dados da Visita")
@@ -761,12 +1824,12 @@ def cvt_form():
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            if not clientes_df.empty and 'nome' in clientes_df.columns:
-                cliente_options = clientes_df['nome'].tolist()
+            if len(catalogo_clientes):
                 cliente_selecionado = st.selectbox(
                     "Cliente *", 
                     options=[""] + cliente_options,
-                    help="Selecione o cliente da lista"
+                    help="Selecione o cliente da lista",
+                    key="cliente_cvt"
                 )
                 
                 # Busca endereço automaticamente quando cliente é selecionado
@@ -778,6 +1841,7 @@ def cvt_form():
                         endereco_cliente = cliente_info['endereco']
             else:
                 st.info("Nenhum cliente cadastrado na base de dados")
+                cliente_info = None
                 cliente_selecionado = st.text_input("Cliente *", placeholder="Nome do cliente")
                 endereco_cliente = st.text_input("Endereço *", placeholder="Endereço completo")
         
@@ -819,6 +1883,8 @@ def cvt_form():
                 st.error("Preencha todos os campos obrigatórios da CVT (*) antes de pedir peças")
             else:
                 st.session_state.mostrar_pecas = True
+                # Dados novos: um número gravado para os anteriores não vale mais
+                st.session_state.cvt_sem_pecas_salvas = None
                 st.session_state.dados_cvt_temp = {
                     "cliente": cliente_selecionado,
                     "endereco": endereco,
@@ -844,6 +1910,8 @@ def cvt_form():
                 numero_cvt = append_cvt(cvt_data)
                 if numero_cvt:
                     st.success(f"CVT {numero_cvt} salva sem peças!")
+                    st.session_state.cvt_sem_pecas_salvas = None
+                    st.session_state.dados_cvt_temp = None
                     st.session_state.cvt_salva = True
                     st.session_state.numero_cvt_salva = numero_cvt
                     st.rerun()
@@ -885,26 +1953,22 @@ def cvt_form():
                         "obs": dados_temp['obs'],
                         "pecas_requeridas": ", ".join([f"{p['codigo']} ({p['quantidade']})" for p in st.session_state.pecas_adicionadas])
                     }
-                    numero_cvt = append_cvt(cvt_data)
+                    # CVT e peças numa única submissão; se só as peças falharem,
+                    # a próxima tentativa reaproveita o número já gravado
+                    numero_cvt, pecas_salvas = salvar_cvt_com_pecas(
+                        cvt_data,
+                        st.session_state.pecas_adicionadas,
+                        numero_cvt=st.session_state.get('cvt_sem_pecas_salvas')
+                    )
                     
-                    if numero_cvt:
-                        # Salva cada peça como requisição
-                        for peca in st.session_state.pecas_adicionadas:
-                            descricao_completa = f"{peca['descricao']} [{peca['dados_extras']}]" if peca['dados_extras'] else peca['descricao']
-                            req_data = {
-                                "tecnico": st.session_state["user_nome"],
-                                "numero_cvt": numero_cvt,
-                                "peca_codigo": peca['codigo'],
-                                "peca_descricao": descricao_completa,
-                                "quantidade": peca['quantidade'],
-                                "prioridade": peca['prioridade'],
-                                "observacoes": peca['observacoes']
-                            }
-                            append_requisicao(req_data)
-                        
+                    if numero_cvt and not pecas_salvas:
+                        st.session_state.cvt_sem_pecas_salvas = numero_cvt
+                        st.error(f"CVT {numero_cvt} salva, mas as peças não foram gravadas. Clique em salvar novamente para reenviá-las.")
+                    elif numero_cvt:
                         st.success(f"CVT {numero_cvt} salva com {len(st.session_state.pecas_adicionadas)} peça(s)!")
                         
                         # Limpa o session state
+                        st.session_state.cvt_sem_pecas_salvas = None
                         st.session_state.mostrar_pecas = False
                         st.session_state.pecas_adicionadas = []
                         st.session_state.dados_cvt_temp = None
@@ -914,11 +1978,13 @@ def cvt_form():
         
         with col_save2:
             if st.button("↩️ Voltar para Editar CVT"):
+                st.session_state.cvt_sem_pecas_salvas = None
                 st.session_state.mostrar_pecas = False
                 st.rerun()
         
         with col_save3:
             if st.button("🗑️ Cancelar CVT"):
+                st.session_state.cvt_sem_pecas_salvas = None
                 st.session_state.mostrar_pecas = False
                 st.session_state.pecas_adicionadas = []
                 st.session_state.dados_cvt_temp = None
@@ -928,6 +1994,9 @@ def cvt_form():
     if st.session_state.get('cvt_salva', False):
         numero_cvt = st.session_state.get('numero_cvt_salva')
         st.success(f"CVT {numero_cvt} processada com sucesso!")
+        info_envio = (status_sincronizacao([numero_cvt]) or {}).get(numero_cvt)
+        if info_envio and info_envio["status"] != Outbox.ENVIADO:
+            st.info(f"{rotulo_sincronizacao(info_envio)} — a CVT já está salva e será enviada ao Google Sheets automaticamente.")
 
         # --- BOTÃO PARA BAIXAR PDF ---
         st.markdown("---")
@@ -941,22 +2010,17 @@ def cvt_form():
             dados_cvt = cvt_salva_df.iloc[0].to_dict()
             
             # Busca as peças relacionadas a esta CVT
-            req_df = read_all_requisicoes()
-            pecas_cvt = req_df[req_df['numero_cvt'] == numero_cvt]
-            pecas_lista = pecas_cvt.to_dict('records') if not pecas_cvt.empty else None
-            
-            # Gera o PDF
-            pdf = gerar_pdf_cvt(dados_cvt, pecas_lista)
+            pecas_lista = pecas_da_cvt(numero_cvt)
             
-            # Botão de download
+            # Gera o PDF em segundo plano (ou reaproveita do cache)
             nome_arquivo = f"CVT_{numero_cvt}.pdf"
-            criar_botao_download_pdf(pdf, nome_arquivo)
+            oferecer_pdf_cvt(dados_cvt, pecas_lista, nome_arquivo, key=f"pdf_salva_{numero_cvt}")
             
             col_pos1, col_pos2 = st.columns(2)
             with col_pos1:
                 if st.button("➕ Nova CVT"):
                     # Limpa tudo
-                    for key in ['cvt_salva', 'numero_cvt_salva', 'mostrar_pecas', 'pecas_adicionadas', 'dados_cvt_temp']:
+                    for key in ['cvt_salva', 'numero_cvt_salva', 'mostrar_pecas', 'pecas_adicionadas', 'dados_cvt_temp', 'cvt_sem_pecas_salvas']:
                         if key in st.session_state:
                             del st.session_state[key]
                     st.rerun()
@@ -968,21 +2032,24 @@ def cvt_form():
     # Seção para visualizar CVTs anteriores - FORA DO BLOCO ANTERIOR
     if st.session_state.get('mostrar_minhas_cvts', False):
         st.subheader("📋 Minhas CVTs Recentes")
-        cvt_df = read_all_cvt()
-        user_cvts = cvt_df[cvt_df["tecnico"] == st.session_state["user_nome"]]
+        desde = seletor_periodo("minhas_cvts_periodo")
+        # Já vêm ordenadas pela data (mais recentes primeiro)
+        user_cvts = consultar_cvts(tecnico=st.session_state["user_nome"], desde=desde)
         
         if not user_cvts.empty:
             display_cols = ["numero_cvt", "cliente", "endereco", "elevador", "created_at", "status_cvt"]
             display_df = user_cvts[display_cols].copy()
+            display_df["created_at"] = formatar_data(display_df["created_at"])
             
-            # Converte a data para formato legível
-            try:
-                display_df["created_at"] = pd.to_datetime(display_df["created_at"]).dt.strftime("%d/%m/%Y %H:%M")
-            except:
-                display_df["created_at"] = display_df["created_at"].astype(str)
+            # Situação do envio ao Google Sheets (com outbox ativo)
+            sincronizacao = status_sincronizacao(display_df["numero_cvt"].tolist())
+            if sincronizacao is not None:
+                display_df["sincronizacao"] = [
+                    rotulo_sincronizacao(sincronizacao.get(n)) for n in display_df["numero_cvt"]
+                ]
             
             # Mostra a tabela
-            st.dataframe(display_df.sort_values("created_at", ascending=False).head(10), use_container_width=True)
+            st.dataframe(display_df.head(10), use_container_width=True)
             
             # Adiciona opção de baixar PDF para cada CVT
             st.subheader("📄 Baixar PDF de CVTs Anteriores")
@@ -998,35 +2065,26 @@ def cvt_form():
                 
                 if cvt_selecionada:
                     # Busca dados completos da CVT selecionada
-                    cvt_completa_df = cvt_df[cvt_df['numero_cvt'] == cvt_selecionada]
+                    cvt_completa_df = user_cvts[user_cvts['numero_cvt'] == cvt_selecionada]
                     
                     if not cvt_completa_df.empty:
                         cvt_completa = cvt_completa_df.iloc[0].to_dict()
                         
                         # Busca peças
-                        req_df = read_all_requisicoes()
-                        pecas_cvt = req_df[req_df['numero_cvt'] == cvt_selecionada]
-                        pecas_lista = pecas_cvt.to_dict('records') if not pecas_cvt.empty else None
-                        
-                        # Gera o PDF
-                        pdf = gerar_pdf_cvt(cvt_completa, pecas_lista)
-                        pdf_output = pdf.output(dest='S').encode('latin-1')
+                        pecas_lista = pecas_da_cvt(cvt_selecionada, cvt_completa.get("created_at"))
                         
-                        # Botão de download
-                        st.download_button(
-                            label=f"📥 Baixar PDF da CVT {cvt_selecionada}",
-                            data=pdf_output,
-                            file_name=f"CVT_{cvt_selecionada}.pdf",
-                            mime="application/pdf",
+                        # Gera o PDF em segundo plano e mostra o botão de download
+                        oferecer_pdf_cvt(
+                            cvt_completa, pecas_lista, f"CVT_{cvt_selecionada}.pdf",
                             key=f"download_{cvt_selecionada}",
-                            use_container_width=True
+                            rotulo=f"📥 Baixar PDF da CVT {cvt_selecionada}"
                         )
                     else:
                         st.error("CVT não encontrada nos dados completos.")
             else:
                 st.info("Nenhuma CVT disponível para download.")
         else:
-            st.info("Nenhuma CVT encontrada.")
+            st.info("Nenhuma CVT encontrada no período.")
         
         # Botão para voltar
         if st.button("↩️ Voltar para Nova CVT"):
@@ -1037,42 +2095,188 @@ def minhas_requisicoes():
     """Mostra requisições do técnico logado"""
     st.header("Minhas Requisições")
     
-    df = read_all_requisicoes()
-    if df.empty:
-        st.info("Nenhuma requisição encontrada.")
-        return
-    
-    user_reqs = df[df["tecnico"] == st.session_state["user_nome"]]
-    
-    if user_reqs.empty:
-        st.info("Você não possui requisições registradas.")
+    # Só as requisições do técnico no período: a consulta não carrega as
+    # dos demais quando o backend filtra direto (SQLite) nem os meses fora
+    # do período (partições mensais)
+    col1, col2, col3 = st.columns(3)
+    with col3:
+        desde = seletor_periodo("minhas_req_periodo")
+    usuario = st.session_state["user_nome"]
+    minhas_df = consultar_requisicoes(tecnico=usuario, desde=desde)
+    if minhas_df.empty:
+        st.info("Você não possui requisições registradas no período.")
         return
+    indice = IndiceTabela(minhas_df, ["status", "prioridade"])
     
     # Filtros
-    col1, col2, col3 = st.columns(3)
     with col1:
         status_filter = st.selectbox("Filtrar por status", 
-                                   ["Todos"] + sorted(user_reqs["status"].unique()))
+                                   ["Todos"] + indice.valores("status"))
     with col2:
         prioridade_filter = st.selectbox("Filtrar por prioridade",
-                                       ["Todas"] + sorted(user_reqs["prioridade"].unique()))
+                                       ["Todas"] + indice.valores("prioridade"))
     
     # Aplicar filtros
-    filtered_reqs = user_reqs.copy()
+    filtros = {}
     if status_filter != "Todos":
-        filtered_reqs = filtered_reqs[filtered_reqs["status"] == status_filter]
+        filtros["status"] = status_filter
     if prioridade_filter != "Todas":
-        filtered_reqs = filtered_reqs[filtered_reqs["prioridade"] == prioridade_filter]
+        filtros["prioridade"] = prioridade_filter
     
     # Mostrar resultados
-    st.write(f"**Total de requisições:** {len(filtered_reqs)}")
+    st.write(f"**Total de requisições:** {indice.contar(**filtros)}")
     
-    # Formatação da tabela
     display_cols = ["created_at", "numero_cvt", "peca_descricao", "quantidade", "status", "prioridade"]
-    display_df = filtered_reqs[display_cols].copy()
-    display_df["created_at"] = pd.to_datetime(display_df["created_at"]).dt.strftime("%d/%m/%Y %H:%M")
+    exibir_paginado(indice, filtros, key="minhas_req", colunas=display_cols)
+
+def painel_diagnostico():
+    """Latências dos trechos instrumentados (storage, cache, PDF, seções da página)
+    por execução e por sessão, com exportação em JSON e no formato do Prometheus
+    """
+    telemetria = get_telemetria()
+    resumo = telemetria.resumo()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Execuções", resumo["execucoes"]["total"])
+    with col2:
+        st.metric("p50 por execução (ms)", resumo["execucoes"]["p50_ms"] or 0)
+    with col3:
+        st.metric("p95 por execução (ms)", resumo["execucoes"]["p95_ms"] or 0)
+    with col4:
+        st.metric("Sessões ativas", telemetria.sessoes_ativas())
+    st.caption(f"Medições desde {resumo['desde'].replace('T', ' ')}")
+    
+    st.markdown("**Trechos (ordenados pelo tempo total)**")
+    if resumo["trechos"]:
+        trechos_df = pd.DataFrame(resumo["trechos"])
+        categoria = st.selectbox(
+            "Categoria", ["Todas"] + sorted(trechos_df["categoria"].unique()), key="diagnostico_categoria"
+        )
+        if categoria != "Todas":
+            trechos_df = trechos_df[trechos_df["categoria"] == categoria]
+        trechos_df.columns = ["Categoria", "Trecho", "Chamadas", "p50 (ms)", "p95 (ms)", "Total (s)"]
+        st.dataframe(trechos_df, use_container_width=True, hide_index=True)
+    else:
+        st.info("Nenhum trecho medido ainda.")
+    
+    if resumo["eventos"]:
+        st.markdown("**Cache (acertos e faltas)**")
+        eventos_df = pd.DataFrame(
+            [evento.split(":", 1) + [total] for evento, total in sorted(resumo["eventos"].items())],
+            columns=["Evento", "Item", "Total"]
+        )
+        st.dataframe(eventos_df, use_container_width=True, hide_index=True)
+    
+    with st.expander("👤 Por sessão"):
+        if resumo["sessoes"]:
+            sessoes_df = pd.DataFrame(resumo["sessoes"])
+            sessoes_df.columns = ["Sessão", "Usuário", "Execuções", "p50 (ms)", "p95 (ms)", "Última"]
+            st.dataframe(sessoes_df, use_container_width=True, hide_index=True)
+        else:
+            st.info("Nenhuma sessão registrada.")
+    
+    with st.expander("🕒 Últimas execuções"):
+        for execucao in resumo["ultimas_execucoes"]:
+            # Os três trechos mais demorados de cada execução
+            principais = ", ".join(
+                f"{nome} {ms} ms" for nome, ms in list(execucao["trechos_ms"].items())[:3]
+            )
+            st.write(
+                f"`{execucao['inicio'][11:]}` {execucao['usuario'] or '-'} ({execucao['sessao']}): "
+                f"**{execucao['duracao_ms']} ms** — {principais or 'sem trechos'}"
+            )
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button(
+            "⬇️ JSON", data=telemetria.json(get_metricas_sheets()),
+            file_name="diagnostico_cvt.json", mime="application/json", use_container_width=True
+        )
+    with col2:
+        st.download_button(
+            "⬇️ Prometheus", data=telemetria.prometheus(get_metricas_sheets()),
+            file_name="metricas_cvt.prom", mime="text/plain", use_container_width=True
+        )
+    with col3:
+        if st.button("🧹 Zerar medições", use_container_width=True):
+            telemetria.zerar()
+            st.rerun()
+    
+    with st.expander("🧮 Memória das tabelas em cache"):
+        relatorio = get_cache_tabelas().relatorio_memoria()
+        if relatorio:
+            memoria_df = pd.DataFrame.from_dict(relatorio, orient="index")
+            for coluna in ["antes", "depois"]:
+                memoria_df[coluna] = (pd.to_numeric(memoria_df[coluna], errors="coerce") / 1024 ** 2).round(2)
+            memoria_df.columns = ["Linhas", "Antes da tipagem (MB)", "Depois (MB)"]
+            st.dataframe(memoria_df, use_container_width=True)
+        else:
+            st.info("Nenhuma tabela carregada.")
     
-    st.dataframe(display_df.sort_values("created_at", ascending=False), use_container_width=True)
+    storage = get_storage()
+    particionadas = [tabela for tabela in TABELAS if storage.particionada(tabela)]
+    if particionadas:
+        with st.expander("🗂️ Partições mensais"):
+            for tabela in particionadas:
+                particoes = storage.particoes(tabela)
+                st.write(f"**{TABELAS[tabela]['sheet']}:** {', '.join(particoes) or 'nenhuma partição ainda'}")
+            st.caption(f"Em cache: a partir de {inicio_mes().strftime('%m/%Y')}")
+    
+    with st.expander("📸 Snapshots Parquet"):
+        snapshots = get_snapshots()
+        if snapshots is None:
+            st.info("Snapshots desativados ou pyarrow não instalado: o histórico é lido do backend.")
+        else:
+            manifesto = snapshots.manifesto()
+            if manifesto is None:
+                st.info("Nenhum snapshot gerado ainda.")
+            else:
+                st.write(f"**Gerado em:** {snapshots.gerado_em().strftime('%d/%m/%Y %H:%M')} · pasta `{SNAPSHOT_PASTA}`")
+                for tabela, dados in manifesto["tabelas"].items():
+                    meses = sorted(dados["meses"])
+                    periodo = f"{meses[0]} a {meses[-1]}" if meses else "sem meses"
+                    st.write(f"**{TABELAS[tabela]['sheet']}:** {dados['linhas']} linha(s), {periodo}")
+                if not snapshots.cobre("req", inicio_mes()):
+                    st.warning("Snapshot anterior ao mês atual: o histórico é lido do backend até a próxima geração.")
+            agendador = get_agendador_snapshots()
+            if agendador is not None:
+                st.caption(f"Geração automática a cada {SNAPSHOT_INTERVALO / 3600:g} h")
+                if agendador.ultimo_erro:
+                    st.error(f"Última geração automática falhou: {agendador.ultimo_erro}")
+            if st.button("📸 Gerar snapshot agora", key="gerar_snapshot"):
+                from snapshots import gerar_snapshots
+                try:
+                    with st.spinner("Gerando snapshots..."), medir("snapshot", "gerar"):
+                        resultado = gerar_snapshots(get_storage(), SNAPSHOT_PASTA)
+                    gravados = sum(total["gravados"] for total in resultado.values())
+                    st.success(f"Snapshots atualizados ({gravados} arquivo(s) mensal(is) gravado(s))")
+                except Exception as e:
+                    st.error(f"Erro ao gerar snapshots: {str(e)}")
+    
+    with st.expander("⏱️ Inicialização do servidor"):
+        inicializacao = get_relatorio_inicializacao().resumo()
+        st.caption("Duração de cada etapa na partida do processo (primeira vez que ocorreu)")
+        st.dataframe(
+            pd.DataFrame({"Etapa": list(inicializacao), "Duração (ms)": list(inicializacao.values())}),
+            use_container_width=True, hide_index=True
+        )
+    
+    metricas = get_metricas_sheets()
+    if metricas is not None:
+        with st.expander("📡 Uso da API do Google Sheets"):
+            resumo_sheets = metricas.resumo()
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Chamadas no último minuto", f"{metricas.chamadas_ultimo_minuto()} / {SHEETS_COTA_POR_MINUTO}")
+            with col2:
+                st.metric("Novas tentativas", sum(op["retentativas"] for op in resumo_sheets["operacoes"].values()))
+            with col3:
+                st.metric("Espera no limitador (s)", resumo_sheets["espera_limitador_s"])
+            if resumo_sheets["erros"]:
+                st.write("**Erros por código HTTP:** " + ", ".join(f"{codigo}: {total}" for codigo, total in resumo_sheets["erros"].items()))
+            if resumo_sheets["operacoes"]:
+                st.dataframe(pd.DataFrame.from_dict(resumo_sheets["operacoes"], orient="index"), use_container_width=True)
 
 def supervisor_panel():
     """Painel exclusivo para supervisores"""
@@ -1082,133 +2286,137 @@ def supervisor_panel():
     
     st.header("Painel de Gerenciamento")
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "📦 Todas as Requisições", 
         "📊 Estatísticas", 
         "👥 CVTs",
-        "📄 Gerar PDFs"
+        "📄 Gerar PDFs",
+        "🩺 Diagnóstico"
     ])
     
-    with tab1:
+    with tab5:
+        painel_diagnostico()
+    
+    with tab1, medir("pagina", "supervisor:requisicoes"):
         st.subheader("Gestão de Requisições")
         
-        df = read_all_requisicoes()
-        if df.empty:
-            st.info("Nenhuma requisição encontrada.")
-            return
-        
-        # Filtros para supervisor
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            tecnico_filter = st.selectbox("Técnico", ["Todos"] + sorted(df["tecnico"].unique()))
-        with col2:
-            status_filter = st.selectbox("Status", ["Todos"] + sorted(df["status"].unique()))
-        with col3:
-            prioridade_filter = st.selectbox("Prioridade", ["Todas"] + sorted(df["prioridade"].unique()))
-        
-        # Aplicar filtros
-        filtered_df = df.copy()
-        if tecnico_filter != "Todos":
-            filtered_df = filtered_df[filtered_df["tecnico"] == tecnico_filter]
-        if status_filter != "Todos":
-            filtered_df = filtered_df[filtered_df["status"] == status_filter]
-        if prioridade_filter != "Todas":
-            filtered_df = filtered_df[filtered_df["prioridade"] == prioridade_filter]
-        
-        st.write(f"**Requisições encontradas:** {len(filtered_df)}")
-        
-        # Exibir tabela
-        st.dataframe(filtered_df.sort_values("created_at", ascending=False), use_container_width=True)
+        # Mês atual (partições mensais) ou tabela inteira vêm do cache;
+        # outros períodos são consultados e indexados na hora
+        desde = seletor_periodo("sup_req_periodo")
+        indice = indice_do_periodo("req", get_indice_requisicoes, ["tecnico", "status", "prioridade"], desde)
+        if indice.contar() == 0:
+            st.info("Nenhuma requisição encontrada no período.")
+        else:
+            # Filtros para supervisor
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                tecnico_filter = st.selectbox("Técnico", ["Todos"] + indice.valores("tecnico"))
+            with col2:
+                status_filter = st.selectbox("Status", ["Todos"] + indice.valores("status"))
+            with col3:
+                prioridade_filter = st.selectbox("Prioridade", ["Todas"] + indice.valores("prioridade"))
+            
+            # Aplicar filtros
+            filtros = {}
+            if tecnico_filter != "Todos":
+                filtros["tecnico"] = tecnico_filter
+            if status_filter != "Todos":
+                filtros["status"] = status_filter
+            if prioridade_filter != "Todas":
+                filtros["prioridade"] = prioridade_filter
+            
+            st.write(f"**Requisições encontradas:** {indice.contar(**filtros)}")
+            
+            # Exibir tabela (somente a página atual)
+            exibir_paginado(indice, filtros, key="sup_req")
     
-    with tab2:
+    with tab2, medir("pagina", "supervisor:estatisticas"):
         st.subheader("Estatísticas e Relatórios")
         
-        df = read_all_requisicoes()
-        if not df.empty:
+        desde_estatisticas = seletor_periodo("sup_estatisticas_periodo")
+        agregados = agregados_requisicoes_do_periodo(desde_estatisticas)
+        if snapshot_do_historico("req") is not None and desde_estatisticas != periodo_em_cache("req"):
+            st.caption(f"Meses anteriores do snapshot de {get_snapshots().gerado_em().strftime('%d/%m/%Y %H:%M')}.")
+        if agregados.total:
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                total = len(df)
-                pendentes = len(df[df["status"] == "PENDENTE"])
-                st.metric("Total Requisições", total)
-                st.metric("Pendentes", pendentes)
+                st.metric("Total Requisições", agregados.total)
+                st.metric("Pendentes", agregados.contagem("status", "PENDENTE"))
             
             with col2:
-                tecnicos = df["tecnico"].nunique()
-                st.metric("Técnicos Ativos", tecnicos)
+                st.metric("Técnicos Ativos", agregados.distintos("tecnico"))
             
             with col3:
-                urgentes = len(df[df["prioridade"] == "URGENTE"])
-                st.metric("Urgentes", urgentes)
+                st.metric("Urgentes", agregados.contagem("prioridade", "URGENTE"))
             
             # Gráfico simples de status
-            st.bar_chart(df["status"].value_counts())
+            st.bar_chart(agregados.serie("status"))
         else:
             st.info("Nenhuma requisição encontrada para estatísticas.")
+        
+        if st.button("🔄 Recalcular estatísticas", key="recalcular_estatisticas"):
+            get_cache_tabelas().descartar_derivado("req", "agregados")
+            get_cache_tabelas().descartar_derivado("cvt", "agregados")
+            st.rerun()
     
-    with tab3:
+    with tab3, medir("pagina", "supervisor:cvts"):
         st.subheader("CVTs dos Técnicos")
         
-        cvt_df = read_all_cvt()
-        if not cvt_df.empty:
+        desde_cvt = seletor_periodo("sup_cvt_periodo")
+        indice_cvt = indice_do_periodo("cvt", get_indice_cvt, ["tecnico", "status_cvt"], desde_cvt)
+        if indice_cvt.contar():
             # Filtros para CVTs
             col1, col2 = st.columns(2)
             with col1:
                 tecnico_cvt_filter = st.selectbox(
                     "Filtrar por Técnico", 
-                    ["Todos"] + sorted(cvt_df["tecnico"].unique()),
+                    ["Todos"] + indice_cvt.valores("tecnico"),
                     key="tecnico_cvt_filter"
                 )
             with col2:
                 status_cvt_filter = st.selectbox(
                     "Filtrar por Status",
-                    ["Todos"] + sorted(cvt_df["status_cvt"].unique()),
+                    ["Todos"] + indice_cvt.valores("status_cvt"),
                     key="status_cvt_filter"
                 )
             
             # Aplicar filtros
-            filtered_cvts = cvt_df.copy()
+            filtros_cvt = {}
             if tecnico_cvt_filter != "Todos":
-                filtered_cvts = filtered_cvts[filtered_cvts["tecnico"] == tecnico_cvt_filter]
+                filtros_cvt["tecnico"] = tecnico_cvt_filter
             if status_cvt_filter != "Todos":
-                filtered_cvts = filtered_cvts[filtered_cvts["status_cvt"] == status_cvt_filter]
+                filtros_cvt["status_cvt"] = status_cvt_filter
             
-            st.write(f"**CVTs encontradas:** {len(filtered_cvts)}")
+            st.write(f"**CVTs encontradas:** {indice_cvt.contar(**filtros_cvt)}")
             
-            # Formatar datas para exibição
-            display_cvts = filtered_cvts.copy()
-            try:
-                display_cvts["created_at"] = pd.to_datetime(display_cvts["created_at"]).dt.strftime("%d/%m/%Y %H:%M")
-            except:
-                display_cvts["created_at"] = display_cvts["created_at"].astype(str)
-            
-            # Mostrar tabela com colunas selecionadas
+            # Mostrar tabela com colunas selecionadas (somente a página atual)
             cols_to_show = ["numero_cvt", "tecnico", "cliente", "created_at", "status_cvt"]
-            st.dataframe(display_cvts[cols_to_show].sort_values("created_at", ascending=False), use_container_width=True)
+            exibir_paginado(indice_cvt, filtros_cvt, key="sup_cvt", colunas=cols_to_show)
         else:
-            st.info("Nenhuma CVT encontrada.")
+            st.info("Nenhuma CVT encontrada no período.")
     
-    with tab4:
+    with tab4, medir("pagina", "supervisor:pdfs"):
         st.subheader("📄 Gerar PDF de CVTs")
         
-        cvt_df = read_all_cvt()
-        if not cvt_df.empty:
+        desde_pdf = seletor_periodo("sup_pdf_periodo")
+        indice_cvt = indice_do_periodo("cvt", get_indice_cvt, ["tecnico", "status_cvt"], desde_pdf)
+        if indice_cvt.contar():
             # Filtros para busca de CVTs
             col1, col2 = st.columns(2)
             with col1:
                 tecnico_pdf_filter = st.selectbox(
                     "Filtrar por Técnico", 
-                    ["Todos"] + sorted(cvt_df["tecnico"].unique()),
+                    ["Todos"] + indice_cvt.valores("tecnico"),
                     key="tecnico_pdf_filter"
                 )
             with col2:
                 # Campo de busca por número da CVT
-                numero_cvt_busca = st.text_input("Buscar por Número da CVT", placeholder="Ex: CVT-20251006-232324")
+                numero_cvt_busca = st.text_input("Buscar por Número da CVT", placeholder="Ex: CVT-20251006-0000123")
             
             # Aplicar filtros
-            cvts_filtradas = cvt_df.copy()
-            if tecnico_pdf_filter != "Todos":
-                cvts_filtradas = cvts_filtradas[cvts_filtradas["tecnico"] == tecnico_pdf_filter]
+            filtros_pdf = {} if tecnico_pdf_filter == "Todos" else {"tecnico": tecnico_pdf_filter}
+            cvts_filtradas = indice_cvt.consultar(filtros_pdf)
             if numero_cvt_busca:
                 cvts_filtradas = cvts_filtradas[cvts_filtradas["numero_cvt"].str.contains(numero_cvt_busca, case=False, na=False)]
             
@@ -1217,9 +2425,10 @@ def supervisor_panel():
                 st.subheader("Selecionar CVT para Gerar PDF")
                 
                 # Criar opções para selectbox
-                cvts_options = cvts_filtradas.apply(
-                    lambda x: f"{x['numero_cvt']} - {x['cliente']} ({x['tecnico']}) - {x['created_at']}", 
-                    axis=1
+                cvts_options = (
+                    cvts_filtradas["numero_cvt"] + " - " + cvts_filtradas["cliente"]
+                    + " (" + cvts_filtradas["tecnico"].astype(str) + ") - "
+                    + formatar_data(cvts_filtradas["created_at"])
                 ).tolist()
                 
                 cvt_selecionada_str = st.selectbox(
@@ -1233,15 +2442,13 @@ def supervisor_panel():
                     numero_cvt_selecionada = cvt_selecionada_str.split(" - ")[0]
                     
                     # Buscar dados completos da CVT selecionada
-                    cvt_completa_df = cvt_df[cvt_df['numero_cvt'] == numero_cvt_selecionada]
+                    cvt_completa_df = cvts_filtradas[cvts_filtradas['numero_cvt'] == numero_cvt_selecionada]
                     
                     if not cvt_completa_df.empty:
                         cvt_completa = cvt_completa_df.iloc[0].to_dict()
                         
                         # Buscar peças relacionadas
-                        req_df = read_all_requisicoes()
-                        pecas_cvt = req_df[req_df['numero_cvt'] == numero_cvt_selecionada]
-                        pecas_lista = pecas_cvt.to_dict('records') if not pecas_cvt.empty else None
+                        pecas_lista = pecas_da_cvt(numero_cvt_selecionada, cvt_completa.get("created_at"))
                         
                         # Gerar preview dos dados
                         st.subheader("Pré-visualização dos Dados")
@@ -1250,7 +2457,7 @@ def supervisor_panel():
                             st.write(f"**Número CVT:** {cvt_completa.get('numero_cvt', 'N/A')}")
                             st.write(f"**Técnico:** {cvt_completa.get('tecnico', 'N/A')}")
                             st.write(f"**Cliente:** {cvt_completa.get('cliente', 'N/A')}")
-                            st.write(f"**Data:** {cvt_completa.get('created_at', 'N/A')}")
+                            st.write(f"**Data:** {formatar_data(cvt_completa_df['created_at']).iloc[0] or 'N/A'}")
                         with col_preview2:
                             st.write(f"**Endereço:** {cvt_completa.get('endereco', 'N/A')}")
                             st.write(f"**Elevador:** {cvt_completa.get('elevador', 'N/A')}")
@@ -1261,17 +2468,45 @@ def supervisor_panel():
                         st.markdown("---")
                         st.subheader("Gerar PDF")
                         
-                        # Gerar o PDF
-                        pdf = gerar_pdf_cvt(cvt_completa, pecas_lista)
-                        
-                        # Botão de download
+                        # Gerar o PDF em segundo plano (ou reaproveitar do cache)
                         nome_arquivo = f"CVT_{numero_cvt_selecionada}.pdf"
-                        criar_botao_download_pdf(pdf, nome_arquivo)
+                        oferecer_pdf_cvt(cvt_completa, pecas_lista, nome_arquivo, key=f"pdf_supervisor_{numero_cvt_selecionada}")
                         
                     else:
                         st.error("CVT selecionada não encontrada nos dados completos.")
                 else:
                     st.info("Selecione uma CVT da lista para gerar o PDF.")
+                
+                # Exportação em lote (auditorias mensais)
+                st.markdown("---")
+                st.subheader("📦 Exportar CVTs Filtradas")
+                st.caption(f"{len(cvts_filtradas)} CVT(s) serão incluídas no arquivo ZIP.")
+                if st.button("📦 Exportar todas as CVTs filtradas", key="exportar_zip"):
+                    barra = st.progress(0.0, text="Gerando PDFs...")
+                    
+                    def atualizar_barra(feitos, total):
+                        barra.progress(feitos / total, text=f"Gerando PDFs... {feitos}/{total}")
+                    
+                    try:
+                        st.session_state.zip_exportacao = {
+                            "nome": f"CVTs_{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.zip",
+                            "dados": exportar_cvts_zip(cvts_filtradas, atualizar_barra),
+                            "total": len(cvts_filtradas)
+                        }
+                    except Exception as e:
+                        st.error(f"Erro ao exportar PDFs: {str(e)}")
+                    barra.empty()
+                
+                exportacao = st.session_state.get("zip_exportacao")
+                if exportacao:
+                    st.download_button(
+                        label=f"📥 Baixar ZIP ({exportacao['total']} CVTs)",
+                        data=exportacao["dados"],
+                        file_name=exportacao["nome"],
+                        mime="application/zip",
+                        key="download_zip_exportacao",
+                        use_container_width=True
+                    )
             
             else:
                 st.info("Nenhuma CVT encontrada com os filtros aplicados.")
@@ -1279,18 +2514,19 @@ def supervisor_panel():
             # Mostrar estatísticas rápidas
             st.markdown("---")
             st.subheader("📊 Estatísticas das CVTs")
+            if periodo_em_cache("cvt") is not None:
+                st.caption("Totais do mês atual (partição em cache).")
             col_stat1, col_stat2, col_stat3 = st.columns(3)
+            agregados_cvt = get_agregados_cvt()
             with col_stat1:
-                st.metric("Total de CVTs", len(cvt_df))
+                st.metric("Total de CVTs", agregados_cvt.total)
             with col_stat2:
-                cvts_por_tecnico = cvt_df["tecnico"].nunique()
-                st.metric("Técnicos com CVTs", cvts_por_tecnico)
+                st.metric("Técnicos com CVTs", agregados_cvt.distintos("tecnico"))
             with col_stat3:
-                cvts_com_pecas = len(cvt_df[cvt_df["pecas_requeridas"] != ""])
-                st.metric("CVTs com Peças", cvts_com_pecas)
+                st.metric("CVTs com Peças", agregados_cvt.preenchidas["pecas_requeridas"])
                 
         else:
-            st.info("Nenhuma CVT encontrada no sistema.")
+            st.info("Nenhuma CVT encontrada no período.")
 
 # --- Interface Principal ---
 def main_interface():
@@ -1310,6 +2546,12 @@ def main_interface():
         if st.button("Sair", use_container_width=True):
             logout()
     
+    # Importado só após o login: a tela inicial não precisa do menu
+    from streamlit_option_menu import option_menu
+    
+    # Snapshots do histórico regenerados em segundo plano (uma thread por processo)
+    get_agendador_snapshots()
+    
     # Menu de navegação - REMOVIDA A ABA "REQUISIÇÃO"
     if st.session_state["role"] == "SUPERVISOR":
         menu_options = [" Nova CVT", " Minhas Req", "Gerenciamento"]
@@ -1337,11 +2579,14 @@ def main_interface():
     
     # Conteúdo baseado na seleção
     if selected == " Nova CVT":
-        cvt_form()
+        with medir("pagina", "nova_cvt"):
+            cvt_form()
     elif selected == " Minhas Req":
-        minhas_requisicoes()
+        with medir("pagina", "minhas_req"):
+            minhas_requisicoes()
     elif selected == "Gerenciamento":
-        supervisor_panel()
+        with medir("pagina", "gerenciamento"):
+            supervisor_panel()
 
 # --- App Principal ---
 def main():
@@ -1358,25 +2603,35 @@ def main():
         st.session_state.pecas_adicionadas = []
     if "dados_cvt_temp" not in st.session_state:
         st.session_state.dados_cvt_temp = None
+    if "cvt_sem_pecas_salvas" not in st.session_state:
+        st.session_state.cvt_sem_pecas_salvas = None
     if "mostrar_minhas_cvts" not in st.session_state:
         st.session_state.mostrar_minhas_cvts = False
     
-    # Verifica autenticação
-    if not st.session_state.authenticated:
-        login_form()
+    if "sessao_diagnostico" not in st.session_state:
+        st.session_state.sessao_diagnostico = uuid.uuid4().hex[:8]
+    
+    # Verifica autenticação (a execução inteira entra no painel de diagnóstico)
+    with get_telemetria().execucao(st.session_state.sessao_diagnostico, st.session_state.get("username")):
+        if not st.session_state.authenticated:
+            with medir("pagina", "login"):
+                login_form()
         
-        # Footer informativo
-        st.markdown("---")
-        st.markdown(
-            """
-            <div style='text-align: center; color: gray;'>
-            <small>Sistema CVT - Desenvolvido para gestão de visitas técnicas</small>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-    else:
-        main_interface()
+            # Footer informativo
+            st.markdown("---")
+            st.markdown(
+                """
+                <div style='text-align: center; color: gray;'>
+                <small>Sistema CVT - Desenvolvido para gestão de visitas técnicas</small>
+                </div>
+                """,
+                unsafe_allow_html=True
+            )
+        else:
+            main_interface()
+    
+    registrar_primeira_pagina()
+    exportar_metricas()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,504 @@
+"""Benchmarks dos caminhos críticos do Sistema CVT.
+
+Gera dados sintéticos (CVT, REQUISICOES, CLIENTES, PECAS e USERS) de 1 mil
+a 1 milhão de linhas e mede as funções do app contra o armazenamento CSV
+local e o Google Sheets simulado (fake_sheets) e, opcionalmente, o SQLite,
+gravando os resultados em JSON para comparar versões:
+
+    python .streamlit/benchmark.py gerar --linhas 100000 --pasta dados_bench
+    python .streamlit/benchmark.py medir --tamanhos 1000 10000 100000 --saida atual.json
+    python .streamlit/benchmark.py comparar base.json atual.json
+
+O app é importado como módulo, com o Streamlit em modo "bare":
+st.cache_resource funciona normalmente e as mensagens de interface são
+descartadas. Cada cenário roda numa pasta temporária própria.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from sheets_cota import percentil
+from snapshots import PYARROW_DISPONIVEL, gerar_snapshots
+from storage import SQLITE_DB, TABELAS, migrar_csvs, particionar_csvs
+
+BACKENDS = ("csv", "sheets", "sqlite")
+BACKENDS_PADRAO = ("csv", "sheets")
+
+CATEGORIAS_PECAS = ["Comando", "Tração", "Portas", "Segurança", "Iluminação", "Cabos"]
+NOMES_PECAS = [
+    "Botoeira", "Motor", "Contator", "Cabo de aço", "Polia", "Sensor de porta",
+    "Placa de comando", "Freio", "Rolamento", "Fonte", "Lâmpada", "Relé",
+]
+CAMPOS_PECAS = ["", "tipo,cor", "potencia,tensao", "comprimento", "modelo"]
+STATUS_REQUISICAO = ["PENDENTE", "APROVADA", "ENTREGUE"]
+
+
+# --- Dados sintéticos ---
+def gerar_dados(pasta, linhas, semente=42):
+    """Grava na `pasta` os CSVs locais com `linhas` CVTs e `linhas` requisições.
+
+    Clientes, peças e técnicos crescem com o volume (com teto), as datas
+    cobrem os últimos dois anos em ordem crescente e cada requisição aponta
+    para uma CVT com peças, como no uso real. Retorna o número de linhas
+    gravadas por tabela.
+    """
+    rng = np.random.default_rng(semente)
+    os.makedirs(pasta, exist_ok=True)
+
+    n_clientes = min(max(50, linhas // 50), 20000)
+    n_pecas = min(max(100, linhas // 200), 5000)
+    n_tecnicos = min(max(5, linhas // 5000), 200)
+    tecnicos = np.array([f"Técnico {i:03d}" for i in range(1, n_tecnicos + 1)], dtype=object)
+
+    clientes = pd.DataFrame({
+        "codigo": [f"C{i:05d}" for i in range(1, n_clientes + 1)],
+        "nome": [f"Condomínio {i:05d}" for i in range(1, n_clientes + 1)],
+        "endereco": [f"Rua {rng.integers(1, 500)}, {rng.integers(1, 2000)}" for _ in range(n_clientes)],
+        "telefone": [f"11{rng.integers(10 ** 8, 10 ** 9)}" for _ in range(n_clientes)],
+        "email": [f"contato{i}@exemplo.com" for i in range(1, n_clientes + 1)],
+        "responsavel": [f"Síndico {i}" for i in range(1, n_clientes + 1)],
+        "ativo": np.where(rng.random(n_clientes) < 0.9, "SIM", "NAO"),
+    })
+
+    codigos_pecas = np.array([f"P{i:05d}" for i in range(1, n_pecas + 1)], dtype=object)
+    descricoes_pecas = np.array([
+        f"{NOMES_PECAS[i % len(NOMES_PECAS)]} modelo {i:05d}" for i in range(1, n_pecas + 1)
+    ], dtype=object)
+    pecas = pd.DataFrame({
+        "codigo": codigos_pecas,
+        "descricao": descricoes_pecas,
+        "categoria": rng.choice(CATEGORIAS_PECAS, n_pecas),
+        "campos_especificos": rng.choice(CAMPOS_PECAS, n_pecas),
+        "ativo": np.where(rng.random(n_pecas) < 0.95, "SIM", "NAO"),
+    })
+
+    # CVTs em ordem cronológica nos últimos dois anos
+    inicio = pd.Timestamp.now().floor("s") - pd.Timedelta(days=730)
+    instantes = inicio + pd.to_timedelta(np.sort(rng.integers(0, 730 * 86400, linhas)), unit="s")
+    sequencias = pd.Series(np.arange(1, linhas + 1)).astype(str).str.zfill(7)
+    numeros = "CVT-" + pd.Series(instantes.strftime("%Y%m%d")) + "-" + sequencias
+    tecnico_cvt = tecnicos[rng.integers(0, n_tecnicos, linhas)]
+    clientes_cvt = rng.integers(0, n_clientes, linhas)
+
+    # Requisições: cada uma aponta para uma das CVTs com peças (~40%)
+    com_pecas = np.flatnonzero(rng.random(linhas) < 0.4)
+    if not len(com_pecas):
+        com_pecas = np.arange(linhas)
+    cvt_req = np.sort(rng.choice(com_pecas, linhas))
+    peca_req = rng.integers(0, n_pecas, linhas)
+    quantidade_req = rng.integers(1, 6, linhas)
+    requisicoes = pd.DataFrame({
+        "created_at": (instantes[cvt_req] + pd.to_timedelta(rng.integers(1, 60, linhas), unit="s"))
+        .strftime("%Y-%m-%dT%H:%M:%S"),
+        "tecnico": tecnico_cvt[cvt_req],
+        "numero_cvt": numeros.to_numpy()[cvt_req],
+        "ordem_id": "",
+        "peca_codigo": codigos_pecas[peca_req],
+        "peca_descricao": descricoes_pecas[peca_req],
+        "quantidade": quantidade_req,
+        "status": rng.choice(STATUS_REQUISICAO, linhas, p=[0.6, 0.25, 0.15]),
+        "prioridade": np.where(rng.random(linhas) < 0.15, "URGENTE", "NORMAL"),
+        "observacoes": "",
+    })
+
+    # pecas_requeridas da CVT resume as suas requisições, como no formulário
+    resumo = (requisicoes["peca_codigo"] + " (" + requisicoes["quantidade"].astype(str) + ")")
+    pecas_requeridas = pd.Series("", index=range(linhas), dtype=object)
+    agrupado = resumo.groupby(cvt_req).agg(", ".join)
+    pecas_requeridas.iloc[agrupado.index] = agrupado.to_numpy()
+
+    cvt = pd.DataFrame({
+        "created_at": instantes.strftime("%Y-%m-%dT%H:%M:%S"),
+        "tecnico": tecnico_cvt,
+        "cliente": clientes["nome"].to_numpy()[clientes_cvt],
+        "endereco": clientes["endereco"].to_numpy()[clientes_cvt],
+        "elevador": rng.choice(["Social", "Serviço", "Principal"], linhas),
+        "servico_realizado": rng.choice(
+            ["Manutenção preventiva", "Troca de peça", "Ajuste de porta", "Chamado de emergência"], linhas
+        ),
+        "obs": "",
+        "pecas_requeridas": pecas_requeridas.to_numpy(),
+        "status_cvt": "SALVO",
+        "numero_cvt": numeros.to_numpy(),
+    })
+
+    # Senhas em texto puro (legado): o app as converte no primeiro login
+    users = pd.DataFrame(
+        [{"username": "supervisor", "password": "admin", "role": "SUPERVISOR", "nome": "Supervisor"}]
+        + [
+            {"username": f"tecnico{i}", "password": "123", "role": "TECNICO", "nome": nome}
+            for i, nome in enumerate(tecnicos, start=1)
+        ]
+    )
+
+    tabelas = {"cvt": cvt, "req": requisicoes, "users": users, "clientes": clientes, "pecas": pecas}
+    for nome, df in tabelas.items():
+        df[TABELAS[nome]["colunas"]].to_csv(os.path.join(pasta, TABELAS[nome]["csv"]), index=False)
+    return {nome: len(df) for nome, df in tabelas.items()}
+
+
+# --- Medições ---
+def resumir(tempos):
+    """Estatísticas (ms) de uma lista de durações em segundos"""
+    return {
+        "n": len(tempos),
+        "min_ms": round(min(tempos) * 1000, 3),
+        "mediana_ms": round(percentil(tempos, 50) * 1000, 3),
+        "p95_ms": round(percentil(tempos, 95) * 1000, 3),
+    }
+
+
+def cronometrar(funcao, repeticoes, preparar=None):
+    """Durações (s) de `repeticoes` execuções; `preparar` roda fora da medição"""
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def importar_app():
+    """Importa o app.py como módulo, sem as mensagens do modo bare"""
+    try:
+        from streamlit.logger import set_log_level
+        set_log_level("error")
+    except ImportError:
+        pass
+    import app
+    return app
+
+
+def preparar_backend(app, backend, pasta_dados, latencia):
+    """Aponta o app para o backend do cenário e descarta os recursos em cache"""
+    if backend == "sheets":
+        os.environ["CVT_FAKE_SHEETS"] = "1"
+        os.environ["CVT_FAKE_SHEETS_DADOS"] = pasta_dados
+        os.environ["CVT_FAKE_SHEETS_LATENCIA"] = str(latencia)
+    else:
+        os.environ.pop("CVT_FAKE_SHEETS", None)
+    app.LOCAL_BACKEND = backend if backend != "sheets" else "csv"
+    app.st.cache_resource.clear()
+
+
+def encerrar_backend(app):
+    """Para o envio do outbox do cenário (thread em segundo plano)"""
+    enviador = getattr(app.get_storage(), "enviador", None)
+    if enviador is not None:
+        enviador.parar()
+        enviador.join(timeout=10)
+    app.st.cache_resource.clear()
+
+
+def medir_cenario(app, backend, repeticoes, rng):
+    """Mede as funções do app no backend já preparado; retorna {medição: tempos}"""
+    cache = app.get_cache_tabelas()
+    storage = app.get_storage()
+    resultados = {}
+
+    def leitura_fria(tabela):
+        def preparar():
+            cache.invalidar(tabela)
+            # Backends com sincronização incremental baixam a tabela inteira
+            if hasattr(storage, "reconciliar"):
+                storage.reconciliar(tabela)
+        return preparar
+
+    resultados["read_all_cvt"] = cronometrar(app.read_all_cvt, repeticoes, leitura_fria("cvt"))
+    resultados["read_all_cvt_cache"] = cronometrar(app.read_all_cvt, repeticoes)
+    resultados["read_all_requisicoes"] = cronometrar(
+        app.read_all_requisicoes, repeticoes, leitura_fria("req")
+    )
+    resultados["read_all_requisicoes_cache"] = cronometrar(app.read_all_requisicoes, repeticoes)
+
+    # Filtros do painel do supervisor: índice (uma vez por carga) e uma
+    # rodada da aba de requisições (opções dos filtros, contagem e página)
+    resultados["indice_requisicoes"] = cronometrar(
+        app.get_indice_requisicoes, repeticoes,
+        lambda: cache.descartar_derivado("req", "indice"),
+    )
+    indice = app.get_indice_requisicoes()
+    tecnicos = indice.valores("tecnico")
+    combinacoes = [{}, {"status": "PENDENTE"}] + [
+        {"tecnico": tecnicos[i], "status": "PENDENTE"}
+        for i in rng.integers(0, len(tecnicos), 8)
+    ] if tecnicos else [{}]
+
+    def filtros_supervisor():
+        indice.valores("tecnico")
+        indice.valores("status")
+        for filtros in combinacoes:
+            indice.contar(**filtros)
+            indice.pagina(filtros, 1, 50)
+
+    resultados["filtros_supervisor"] = cronometrar(filtros_supervisor, repeticoes)
+
+    # Histórico de um técnico: com a tabela em cache (índice) e fora dele
+    # (SQLite consulta o banco; os demais backends recarregam a tabela)
+    if tecnicos:
+        def historico():
+            app.consultar_requisicoes(tecnico=tecnicos[0])
+        resultados["consultar_requisicoes"] = cronometrar(historico, repeticoes)
+        resultados["consultar_requisicoes_frio"] = cronometrar(historico, repeticoes, leitura_fria("req"))
+
+        # Só o mês atual (com partições mensais: uma partição)
+        def historico_mes():
+            app.consultar_requisicoes(tecnico=tecnicos[0], desde=app.inicio_mes())
+        resultados["consultar_requisicoes_mes_frio"] = cronometrar(historico_mes, repeticoes, leitura_fria("req"))
+
+        # Histórico pelos snapshots Parquet (meses fechados sem ler o backend);
+        # exige pyarrow e as partições mensais (o mês atual vem do cache)
+        if PYARROW_DISPONIVEL and storage.particionada("req"):
+            resultados["gerar_snapshots"] = cronometrar(
+                lambda: gerar_snapshots(storage, app.SNAPSHOT_PASTA), 1
+            )
+            app.SNAPSHOTS_ATIVOS = True
+            app.get_snapshots.clear()
+            try:
+                resultados["consultar_requisicoes_snapshot"] = cronometrar(historico, repeticoes)
+                resultados["consultar_requisicoes_snapshot_frio"] = cronometrar(
+                    historico, repeticoes, app.get_snapshots.clear
+                )
+                resultados["agregados_historico_snapshot"] = cronometrar(
+                    lambda: app.agregados_requisicoes_do_periodo(None), repeticoes
+                )
+            finally:
+                app.SNAPSHOTS_ATIVOS = False
+                app.get_snapshots.clear()
+
+    # Peças de uma CVT (pré-visualização e PDF): junção CVT -> requisições
+    resultados["juncao_pecas"] = cronometrar(
+        app.get_juncao_pecas, repeticoes,
+        lambda: cache.descartar_derivado("req", "juncao_cvt"),
+    )
+    numeros = app.read_all_requisicoes()["numero_cvt"].unique()
+    if len(numeros):
+        amostra = rng.choice(numeros, 20)
+
+        def pecas_da_cvt():
+            for numero in amostra:
+                app.pecas_da_cvt(numero)
+        resultados["pecas_da_cvt_x20"] = cronometrar(pecas_da_cvt, repeticoes)
+    resultados["agregados_requisicoes"] = cronometrar(
+        app.get_agregados_requisicoes, repeticoes,
+        lambda: cache.descartar_derivado("req", "agregados"),
+    )
+
+    # Catálogo de peças: construção (uma vez por carga) e busca por código
+    resultados["catalogo_pecas"] = cronometrar(
+        app.get_catalogo_pecas, repeticoes,
+        lambda: cache.descartar_derivado("pecas", "catalogo"),
+    )
+    codigos = list(app.load_pecas()["codigo"])
+    sorteados = [codigos[i] for i in rng.integers(0, len(codigos), 1000)] if codigos else []
+    if sorteados:
+        tempos = cronometrar(lambda: [app.get_peca_by_codigo(c) for c in sorteados], repeticoes)
+        resultados["get_peca_by_codigo"] = [t / len(sorteados) for t in tempos]
+
+    dados_cvt = {
+        "tecnico": "Técnico 001", "cliente": "Condomínio 00001", "endereco": "Rua 1, 10",
+        "elevador": "Social", "servico_realizado": "Benchmark", "obs": "",
+        "pecas_requeridas": "",
+    }
+    resultados["append_cvt"] = cronometrar(
+        lambda: app.append_cvt(dados_cvt, notificar=False), repeticoes
+    )
+    return resultados
+
+
+def medir_pdf(repeticoes, pecas=5):
+    """gerar_pdf_cvt + output de uma CVT com `pecas` requisições"""
+    from pdf_cvt import gerar_pdf_cvt, pdf_para_bytes
+
+    dados_cvt = {
+        "numero_cvt": "CVT-20250101-0000001", "created_at": "2025-01-01T10:00:00",
+        "tecnico": "Técnico 001", "cliente": "Condomínio 00001", "endereco": "Rua 1, 10",
+        "elevador": "Social", "servico_realizado": "Troca de peça", "obs": "Benchmark",
+        "pecas_requeridas": "", "status_cvt": "SALVO",
+    }
+    lista_pecas = [
+        {"peca_codigo": f"P{i:05d}", "peca_descricao": f"Peça {i}", "quantidade": 1,
+         "prioridade": "NORMAL", "status": "PENDENTE", "observacoes": ""}
+        for i in range(1, pecas + 1)
+    ]
+    # A primeira chamada inclui a importação do fpdf: fica fora da medição
+    pdf_para_bytes(gerar_pdf_cvt(dados_cvt, lista_pecas))
+    return cronometrar(lambda: pdf_para_bytes(gerar_pdf_cvt(dados_cvt, lista_pecas)), repeticoes)
+
+
+def versao_codigo():
+    """Commit atual do repositório (None fora do git)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def medir(tamanhos, backends=BACKENDS_PADRAO, repeticoes=5, latencia=0.0, outbox=True,
+          particoes=True, semente=42):
+    """Roda todos os cenários (tamanho x backend); retorna o relatório"""
+    rng = np.random.default_rng(semente)
+    if not outbox:
+        os.environ["CVT_OUTBOX"] = "0"
+    app = importar_app()
+    app.OUTBOX_ATIVO = outbox
+    app.PARTICOES_ATIVAS = particoes
+    # Snapshots só nas medições próprias: as demais medem o backend
+    app.SNAPSHOTS_ATIVOS = False
+    app.SNAPSHOT_INTERVALO = 0
+    relatorio = {
+        "versao": versao_codigo(),
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "plataforma": platform.platform(),
+        },
+        "config": {
+            "tamanhos": list(tamanhos), "backends": list(backends), "repeticoes": repeticoes,
+            "latencia_sheets_s": latencia, "outbox": outbox, "particoes": particoes,
+            "semente": semente,
+        },
+        "resultados": [],
+    }
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="cvt_bench_") as base:
+        try:
+            for linhas in tamanhos:
+                pasta_dados = os.path.join(base, f"dados_{linhas}")
+                inicio = time.perf_counter()
+                gerar_dados(pasta_dados, linhas, semente=semente)
+                print(f"{linhas} linhas geradas em {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+                for backend in backends:
+                    pasta = os.path.join(base, f"{backend}_{linhas}")
+                    shutil.copytree(pasta_dados, pasta)
+                    os.chdir(pasta)
+                    if backend == "sqlite":
+                        migrar_csvs(SQLITE_DB, pasta=pasta)
+                    elif particoes:
+                        # CSV e Sheets simulado leem os arquivos mensais
+                        particionar_csvs(pasta)
+                    preparar_backend(app, backend, pasta, latencia)
+                    try:
+                        tempos = medir_cenario(app, backend, repeticoes, rng)
+                    finally:
+                        encerrar_backend(app)
+                        os.chdir(diretorio_original)
+                    for medicao, valores in tempos.items():
+                        relatorio["resultados"].append(
+                            {"backend": backend, "linhas": linhas, "medicao": medicao, **resumir(valores)}
+                        )
+                    print(f"  {backend}: ok", file=sys.stderr)
+                shutil.rmtree(pasta_dados)
+        finally:
+            os.chdir(diretorio_original)
+    relatorio["resultados"].append(
+        {"backend": None, "linhas": None, "medicao": "gerar_pdf_cvt", **resumir(medir_pdf(repeticoes))}
+    )
+    return relatorio
+
+
+def _chave(resultado):
+    return (resultado["backend"], resultado["linhas"], resultado["medicao"])
+
+
+def comparar(base, atual, limiar=0.2):
+    """Linhas (chave, mediana base, mediana atual, variação) das medições em
+    comum; `regressoes` são as que ficaram mais de `limiar` mais lentas
+    """
+    medianas_base = {_chave(r): r["mediana_ms"] for r in base["resultados"]}
+    linhas, regressoes = [], []
+    for resultado in atual["resultados"]:
+        chave = _chave(resultado)
+        if chave not in medianas_base:
+            continue
+        antes, depois = medianas_base[chave], resultado["mediana_ms"]
+        variacao = (depois - antes) / antes if antes else 0.0
+        linhas.append((chave, antes, depois, variacao))
+        if variacao > limiar:
+            regressoes.append(chave)
+    return linhas, regressoes
+
+
+def _formatar_chave(chave):
+    backend, linhas, medicao = chave
+    return f"{medicao} [{backend or '-'}, {linhas or '-'}]"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do Sistema CVT")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    gerar = sub.add_parser("gerar", help="Gera os CSVs locais com dados sintéticos")
+    gerar.add_argument("--linhas", type=int, default=10000, help="CVTs e requisições a gerar")
+    gerar.add_argument("--pasta", default=".", help="Pasta de destino dos CSVs")
+    gerar.add_argument("--semente", type=int, default=42)
+
+    medicao = sub.add_parser("medir", help="Mede os caminhos críticos e grava o resultado em JSON")
+    medicao.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000])
+    medicao.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS_PADRAO))
+    medicao.add_argument("--repeticoes", type=int, default=5)
+    medicao.add_argument(
+        "--latencia", type=float, default=0.0, help="Segundos por chamada ao Sheets simulado"
+    )
+    medicao.add_argument(
+        "--sem-outbox", action="store_true", help="Grava direto no Sheets, sem o outbox local"
+    )
+    medicao.add_argument(
+        "--sem-particoes", action="store_true", help="CVT e REQUISICOES numa tabela única (sem partições mensais)"
+    )
+    medicao.add_argument("--semente", type=int, default=42)
+    medicao.add_argument("--saida", default="benchmark.json", help="Arquivo JSON de resultado")
+
+    comparacao = sub.add_parser("comparar", help="Compara dois resultados e aponta regressões")
+    comparacao.add_argument("base")
+    comparacao.add_argument("atual")
+    comparacao.add_argument(
+        "--limiar", type=float, default=0.2, help="Piora relativa considerada regressão (0.2 = 20%%)"
+    )
+
+    args = parser.parse_args()
+    if args.comando == "gerar":
+        for nome, total in gerar_dados(args.pasta, args.linhas, semente=args.semente).items():
+            print(f"{TABELAS[nome]['sheet']}: {total} linha(s)")
+    elif args.comando == "medir":
+        relatorio = medir(
+            args.tamanhos, args.backends, args.repeticoes, latencia=args.latencia,
+            outbox=not args.sem_outbox, particoes=not args.sem_particoes, semente=args.semente,
+        )
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+        for r in relatorio["resultados"]:
+            print(f"{_formatar_chave(_chave(r)):<50} mediana {r['mediana_ms']:>10.3f} ms  p95 {r['p95_ms']:>10.3f} ms")
+        print(f"Resultado gravado em {args.saida}")
+    elif args.comando == "comparar":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.atual, encoding="utf-8") as f:
+            atual = json.load(f)
+        linhas, regressoes = comparar(base, atual, args.limiar)
+        for chave, antes, depois, variacao in linhas:
+            marca = "  <-- regressão" if chave in regressoes else ""
+            print(f"{_formatar_chave(chave):<50} {antes:>10.3f} -> {depois:>10.3f} ms ({variacao:+.0%}){marca}")
+        if regressoes:
+            print(f"{len(regressoes)} regressão(ões) acima de {args.limiar:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
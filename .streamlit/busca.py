@@ -0,0 +1,106 @@
+"""Índice de busca em memória para os seletores de peças e clientes.
+
+Combina prefixo de palavras (busca binária numa lista ordenada de termos)
+com trigramas (tolera letras trocadas e trechos no meio da palavra).
+Acentos e maiúsculas são ignorados. Construído uma vez por carga do
+catálogo; cada busca devolve apenas os N melhores resultados.
+"""
+import bisect
+import collections
+import heapq
+import re
+import unicodedata
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com espaços simples"""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", texto.lower()))
+
+
+def trigramas(texto):
+    """Trigramas de cada palavra (com bordas), para casar trechos e erros de digitação"""
+    resultado = set()
+    for palavra in texto.split():
+        palavra = f"  {palavra} "
+        resultado.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return resultado
+
+
+class IndiceBusca:
+    """Busca os rótulos cujos textos casam com a consulta.
+
+    `itens` é uma lista de (rotulo, textos); o primeiro texto é tratado como
+    código: casar com ele pesa mais que casar com descrição ou categoria.
+    """
+
+    def __init__(self, itens):
+        self.rotulos = []
+        self._termos = []
+        self._codigos = []
+        self._trigramas = collections.defaultdict(list)
+
+        for posicao, (rotulo, textos) in enumerate(itens):
+            self.rotulos.append(rotulo)
+            normalizados = [normalizar(t) for t in textos if t is not None]
+            if normalizados and normalizados[0]:
+                self._codigos.append((normalizados[0], posicao))
+            palavras = set()
+            for texto in normalizados:
+                palavras.update(texto.split())
+            for palavra in palavras:
+                self._termos.append((palavra, posicao))
+            for trigrama in trigramas(" ".join(palavras)):
+                self._trigramas[trigrama].append(posicao)
+        self._termos.sort()
+        self._codigos.sort()
+
+    def __len__(self):
+        return len(self.rotulos)
+
+    def _por_prefixo(self, prefixo):
+        inicio = bisect.bisect_left(self._termos, (prefixo,))
+        encontrados = set()
+        for indice in range(inicio, len(self._termos)):
+            termo, posicao = self._termos[indice]
+            if not termo.startswith(prefixo):
+                break
+            encontrados.add(posicao)
+        return encontrados
+
+    def _por_codigo(self, consulta):
+        """(posição, exato) dos itens cujo código começa com a consulta"""
+        inicio = bisect.bisect_left(self._codigos, (consulta,))
+        for indice in range(inicio, len(self._codigos)):
+            codigo, posicao = self._codigos[indice]
+            if not codigo.startswith(consulta):
+                break
+            yield posicao, codigo == consulta
+
+    def buscar(self, consulta, limite=50):
+        """(rótulos dos `limite` melhores resultados, total de resultados)"""
+        consulta = normalizar(consulta or "")
+        if not consulta:
+            return self.rotulos[:limite], len(self.rotulos)
+
+        pontos = collections.Counter()
+        palavras = consulta.split()
+        for palavra in palavras:
+            for posicao in self._por_prefixo(palavra):
+                pontos[posicao] += 3
+        for posicao, exato in self._por_codigo(consulta):
+            pontos[posicao] += 10 if exato else 5
+
+        # Trigramas: só contam itens que dividem a maior parte deles com a consulta
+        da_consulta = trigramas(consulta)
+        comuns = collections.Counter()
+        for trigrama in da_consulta:
+            comuns.update(self._trigramas.get(trigrama, ()))
+        minimo = max(1, int(len(da_consulta) * 0.6))
+        for posicao, total in comuns.items():
+            if total >= minimo:
+                pontos[posicao] += 2 * total / len(da_consulta)
+
+        melhores = heapq.nsmallest(limite, pontos.items(), key=lambda item: (-item[1], item[0]))
+        return [self.rotulos[posicao] for posicao, _ in melhores], len(pontos)
@@ -0,0 +1,265 @@
+"""Instrumentação dos caminhos críticos do Sistema CVT.
+
+Cada trecho cronometrado tem categoria e nome, por exemplo
+("storage", "ler_tabela:req"), ("cache", "derivado:req:indice"),
+("pdf", "renderizar") ou ("pagina", "supervisor:requisicoes"). A duração
+entra nas estatísticas globais (p50/p95) e na execução do script
+(rerun do Streamlit) em andamento na thread; as execuções são agrupadas
+por sessão. Eventos sem duração (acertos e faltas de cache) são contadores.
+
+Os dados podem ser exportados como JSON ou no formato texto do
+Prometheus (inclusive para o coletor textfile do node_exporter).
+"""
+import collections
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+
+from sheets_cota import percentil
+
+# Sessões sem execução há mais tempo que isso não contam como ativas
+SESSAO_ATIVA_SEGUNDOS = 900
+
+
+def _ms(valores, p):
+    valor = percentil(valores, p)
+    return None if valor is None else round(valor * 1000, 1)
+
+
+def _rotulo(valor):
+    """Valor de rótulo do Prometheus com os escapes exigidos pelo formato"""
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Telemetria:
+    """Durações dos trechos instrumentados, por execução e por sessão (thread-safe)"""
+
+    def __init__(self, amostras=1000, execucoes=200, sessoes=500):
+        self.amostras = amostras
+        self.max_sessoes = sessoes
+        self._execucoes_maximas = execucoes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._exportado_em = 0.0
+        self.zerar()
+
+    def zerar(self):
+        with self._lock:
+            self.desde = time.time()
+            self._duracoes = collections.defaultdict(lambda: collections.deque(maxlen=self.amostras))
+            self._totais = collections.Counter()
+            self._chamadas = collections.Counter()
+            self.eventos = collections.Counter()
+            self._execucoes = collections.deque(maxlen=self._execucoes_maximas)
+            self._duracoes_execucao = collections.deque(maxlen=self.amostras)
+            self._soma_execucoes = 0.0
+            self._total_execucoes = 0
+            self._sessoes = {}
+
+    # --- Registro ---
+    def registrar(self, categoria, nome, segundos):
+        chave = (categoria, nome)
+        with self._lock:
+            self._duracoes[chave].append(segundos)
+            self._totais[chave] += segundos
+            self._chamadas[chave] += 1
+        execucao = getattr(self._local, "execucao", None)
+        if execucao is not None:
+            execucao["trechos"][f"{categoria}:{nome}"] += segundos
+
+    @contextlib.contextmanager
+    def trecho(self, categoria, nome):
+        """Cronometra o bloco (mesmo quando ele termina com exceção)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(categoria, nome, time.perf_counter() - inicio)
+
+    def contar(self, evento, quantidade=1):
+        with self._lock:
+            self.eventos[evento] += quantidade
+
+    @contextlib.contextmanager
+    def execucao(self, sessao, usuario=None):
+        """Agrupa os trechos registrados na thread durante uma execução do script"""
+        execucao = {
+            "sessao": sessao,
+            "usuario": usuario,
+            "inicio": time.time(),
+            "trechos": collections.Counter(),
+        }
+        anterior = getattr(self._local, "execucao", None)
+        self._local.execucao = execucao
+        inicio = time.perf_counter()
+        try:
+            yield execucao
+        finally:
+            self._local.execucao = anterior
+            execucao["duracao"] = time.perf_counter() - inicio
+            self._concluir_execucao(execucao)
+
+    def _concluir_execucao(self, execucao):
+        with self._lock:
+            self._execucoes.append(execucao)
+            self._duracoes_execucao.append(execucao["duracao"])
+            self._soma_execucoes += execucao["duracao"]
+            self._total_execucoes += 1
+            sessao = self._sessoes.get(execucao["sessao"])
+            if sessao is None:
+                if len(self._sessoes) >= self.max_sessoes:
+                    # Descarta a sessão parada há mais tempo
+                    antiga = min(self._sessoes, key=lambda s: self._sessoes[s]["ultima"])
+                    del self._sessoes[antiga]
+                sessao = self._sessoes[execucao["sessao"]] = {
+                    "usuario": None,
+                    "execucoes": 0,
+                    "duracoes": collections.deque(maxlen=100),
+                }
+            sessao["usuario"] = execucao["usuario"] or sessao["usuario"]
+            sessao["execucoes"] += 1
+            sessao["duracoes"].append(execucao["duracao"])
+            sessao["ultima"] = execucao["inicio"]
+
+    # --- Consulta ---
+    def sessoes_ativas(self):
+        limite = time.time() - SESSAO_ATIVA_SEGUNDOS
+        with self._lock:
+            return sum(1 for s in self._sessoes.values() if s["ultima"] >= limite)
+
+    def resumo(self, ultimas=20):
+        """Estatísticas por trecho, por execução e por sessão (durações em ms)"""
+        with self._lock:
+            trechos = [
+                {
+                    "categoria": categoria,
+                    "nome": nome,
+                    "chamadas": self._chamadas[(categoria, nome)],
+                    "p50_ms": _ms(list(duracoes), 50),
+                    "p95_ms": _ms(list(duracoes), 95),
+                    "total_s": round(self._totais[(categoria, nome)], 3),
+                }
+                for (categoria, nome), duracoes in self._duracoes.items()
+            ]
+            duracoes_execucao = list(self._duracoes_execucao)
+            sessoes = [
+                {
+                    "sessao": sessao,
+                    "usuario": info["usuario"],
+                    "execucoes": info["execucoes"],
+                    "p50_ms": _ms(list(info["duracoes"]), 50),
+                    "p95_ms": _ms(list(info["duracoes"]), 95),
+                    "ultima": datetime.datetime.fromtimestamp(info["ultima"]).isoformat(timespec="seconds"),
+                }
+                for sessao, info in self._sessoes.items()
+            ]
+            execucoes = list(self._execucoes)[-ultimas:]
+            total_execucoes = self._total_execucoes
+            eventos = dict(self.eventos)
+        return {
+            "desde": datetime.datetime.fromtimestamp(self.desde).isoformat(timespec="seconds"),
+            "execucoes": {
+                "total": total_execucoes,
+                "p50_ms": _ms(duracoes_execucao, 50),
+                "p95_ms": _ms(duracoes_execucao, 95),
+            },
+            "trechos": sorted(trechos, key=lambda t: t["total_s"], reverse=True),
+            "eventos": eventos,
+            "sessoes": sorted(sessoes, key=lambda s: s["ultima"], reverse=True),
+            "ultimas_execucoes": [
+                {
+                    "sessao": e["sessao"],
+                    "usuario": e["usuario"],
+                    "inicio": datetime.datetime.fromtimestamp(e["inicio"]).isoformat(timespec="seconds"),
+                    "duracao_ms": round(e["duracao"] * 1000, 1),
+                    "trechos_ms": {nome: round(s * 1000, 1) for nome, s in e["trechos"].most_common()},
+                }
+                for e in reversed(execucoes)
+            ],
+        }
+
+    # --- Exportação ---
+    def json(self, metricas_sheets=None):
+        dados = self.resumo()
+        if metricas_sheets is not None:
+            dados["sheets"] = metricas_sheets.resumo()
+        return json.dumps(dados, ensure_ascii=False, indent=2)
+
+    def prometheus(self, metricas_sheets=None):
+        """Texto no formato de exposição do Prometheus"""
+        with self._lock:
+            trechos = [
+                (chave, list(duracoes), self._totais[chave], self._chamadas[chave])
+                for chave, duracoes in self._duracoes.items()
+            ]
+            duracoes_execucao = list(self._duracoes_execucao)
+            soma_execucoes, total_execucoes = self._soma_execucoes, self._total_execucoes
+            eventos = dict(self.eventos)
+
+        linhas = [
+            "# HELP cvt_trecho_segundos Duração dos trechos instrumentados do app",
+            "# TYPE cvt_trecho_segundos summary",
+        ]
+        for (categoria, nome), duracoes, total, chamadas in trechos:
+            rotulos = f'categoria="{_rotulo(categoria)}",nome="{_rotulo(nome)}"'
+            for quantil in (0.5, 0.95):
+                linhas.append(
+                    f'cvt_trecho_segundos{{{rotulos},quantile="{quantil}"}} {percentil(duracoes, quantil * 100):.6f}'
+                )
+            linhas.append(f"cvt_trecho_segundos_sum{{{rotulos}}} {total:.6f}")
+            linhas.append(f"cvt_trecho_segundos_count{{{rotulos}}} {chamadas}")
+
+        linhas += [
+            "# HELP cvt_execucao_segundos Duração de cada execução do script (rerun)",
+            "# TYPE cvt_execucao_segundos summary",
+        ]
+        if duracoes_execucao:
+            for quantil in (0.5, 0.95):
+                linhas.append(
+                    f'cvt_execucao_segundos{{quantile="{quantil}"}} {percentil(duracoes_execucao, quantil * 100):.6f}'
+                )
+        linhas.append(f"cvt_execucao_segundos_sum {soma_execucoes:.6f}")
+        linhas.append(f"cvt_execucao_segundos_count {total_execucoes}")
+
+        linhas += ["# HELP cvt_eventos_total Eventos contados (acertos e faltas de cache)", "# TYPE cvt_eventos_total counter"]
+        for evento, total in sorted(eventos.items()):
+            linhas.append(f'cvt_eventos_total{{evento="{_rotulo(evento)}"}} {total}')
+
+        linhas += [
+            "# HELP cvt_sessoes_ativas Sessões com execução nos últimos 15 minutos",
+            "# TYPE cvt_sessoes_ativas gauge",
+            f"cvt_sessoes_ativas {self.sessoes_ativas()}",
+        ]
+
+        if metricas_sheets is not None:
+            resumo = metricas_sheets.resumo()
+            linhas += ["# HELP cvt_sheets_chamadas_total Chamadas à API do Google Sheets", "# TYPE cvt_sheets_chamadas_total counter"]
+            for operacao, dados in sorted(resumo["operacoes"].items()):
+                linhas.append(f'cvt_sheets_chamadas_total{{operacao="{_rotulo(operacao)}"}} {dados["chamadas"]}')
+            linhas += ["# HELP cvt_sheets_retentativas_total Novas tentativas após erro temporário", "# TYPE cvt_sheets_retentativas_total counter"]
+            for operacao, dados in sorted(resumo["operacoes"].items()):
+                linhas.append(f'cvt_sheets_retentativas_total{{operacao="{_rotulo(operacao)}"}} {dados["retentativas"]}')
+            linhas += ["# HELP cvt_sheets_erros_total Erros da API por código HTTP", "# TYPE cvt_sheets_erros_total counter"]
+            for status, total in sorted(resumo["erros"].items(), key=lambda item: str(item[0])):
+                linhas.append(f'cvt_sheets_erros_total{{status="{_rotulo(status)}"}} {total}')
+        return "\n".join(linhas) + "\n"
+
+    def exportacao_vencida(self, intervalo):
+        """True (no máximo uma vez a cada `intervalo` segundos) quando é hora de exportar"""
+        with self._lock:
+            agora = time.monotonic()
+            if agora - self._exportado_em < intervalo:
+                return False
+            self._exportado_em = agora
+            return True
+
+
+def gravar_arquivo(caminho, conteudo):
+    """Grava de forma atômica: quem lê o arquivo nunca vê uma versão pela metade"""
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
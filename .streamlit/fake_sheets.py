@@ -0,0 +1,316 @@
+"""Substituto local do gspread para medir o I/O do app sem conta Google.
+
+Cliente, planilhas e worksheets ficam em memória no próprio processo e
+cada operação conta como uma chamada à API, com latência configurável e
+erros de cota (HTTP 429) quando o limite por minuto é ultrapassado.
+
+No app, ative com variáveis de ambiente:
+
+    CVT_FAKE_SHEETS=1                  usa o FakeClient no lugar do gspread
+    CVT_FAKE_SHEETS_LATENCIA=0.3       segundos por chamada
+    CVT_FAKE_SHEETS_JITTER=0.1         variação aleatória da latência
+    CVT_FAKE_SHEETS_QUOTA=60           chamadas por minuto (0 = sem limite)
+    CVT_FAKE_SHEETS_TAXA_ERRO=0.01     probabilidade de erro 503 por chamada
+    CVT_FAKE_SHEETS_DADOS=pasta        carrega os CSVs locais da pasta
+"""
+import collections
+import csv
+import os
+import random
+import re
+import threading
+import time
+
+from storage import PADRAO_PARTICAO, SHEET_NAME, TABELAS, numericise_all
+
+try:
+    from gspread.exceptions import APIError as _APIErrorBase
+    from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
+except ImportError:
+    class _APIErrorBase(Exception):
+        def __init__(self, response):
+            super().__init__(response.json()["error"]["message"])
+            self.response = response
+
+    class SpreadsheetNotFound(Exception):
+        pass
+
+    class WorksheetNotFound(Exception):
+        pass
+
+
+class _RespostaFake:
+    """Imita o `requests.Response` que o gspread anexa ao APIError"""
+
+    def __init__(self, status_code, mensagem, status):
+        self.status_code = status_code
+        self.text = mensagem
+        self._erro = {"code": status_code, "message": mensagem, "status": status}
+
+    def json(self):
+        return {"error": self._erro}
+
+
+class FakeAPIError(_APIErrorBase):
+    """Erro da API simulada (`e.response.status_code` como no gspread)"""
+
+    def __init__(self, status_code, mensagem, status="UNKNOWN"):
+        super().__init__(_RespostaFake(status_code, mensagem, status))
+
+
+class FakeSheetsServer:
+    """Estado compartilhado da API simulada: latência, cota e contadores"""
+
+    def __init__(self, latencia=0.0, jitter=0.0, limite_por_minuto=0,
+                 taxa_erro=0.0, seed=None):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.limite_por_minuto = limite_por_minuto
+        self.taxa_erro = taxa_erro
+        self.planilhas = {}
+        self.chamadas = collections.Counter()
+        self.erros = collections.Counter()
+        self._janela = collections.deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def chamada(self, operacao):
+        """Registra uma chamada à API, aplicando latência, cota e falhas"""
+        with self._lock:
+            agora = time.monotonic()
+            while self._janela and agora - self._janela[0] >= 60:
+                self._janela.popleft()
+            self.chamadas[operacao] += 1
+            if self.limite_por_minuto and len(self._janela) >= self.limite_por_minuto:
+                self.erros["429"] += 1
+                raise FakeAPIError(
+                    429, "Quota exceeded for quota metric 'Read requests'",
+                    "RESOURCE_EXHAUSTED",
+                )
+            self._janela.append(agora)
+            falhou = self.taxa_erro and self._random.random() < self.taxa_erro
+            atraso = self.latencia + self._random.uniform(0, self.jitter)
+
+        if atraso > 0:
+            time.sleep(atraso)
+        if falhou:
+            with self._lock:
+                self.erros["503"] += 1
+            raise FakeAPIError(503, "The service is currently unavailable.", "UNAVAILABLE")
+
+    def total_chamadas(self):
+        return sum(self.chamadas.values())
+
+    def zerar_contadores(self):
+        with self._lock:
+            self.chamadas.clear()
+            self.erros.clear()
+
+
+class FakeClient:
+    """Equivalente ao cliente retornado por `gspread.authorize`"""
+
+    def __init__(self, server=None, cabecalhos=None):
+        self.server = server or FakeSheetsServer()
+        # Worksheets novas já nascem com cabeçalho (o app não escreve cabeçalhos)
+        self.cabecalhos = cabecalhos if cabecalhos is not None else {
+            tabela["sheet"]: tabela["colunas"] for tabela in TABELAS.values()
+        }
+
+    @classmethod
+    def do_ambiente(cls):
+        """Cria o cliente a partir das variáveis CVT_FAKE_SHEETS_*"""
+        server = FakeSheetsServer(
+            latencia=float(os.environ.get("CVT_FAKE_SHEETS_LATENCIA", 0)),
+            jitter=float(os.environ.get("CVT_FAKE_SHEETS_JITTER", 0)),
+            limite_por_minuto=int(os.environ.get("CVT_FAKE_SHEETS_QUOTA", 0)),
+            taxa_erro=float(os.environ.get("CVT_FAKE_SHEETS_TAXA_ERRO", 0)),
+        )
+        client = cls(server)
+        pasta = os.environ.get("CVT_FAKE_SHEETS_DADOS")
+        if pasta:
+            client.carregar_csvs(pasta)
+        return client
+
+    def open(self, title):
+        self.server.chamada("open")
+        if title not in self.server.planilhas:
+            raise SpreadsheetNotFound(title)
+        return self.server.planilhas[title]
+
+    def create(self, title):
+        self.server.chamada("create")
+        planilha = FakeSpreadsheet(self, title)
+        self.server.planilhas[title] = planilha
+        return planilha
+
+    def carregar_csvs(self, pasta, nome_planilha=SHEET_NAME):
+        """Popula as worksheets com os CSVs locais (sem contar chamadas).
+
+        CSVs mensais (ex.: cvt_local_2026-10.csv) viram as worksheets das
+        partições ("CVT_2026-10").
+        """
+        planilha = self.server.planilhas.get(nome_planilha) or FakeSpreadsheet(self, nome_planilha)
+        self.server.planilhas[nome_planilha] = planilha
+        arquivos = os.listdir(pasta) if os.path.isdir(pasta) else []
+        for tabela in TABELAS.values():
+            base, extensao = os.path.splitext(tabela["csv"])
+            padrao = re.compile(re.escape(base) + "_(" + PADRAO_PARTICAO + ")" + re.escape(extensao))
+            destinos = {tabela["csv"]: tabela["sheet"]}
+            for arquivo in arquivos:
+                m = padrao.fullmatch(arquivo)
+                if m:
+                    destinos[arquivo] = f"{tabela['sheet']}_{m.group(1)}"
+            for arquivo, titulo in destinos.items():
+                caminho = os.path.join(pasta, arquivo)
+                if not os.path.exists(caminho):
+                    continue
+                with open(caminho, newline="", encoding="utf-8") as f:
+                    linhas = list(csv.reader(f))
+                worksheet = planilha._criar(titulo, rows=max(len(linhas), 1000), cols=20)
+                worksheet._valores = [list(linha) for linha in linhas]
+        return planilha
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, title):
+        self.client = client
+        self.title = title
+        self._worksheets = {}
+
+    @property
+    def server(self):
+        return self.client.server
+
+    def _criar(self, title, rows, cols):
+        worksheet = FakeWorksheet(self, title, rows, cols)
+        cabecalho = self.client.cabecalhos.get(title)
+        if cabecalho:
+            worksheet._valores.append(list(cabecalho))
+        self._worksheets[title] = worksheet
+        return worksheet
+
+    def worksheet(self, title):
+        self.server.chamada("worksheet")
+        if title not in self._worksheets:
+            raise WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def worksheets(self):
+        self.server.chamada("worksheets")
+        return list(self._worksheets.values())
+
+    def add_worksheet(self, title, rows, cols):
+        self.server.chamada("add_worksheet")
+        return self._criar(title, rows, cols)
+
+    def values_batch_get(self, ranges, params=None):
+        """Várias worksheets inteiras numa chamada (ranges só com o título)"""
+        self.server.chamada("values_batch_get")
+        intervalos = []
+        for intervalo in ranges:
+            titulo = intervalo.strip("'")
+            if titulo not in self._worksheets:
+                raise FakeAPIError(400, f"Unable to parse range: {intervalo}", "INVALID_ARGUMENT")
+            worksheet = self._worksheets[titulo]
+            with worksheet._lock:
+                valores = worksheet._aparar(worksheet._valores)
+            resposta = {"range": intervalo, "majorDimension": "ROWS"}
+            if valores:
+                # Como na API: range vazio vem sem "values"
+                resposta["values"] = valores
+            intervalos.append(resposta)
+        return {"spreadsheetId": self.title, "valueRanges": intervalos}
+
+
+def _celula(ref):
+    """'B12' -> (12, 2); 'J' -> (None, 10)"""
+    m = re.fullmatch(r"([A-Z]+)(\d*)", ref.upper())
+    if not m:
+        raise FakeAPIError(400, f"Unable to parse range: {ref}", "INVALID_ARGUMENT")
+    coluna = 0
+    for letra in m.group(1):
+        coluna = coluna * 26 + ord(letra) - 64
+    return (int(m.group(2)) if m.group(2) else None), coluna
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, rows, cols):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self._valores = []
+        self._lock = threading.Lock()
+
+    @property
+    def server(self):
+        return self.spreadsheet.server
+
+    def _aparar(self, linhas):
+        # A API omite colunas e linhas vazias no final do range
+        linhas = [list(linha) for linha in linhas]
+        for linha in linhas:
+            while linha and linha[-1] == "":
+                linha.pop()
+        while linhas and not linhas[-1]:
+            linhas.pop()
+        return linhas
+
+    def get_all_values(self):
+        self.server.chamada("get_all_values")
+        with self._lock:
+            return self._aparar(self._valores)
+
+    def get_all_records(self):
+        self.server.chamada("get_all_records")
+        with self._lock:
+            valores = self._aparar(self._valores)
+        if not valores:
+            return []
+        cabecalho = valores[0]
+        largura = len(cabecalho)
+        return [
+            dict(zip(cabecalho, numericise_all((linha + [""] * largura)[:largura])))
+            for linha in valores[1:]
+        ]
+
+    def get(self, range_name):
+        self.server.chamada("get")
+        inicio, _, fim = range_name.partition(":")
+        linha_ini, col_ini = _celula(inicio)
+        linha_fim, col_fim = _celula(fim or inicio)
+        linha_ini = linha_ini or 1
+        if linha_ini > self.row_count:
+            raise FakeAPIError(
+                400, f"Range ('{self.title}'!{range_name}) exceeds grid limits. "
+                f"Max rows: {self.row_count}", "INVALID_ARGUMENT",
+            )
+        with self._lock:
+            linhas = self._valores[linha_ini - 1:linha_fim]
+            return self._aparar(linha[col_ini - 1:col_fim] for linha in linhas)
+
+    def append_row(self, values, **kwargs):
+        self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        self.server.chamada("append_rows")
+        with self._lock:
+            # Como no Sheets: grava após a última linha com dados
+            self._valores = self._aparar(self._valores)
+            self._valores.extend(["" if v is None else str(v) for v in linha] for linha in values)
+            self.row_count = max(self.row_count, len(self._valores))
+
+    def batch_update(self, data, **kwargs):
+        self.server.chamada("batch_update")
+        with self._lock:
+            for item in data:
+                linha, coluna = _celula(item["range"])
+                for i, valores in enumerate(item["values"]):
+                    while len(self._valores) < linha + i:
+                        self._valores.append([])
+                    destino = self._valores[linha + i - 1]
+                    for j, valor in enumerate(valores):
+                        while len(destino) < coluna + j:
+                            destino.append("")
+                        destino[coluna + j - 1] = "" if valor is None else str(valor)
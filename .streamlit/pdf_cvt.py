@@ -0,0 +1,185 @@
+"""Geração dos PDFs de CVT.
+
+Fica fora do app.py para que as funções possam ser executadas em
+processos separados (exportação em lote), que precisam importá-las.
+"""
+import collections
+import os
+import tempfile
+import zipfile
+
+import pandas as pd
+
+
+# --- FUNÇÃO PARA GERAR PDF ---
+def gerar_pdf_cvt(dados_cvt, pecas=None):
+    """Gera um PDF da CVT com todas as informações"""
+    # Importado no primeiro uso: o fpdf pesa na partida e só os processos
+    # de renderização precisam dele
+    from fpdf import FPDF
+    
+    pdf = FPDF()
+    pdf.add_page()
+    
+    # Configurações
+    pdf.set_font("Arial", size=12)
+    
+    # Cabeçalho
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(200, 10, txt="COMPROVANTE DE VISITA TÉCNICA", ln=1, align='C')
+    pdf.ln(10)
+    
+    # Informações da CVT
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(200, 10, txt="INFORMAÇÕES DA VISITA", ln=1)
+    pdf.set_font("Arial", size=11)
+    
+    # Dados básicos
+    pdf.cell(100, 8, txt=f"Número CVT: {dados_cvt.get('numero_cvt', 'N/A')}", ln=1)
+    
+    # Formata data
+    if 'created_at' in dados_cvt:
+        try:
+            data_obj = pd.to_datetime(dados_cvt['created_at'])
+            data_formatada = data_obj.strftime("%d/%m/%Y %H:%M")
+            pdf.cell(100, 8, txt=f"Data/Hora: {data_formatada}", ln=1)
+        except:
+            pdf.cell(100, 8, txt=f"Data/Hora: {dados_cvt.get('created_at', 'N/A')}", ln=1)
+    
+    pdf.cell(100, 8, txt=f"Técnico: {dados_cvt.get('tecnico', 'N/A')}", ln=1)
+    pdf.cell(100, 8, txt=f"Cliente: {dados_cvt.get('cliente', 'N/A')}", ln=1)
+    pdf.cell(100, 8, txt=f"Endereço: {dados_cvt.get('endereco', 'N/A')}", ln=1)
+    pdf.cell(100, 8, txt=f"Elevador: {dados_cvt.get('elevador', 'Não informado')}", ln=1)
+    pdf.ln(5)
+    
+    # Serviço Realizado
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(200, 10, txt="SERVIÇO REALIZADO / DIAGNÓSTICO", ln=1)
+    pdf.set_font("Arial", size=11)
+    
+    # Quebra o texto do serviço em múltiplas linhas
+    servico = dados_cvt.get('servico_realizado', 'Não informado')
+    pdf.multi_cell(0, 8, txt=str(servico))
+    pdf.ln(5)
+    
+    # Observações (se houver)
+    if dados_cvt.get('obs'):
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(200, 10, txt="OBSERVAÇÕES ADICIONAIS", ln=1)
+        pdf.set_font("Arial", size=11)
+        pdf.multi_cell(0, 8, txt=str(dados_cvt.get('obs', '')))
+        pdf.ln(5)
+    
+    # Seção de Peças (se houver)
+    if pecas and len(pecas) > 0:
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(200, 10, txt="PEÇAS SOLICITADAS", ln=1)
+        pdf.set_font("Arial", size=10)
+        
+        # Cabeçalho da tabela
+        pdf.set_fill_color(200, 200, 200)
+        pdf.cell(30, 8, "Código", 1, 0, 'C', True)
+        pdf.cell(80, 8, "Descrição", 1, 0, 'C', True)
+        pdf.cell(20, 8, "Qtd", 1, 0, 'C', True)
+        pdf.cell(30, 8, "Prioridade", 1, 0, 'C', True)
+        pdf.cell(30, 8, "Observações", 1, 1, 'C', True)
+        
+        # Dados das peças
+        pdf.set_font("Arial", size=9)
+        for peca in pecas:
+            # Quebra linha se a descrição for muito longa
+            descricao = peca.get('peca_descricao', '')
+            if len(descricao) > 50:
+                descricao = descricao[:47] + "..."
+            
+            pdf.cell(30, 8, str(peca.get('peca_codigo', '')), 1)
+            pdf.cell(80, 8, str(descricao), 1)
+            pdf.cell(20, 8, str(peca.get('quantidade', '')), 1, 0, 'C')
+            pdf.cell(30, 8, str(peca.get('prioridade', '')), 1, 0, 'C')
+            
+            # Trunca observações muito longas
+            obs = peca.get('observacoes', '')
+            if len(obs) > 20:
+                obs = obs[:17] + "..."
+            pdf.cell(30, 8, str(obs), 1, 1)
+        
+        pdf.ln(5)
+    
+    # Rodapé
+    pdf.ln(10)
+    pdf.set_font("Arial", 'I', 10)
+    pdf.cell(0, 10, txt="Documento gerado automaticamente pelo Sistema CVT", ln=1, align='C')
+    
+    return pdf
+
+
+def pdf_para_bytes(pdf):
+    """Retorna o conteúdo do PDF em bytes"""
+    try:
+        # Método correto para obter o conteúdo do PDF
+        pdf_output = pdf.output(dest='S')
+        
+        # Se já é uma string, apenas encode
+        if isinstance(pdf_output, str):
+            return pdf_output.encode('latin-1')
+        # Se for bytes/bytearray, use diretamente
+        return bytes(pdf_output)
+    
+    except Exception:
+        # Fallback: salva em um arquivo temporário e lê os bytes
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
+            caminho_tmp = tmp.name
+        try:
+            pdf.output(caminho_tmp)
+            with open(caminho_tmp, 'rb') as f:
+                return f.read()
+        finally:
+            # Limpa o arquivo temporário
+            os.unlink(caminho_tmp)
+
+
+def renderizar_pdf_cvt(dados_cvt, pecas=None):
+    """Gera o PDF da CVT e retorna seus bytes (usado pelos processos de exportação)"""
+    return pdf_para_bytes(gerar_pdf_cvt(dados_cvt, pecas))
+
+
+# --- Exportação em lote ---
+def exportar_zip(itens, arquivo_zip, executor, janela=8, ao_progredir=None):
+    """Renderiza vários PDFs no `executor` e grava todos num ZIP.
+
+    `itens` é uma lista de (nome_arquivo, dados_cvt, pecas). No máximo
+    `janela` documentos ficam em andamento ao mesmo tempo, então a memória
+    não cresce com o tamanho da exportação. `ao_progredir(feitos, total)` é
+    chamado a cada PDF gravado.
+    """
+    total = len(itens)
+    pendentes = collections.deque()
+    nomes_usados = set()
+    feitos = 0
+    proximo = iter(itens)
+
+    # PDFs já são comprimidos internamente: ZIP_STORED evita recomprimir
+    with zipfile.ZipFile(arquivo_zip, "w", zipfile.ZIP_STORED) as zf:
+        while True:
+            while len(pendentes) < janela:
+                try:
+                    nome, dados_cvt, pecas = next(proximo)
+                except StopIteration:
+                    break
+                pendentes.append((nome, executor.submit(renderizar_pdf_cvt, dados_cvt, pecas)))
+            if not pendentes:
+                break
+
+            nome, futuro = pendentes.popleft()
+            base, extensao = os.path.splitext(nome)
+            sufixo = 1
+            while nome in nomes_usados:
+                sufixo += 1
+                nome = f"{base}_{sufixo}{extensao}"
+            nomes_usados.add(nome)
+
+            zf.writestr(nome, futuro.result())
+            feitos += 1
+            if ao_progredir:
+                ao_progredir(feitos, total)
+    return feitos
@@ -0,0 +1,74 @@
+"""Hash e verificação de senhas dos usuários do Sistema CVT.
+
+As senhas são guardadas como PBKDF2-SHA256 com sal aleatório, no formato
+
+    pbkdf2_sha256$<iterações>$<sal base64>$<hash base64>
+
+Valores sem esse formato são senhas em texto puro do cadastro antigo:
+continuam aceitos e são convertidos no primeiro login (ou pelo comando
+`python storage.py migrar-senhas`).
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+
+ALGORITMO = "pbkdf2_sha256"
+# Recomendação OWASP (2023) para PBKDF2-HMAC-SHA256
+ITERACOES = 600_000
+
+_hash_ficticio = None
+
+
+def _b64(dados):
+    return base64.b64encode(dados).decode("ascii")
+
+
+def _derivar(senha, sal, iteracoes):
+    return hashlib.pbkdf2_hmac("sha256", str(senha).encode("utf-8"), sal, iteracoes)
+
+
+def gerar_hash(senha, iteracoes=ITERACOES):
+    """Hash com sal novo para gravar no cadastro de usuários"""
+    sal = secrets.token_bytes(16)
+    return f"{ALGORITMO}${iteracoes}${_b64(sal)}${_b64(_derivar(senha, sal, iteracoes))}"
+
+
+def eh_hash(valor):
+    return isinstance(valor, str) and valor.startswith(ALGORITMO + "$") and valor.count("$") == 3
+
+
+def verificar(senha, armazenado):
+    """Confere a senha com o valor do cadastro (hash ou texto puro legado)
+    usando comparação em tempo constante
+    """
+    if not eh_hash(armazenado):
+        # Texto puro também paga uma derivação: o tempo de resposta não
+        # distingue usuários legados, com hash ou inexistentes
+        verificar_ficticio(senha)
+        return hmac.compare_digest(str(senha).encode("utf-8"), str(armazenado).encode("utf-8"))
+    _, iteracoes, sal, esperado = armazenado.split("$")
+    try:
+        calculado = _derivar(senha, base64.b64decode(sal), int(iteracoes))
+        esperado = base64.b64decode(esperado)
+    except ValueError:
+        return False
+    return hmac.compare_digest(calculado, esperado)
+
+
+def precisa_atualizar(armazenado):
+    """Senha em texto puro ou hash com menos iterações que o padrão atual"""
+    if not eh_hash(armazenado):
+        return True
+    return int(armazenado.split("$")[1]) < ITERACOES
+
+
+def verificar_ficticio(senha):
+    """Gasta o mesmo tempo de uma verificação real (usuário inexistente),
+    para que o tempo de resposta não revele quais usuários existem
+    """
+    global _hash_ficticio
+    if _hash_ficticio is None:
+        _hash_ficticio = gerar_hash(secrets.token_hex(8))
+    verificar(senha, _hash_ficticio)
+    return False
@@ -0,0 +1,313 @@
+"""Controle de cota das chamadas ao Google Sheets.
+
+Envolve o cliente do gspread (ou o FakeClient) de forma transparente:
+
+- limitador token bucket ajustado às chamadas por minuto permitidas;
+- novas tentativas com espera exponencial e jitter em erros temporários
+  (429 e 5xx); gravações só são repetidas após 429, pois um 5xx pode ter
+  chegado a gravar a linha;
+- leituras idênticas simultâneas (mesma worksheet, mesmo range) viram uma
+  única chamada cujo resultado é compartilhado (single-flight);
+- métricas de chamadas, novas tentativas, erros e latência por operação.
+"""
+import collections
+import math
+import random
+import threading
+import time
+
+# Erros HTTP temporários que justificam nova tentativa
+STATUS_TEMPORARIOS = {429, 500, 502, 503, 504}
+
+
+def status_http(erro):
+    """Código HTTP de um APIError do gspread (None para outros erros)"""
+    resposta = getattr(erro, "response", None)
+    return getattr(resposta, "status_code", None)
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) por posição mais próxima; None sem valores"""
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+
+
+class LimitadorTaxa:
+    """Token bucket: até `limite_por_minuto` chamadas por minuto, com rajada
+    de no máximo `rajada` chamadas seguidas
+    """
+
+    def __init__(self, limite_por_minuto=60, rajada=None):
+        self.limite_por_minuto = limite_por_minuto
+        self.capacidade = rajada or max(1, limite_por_minuto // 4)
+        self._fichas = float(self.capacidade)
+        self._atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _repor(self, agora):
+        taxa = self.limite_por_minuto / 60.0
+        self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado_em) * taxa)
+        self._atualizado_em = agora
+
+    def aguardar(self):
+        """Bloqueia até haver uma ficha; retorna os segundos esperados"""
+        if not self.limite_por_minuto:
+            return 0.0
+        esperado = 0.0
+        while True:
+            with self._lock:
+                self._repor(time.monotonic())
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return esperado
+                espera = (1 - self._fichas) * 60.0 / self.limite_por_minuto
+            time.sleep(espera)
+            esperado += espera
+
+
+class MetricasSheets:
+    """Contadores e latências das chamadas à API (thread-safe)"""
+
+    def __init__(self, amostras=500):
+        self.amostras = amostras
+        self.chamadas = collections.Counter()
+        self.retentativas = collections.Counter()
+        self.erros = collections.Counter()
+        self.coalescidas = collections.Counter()
+        self.espera_limitador = 0.0
+        self._latencias = collections.defaultdict(lambda: collections.deque(maxlen=self.amostras))
+        self._instantes = collections.deque()
+        self._lock = threading.Lock()
+
+    def registrar_chamada(self, operacao, latencia):
+        with self._lock:
+            agora = time.monotonic()
+            self.chamadas[operacao] += 1
+            self._latencias[operacao].append(latencia)
+            self._instantes.append(agora)
+            while self._instantes and agora - self._instantes[0] > 60:
+                self._instantes.popleft()
+
+    def registrar_retentativa(self, operacao):
+        with self._lock:
+            self.retentativas[operacao] += 1
+
+    def registrar_erro(self, status):
+        with self._lock:
+            self.erros[status or "outro"] += 1
+
+    def registrar_coalescida(self, operacao):
+        with self._lock:
+            self.coalescidas[operacao] += 1
+
+    def registrar_espera(self, segundos):
+        if segundos:
+            with self._lock:
+                self.espera_limitador += segundos
+
+    def chamadas_ultimo_minuto(self):
+        with self._lock:
+            agora = time.monotonic()
+            while self._instantes and agora - self._instantes[0] > 60:
+                self._instantes.popleft()
+            return len(self._instantes)
+
+    def resumo(self):
+        """Totais e latência (p50/p95 em ms) por operação"""
+        with self._lock:
+            operacoes = {}
+            for operacao, total in self.chamadas.items():
+                latencias = list(self._latencias[operacao])
+                operacoes[operacao] = {
+                    "chamadas": total,
+                    "retentativas": self.retentativas[operacao],
+                    "coalescidas": self.coalescidas[operacao],
+                    "p50_ms": round(percentil(latencias, 50) * 1000, 1),
+                    "p95_ms": round(percentil(latencias, 95) * 1000, 1),
+                }
+            return {
+                "operacoes": operacoes,
+                "erros": dict(self.erros),
+                "espera_limitador_s": round(self.espera_limitador, 2),
+            }
+
+
+class _Voo:
+    """Leitura em andamento compartilhada pelas threads que pediram o mesmo dado"""
+
+    def __init__(self):
+        self.concluido = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class ControleCota:
+    """Executa as chamadas à API com limitador, novas tentativas e coalescência"""
+
+    def __init__(self, limite_por_minuto=60, tentativas=5, espera_base=1.0,
+                 espera_maxima=32.0, metricas=None):
+        self.limitador = LimitadorTaxa(limite_por_minuto)
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.metricas = metricas or MetricasSheets()
+        self._voos = {}
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def _espera(self, tentativa):
+        # Full jitter: espera aleatória até o teto exponencial
+        teto = min(self.espera_maxima, self.espera_base * 2 ** tentativa)
+        return self._random.uniform(0, teto)
+
+    def _executar(self, operacao, funcao, args, kwargs, escrita):
+        for tentativa in range(self.tentativas):
+            self.metricas.registrar_espera(self.limitador.aguardar())
+            inicio = time.perf_counter()
+            try:
+                resultado = funcao(*args, **kwargs)
+            except Exception as e:
+                self.metricas.registrar_chamada(operacao, time.perf_counter() - inicio)
+                status = status_http(e)
+                self.metricas.registrar_erro(status)
+                repetir = status == 429 if escrita else status in STATUS_TEMPORARIOS
+                if not repetir or tentativa == self.tentativas - 1:
+                    raise
+                self.metricas.registrar_retentativa(operacao)
+                time.sleep(self._espera(tentativa))
+                continue
+            self.metricas.registrar_chamada(operacao, time.perf_counter() - inicio)
+            return resultado
+
+    def escrever(self, operacao, funcao, *args, **kwargs):
+        return self._executar(operacao, funcao, args, kwargs, escrita=True)
+
+    def ler(self, operacao, chave, funcao, *args, **kwargs):
+        """Leitura coalescida: chamadas simultâneas com a mesma `chave`
+        aguardam a que já está em andamento e recebem o mesmo resultado
+        """
+        with self._lock:
+            voo = self._voos.get(chave)
+            dono = voo is None
+            if dono:
+                voo = self._voos[chave] = _Voo()
+        if not dono:
+            self.metricas.registrar_coalescida(operacao)
+            voo.concluido.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado
+
+        try:
+            voo.resultado = self._executar(operacao, funcao, args, kwargs, escrita=False)
+        except Exception as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._voos[chave]
+            voo.concluido.set()
+        return voo.resultado
+
+
+class WorksheetProtegida:
+    """Worksheet cujas chamadas à API passam pelo ControleCota"""
+
+    def __init__(self, worksheet, controle):
+        self._worksheet = worksheet
+        self._controle = controle
+
+    def __getattr__(self, nome):
+        # title, row_count, col_count... não fazem chamadas à API
+        return getattr(self._worksheet, nome)
+
+    def _chave(self, operacao, *args):
+        return (id(self._worksheet), operacao) + args
+
+    def get_all_values(self, **kwargs):
+        return self._controle.ler(
+            "get_all_values", self._chave("get_all_values"),
+            self._worksheet.get_all_values, **kwargs
+        )
+
+    def get_all_records(self, **kwargs):
+        return self._controle.ler(
+            "get_all_records", self._chave("get_all_records"),
+            self._worksheet.get_all_records, **kwargs
+        )
+
+    def get(self, range_name=None, **kwargs):
+        return self._controle.ler(
+            "get", self._chave("get", range_name),
+            self._worksheet.get, range_name, **kwargs
+        )
+
+    def append_row(self, values, **kwargs):
+        return self._controle.escrever("append_rows", self._worksheet.append_row, values, **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        return self._controle.escrever("append_rows", self._worksheet.append_rows, values, **kwargs)
+
+    def batch_update(self, data, **kwargs):
+        return self._controle.escrever("batch_update", self._worksheet.batch_update, data, **kwargs)
+
+
+class PlanilhaProtegida:
+    """Spreadsheet que devolve worksheets protegidas"""
+
+    def __init__(self, spreadsheet, controle):
+        self._spreadsheet = spreadsheet
+        self._controle = controle
+
+    def __getattr__(self, nome):
+        return getattr(self._spreadsheet, nome)
+
+    def worksheet(self, title):
+        worksheet = self._controle.ler(
+            "worksheet", (id(self._spreadsheet), "worksheet", title),
+            self._spreadsheet.worksheet, title
+        )
+        return WorksheetProtegida(worksheet, self._controle)
+
+    def worksheets(self):
+        worksheets = self._controle.ler(
+            "worksheets", (id(self._spreadsheet), "worksheets"), self._spreadsheet.worksheets
+        )
+        return [WorksheetProtegida(w, self._controle) for w in worksheets]
+
+    def values_batch_get(self, ranges, **kwargs):
+        return self._controle.ler(
+            "values_batch_get", (id(self._spreadsheet), "values_batch_get") + tuple(ranges),
+            self._spreadsheet.values_batch_get, ranges, **kwargs
+        )
+
+    def add_worksheet(self, title, rows, cols, **kwargs):
+        worksheet = self._controle.escrever(
+            "add_worksheet", self._spreadsheet.add_worksheet, title=title, rows=rows, cols=cols, **kwargs
+        )
+        return WorksheetProtegida(worksheet, self._controle)
+
+
+class ClienteProtegido:
+    """Cliente gspread com controle de cota em todas as chamadas"""
+
+    def __init__(self, client, controle=None):
+        self._client = client
+        self.controle = controle or ControleCota()
+
+    def __getattr__(self, nome):
+        return getattr(self._client, nome)
+
+    @property
+    def metricas(self):
+        return self.controle.metricas
+
+    def open(self, title):
+        planilha = self.controle.ler("open", ("open", title), self._client.open, title)
+        return PlanilhaProtegida(planilha, self.controle)
+
+    def create(self, title):
+        planilha = self.controle.escrever("create", self._client.create, title)
+        return PlanilhaProtegida(planilha, self.controle)
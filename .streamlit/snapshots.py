@@ -0,0 +1,323 @@
+"""Snapshots colunares (Parquet) de CVT e REQUISICOES.
+
+O job lê as tabelas do backend ativo e grava um arquivo Parquet por mês de
+created_at, com as colunas já tipadas (ESQUEMA): datas como timestamp,
+categorias como dicionário e quantidades como inteiro.
+
+    snapshots/cvt/2026-10.parquet
+    snapshots/req/2026-10.parquet
+    snapshots/manifesto.json
+
+Analistas abrem os arquivos direto (pandas, DuckDB, Spark...), sem exportar
+a planilha à mão. O app lê os meses fechados com memory map e mantém as
+tabelas Arrow em memória enquanto o arquivo não muda: consultas de
+histórico e estatísticas não chamam a API do Sheets. Meses sem alteração
+não são regravados.
+
+O pyarrow é opcional: sem ele o app continua lendo o histórico do backend.
+
+    python snapshots.py gerar [--backend csv|sqlite] [--dados .] [--pasta snapshots]
+    python snapshots.py info [--pasta snapshots]
+"""
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from diagnostico import gravar_arquivo
+from storage import (
+    COLUNA_DATA, ESQUEMA, SQLITE_DB, TABELAS, TABELAS_PARTICIONADAS,
+    CSVStorage, SQLiteStorage, tipar_tabela,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # dependência opcional
+    pa = pc = pq = None
+
+PYARROW_DISPONIVEL = pa is not None
+
+PASTA_SNAPSHOTS = "snapshots"
+MANIFESTO = "manifesto.json"
+
+# Uma geração por vez (job periódico, botão do supervisor ou linha de comando)
+_LOCK_GERACAO = threading.Lock()
+
+
+def esquema_arrow(tabela):
+    """Schema Arrow das colunas da tabela, conforme o ESQUEMA"""
+    tipos = {
+        "datahora": pa.timestamp("us"),
+        "inteiro": pa.int64(),
+        "booleano": pa.bool_(),
+        "categoria": pa.dictionary(pa.int32(), pa.string()),
+    }
+    esquema = ESQUEMA.get(tabela, {})
+    return pa.schema([
+        (coluna, tipos.get(esquema.get(coluna), pa.string())) for coluna in TABELAS[tabela]["colunas"]
+    ])
+
+
+def inicio_do_mes(instante=None):
+    instante = instante or datetime.datetime.now()
+    return datetime.datetime(instante.year, instante.month, 1)
+
+
+def _mes(valor):
+    return pd.Timestamp(valor).strftime("%Y-%m")
+
+
+def _caminho(pasta, tabela, mes):
+    return os.path.join(pasta, tabela, f"{mes}.parquet")
+
+
+def ler_manifesto(pasta=PASTA_SNAPSHOTS):
+    """Conteúdo de manifesto.json (None se ainda não há snapshot)"""
+    try:
+        with open(os.path.join(pasta, MANIFESTO), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# --- Geração ---
+def _meses(df):
+    """Mês "AAAA-MM" de cada linha; datas inválidas ficam no mês atual (como nas partições)"""
+    meses = df[COLUNA_DATA].dt.strftime("%Y-%m")
+    return meses.fillna(_mes(datetime.datetime.now()))
+
+
+def _impressao(df):
+    """Impressão digital do conteúdo (decide se o mês precisa ser regravado)"""
+    return str(int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+
+def _gravar_parquet(tabela_arrow, caminho):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.tmp"
+    pq.write_table(tabela_arrow, temporario, compression="zstd")
+    # Quem lê o arquivo nunca vê uma versão pela metade
+    os.replace(temporario, caminho)
+
+
+def gerar_snapshots(storage, pasta=PASTA_SNAPSHOTS, tabelas=TABELAS_PARTICIONADAS):
+    """Grava o snapshot das tabelas; retorna {tabela: {"linhas", "meses", "gravados"}}"""
+    if not PYARROW_DISPONIVEL:
+        raise RuntimeError("pyarrow não instalado")
+    with _LOCK_GERACAO:
+        # Instante anterior à leitura: linhas gravadas durante o job não são cobertas
+        gerado_em = datetime.datetime.now()
+        anterior = (ler_manifesto(pasta) or {}).get("tabelas", {})
+        manifesto = {"gerado_em": gerado_em.isoformat(timespec="seconds"), "tabelas": {}}
+        resultado = {}
+        for tabela in tabelas:
+            df = tipar_tabela(tabela, storage.ler_tabela(tabela).reindex(columns=TABELAS[tabela]["colunas"]))
+            esquema = esquema_arrow(tabela)
+            meses_anteriores = anterior.get(tabela, {}).get("meses", {})
+            meses = {}
+            gravados = 0
+            for mes, df_mes in df.groupby(_meses(df), sort=True):
+                impressao = _impressao(df_mes)
+                caminho = _caminho(pasta, tabela, mes)
+                if meses_anteriores.get(mes, {}).get("impressao") != impressao or not os.path.exists(caminho):
+                    _gravar_parquet(pa.Table.from_pandas(df_mes, schema=esquema, preserve_index=False), caminho)
+                    gravados += 1
+                meses[mes] = {"linhas": len(df_mes), "impressao": impressao}
+            # Meses que deixaram de existir no backend
+            for mes in set(meses_anteriores) - set(meses):
+                if os.path.exists(_caminho(pasta, tabela, mes)):
+                    os.remove(_caminho(pasta, tabela, mes))
+            manifesto["tabelas"][tabela] = {"linhas": len(df), "meses": meses}
+            resultado[tabela] = {"linhas": len(df), "meses": len(meses), "gravados": gravados}
+        os.makedirs(pasta, exist_ok=True)
+        gravar_arquivo(os.path.join(pasta, MANIFESTO), json.dumps(manifesto, ensure_ascii=False, indent=2))
+        return resultado
+
+
+class AgendadorSnapshots(threading.Thread):
+    """Thread que regenera os snapshots a cada `intervalo` segundos.
+
+    Na partida gera logo se não há snapshot do mês atual (o app só usa
+    snapshots gerados depois do fim dos meses que eles cobrem).
+    """
+
+    def __init__(self, storage, pasta=PASTA_SNAPSHOTS, intervalo=6 * 3600, verificacao=300):
+        super().__init__(name="cvt-snapshots", daemon=True)
+        self.storage = storage
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self.verificacao = verificacao
+        self.ultimo_erro = None
+        self.ultima_duracao = None
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._forcar = False
+
+    def gerar_agora(self):
+        """Antecipa a próxima geração"""
+        self._forcar = True
+        self._acordar.set()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def vencido(self):
+        manifesto = ler_manifesto(self.pasta)
+        if manifesto is None:
+            return True
+        gerado_em = datetime.datetime.fromisoformat(manifesto["gerado_em"])
+        agora = datetime.datetime.now()
+        return gerado_em < inicio_do_mes(agora) or (agora - gerado_em).total_seconds() >= self.intervalo
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                if self._forcar or self.vencido():
+                    self._forcar = False
+                    inicio = time.perf_counter()
+                    gerar_snapshots(self.storage, self.pasta)
+                    self.ultima_duracao = time.perf_counter() - inicio
+                    self.ultimo_erro = None
+            except Exception as e:
+                # Backend indisponível: tenta de novo na próxima verificação
+                self.ultimo_erro = str(e)
+            self._acordar.wait(self.verificacao)
+            self._acordar.clear()
+
+
+# --- Leitura ---
+class LeitorSnapshots:
+    """Lê os snapshots com memory map; as tabelas Arrow ficam em memória
+    enquanto o arquivo não muda (thread-safe)
+    """
+
+    def __init__(self, pasta=PASTA_SNAPSHOTS):
+        if not PYARROW_DISPONIVEL:
+            raise RuntimeError("pyarrow não instalado")
+        self.pasta = pasta
+        self._manifesto = (None, None)
+        self._tabelas = {}
+        self._lock = threading.Lock()
+
+    def manifesto(self):
+        caminho = os.path.join(self.pasta, MANIFESTO)
+        try:
+            versao = os.stat(caminho).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            if self._manifesto[0] != versao:
+                self._manifesto = (versao, ler_manifesto(self.pasta))
+            return self._manifesto[1]
+
+    def gerado_em(self):
+        manifesto = self.manifesto()
+        return None if manifesto is None else datetime.datetime.fromisoformat(manifesto["gerado_em"])
+
+    def cobre(self, tabela, ate):
+        """True se o snapshot tem todas as linhas da tabela anteriores a `ate`"""
+        manifesto = self.manifesto()
+        if manifesto is None or tabela not in manifesto["tabelas"]:
+            return False
+        return datetime.datetime.fromisoformat(manifesto["gerado_em"]) >= pd.Timestamp(ate)
+
+    def meses(self, tabela):
+        manifesto = self.manifesto() or {"tabelas": {}}
+        return sorted(manifesto["tabelas"].get(tabela, {}).get("meses", {}))
+
+    def _arquivo(self, tabela, mes):
+        caminho = _caminho(self.pasta, tabela, mes)
+        versao = os.stat(caminho).st_mtime_ns
+        with self._lock:
+            guardado = self._tabelas.get(caminho)
+            if guardado is not None and guardado[0] == versao:
+                return guardado[1]
+        # Metadados do pandas variam por arquivo; o schema vem do ESQUEMA
+        lido = pq.read_table(caminho, memory_map=True).replace_schema_metadata(None)
+        with self._lock:
+            self._tabelas[caminho] = (versao, lido)
+        return lido
+
+    def tabela_arrow(self, tabela, desde=None, ate=None, colunas=None, **filtros):
+        """Linhas dos meses de `desde` até antes de `ate` (início de mês) que
+        casam com `filtros`, como tabela Arrow
+        """
+        meses = self.meses(tabela)
+        if desde is not None:
+            meses = [mes for mes in meses if mes >= _mes(desde)]
+        if ate is not None:
+            meses = [mes for mes in meses if mes < _mes(ate)]
+        esquema = esquema_arrow(tabela)
+        partes = [self._arquivo(tabela, mes) for mes in meses]
+        resultado = pa.concat_tables(partes) if partes else esquema.empty_table()
+
+        condicao = None
+        for coluna, valor in filtros.items():
+            if coluna not in esquema.names:
+                return esquema.empty_table()
+            termo = pc.field(coluna) == valor
+            condicao = termo if condicao is None else condicao & termo
+        if desde is not None:
+            termo = pc.field(COLUNA_DATA) >= pa.scalar(pd.Timestamp(desde).to_pydatetime(), esquema.field(COLUNA_DATA).type)
+            condicao = termo if condicao is None else condicao & termo
+        if condicao is not None:
+            resultado = resultado.filter(condicao)
+        if colunas is not None:
+            resultado = resultado.select(colunas)
+        return resultado
+
+    def ler(self, tabela, desde=None, ate=None, colunas=None, **filtros):
+        """Como `tabela_arrow`, em DataFrame com os tipos de tipar_tabela"""
+        return self.tabela_arrow(tabela, desde, ate, colunas, **filtros).to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshots Parquet de CVT e REQUISICOES")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    gerar = sub.add_parser("gerar", help="Grava (ou atualiza) os snapshots mensais")
+    gerar.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    gerar.add_argument("--dados", default=".", help="Pasta dos CSVs")
+    gerar.add_argument("--db", default=SQLITE_DB, help="Caminho do banco SQLite")
+    gerar.add_argument("--pasta", default=PASTA_SNAPSHOTS, help="Pasta dos snapshots")
+
+    info = sub.add_parser("info", help="Mostra o manifesto dos snapshots")
+    info.add_argument("--pasta", default=PASTA_SNAPSHOTS, help="Pasta dos snapshots")
+
+    args = parser.parse_args()
+    if args.comando == "gerar":
+        if not PYARROW_DISPONIVEL:
+            parser.error("pyarrow não instalado (pip install pyarrow)")
+        if args.backend == "sqlite":
+            storage = SQLiteStorage(args.db)
+        else:
+            # Lê as partições mensais e o CSV único, se houver
+            storage = CSVStorage(args.dados, particionar=True)
+        inicio = time.perf_counter()
+        for tabela, total in gerar_snapshots(storage, args.pasta).items():
+            print(
+                f"{TABELAS[tabela]['sheet']}: {total['linhas']} linha(s) em {total['meses']} mês(es), "
+                f"{total['gravados']} arquivo(s) gravado(s)"
+            )
+        print(f"Concluído em {time.perf_counter() - inicio:.1f} s")
+    elif args.comando == "info":
+        manifesto = ler_manifesto(args.pasta)
+        if manifesto is None:
+            print("Nenhum snapshot encontrado")
+            return
+        print(f"Gerado em {manifesto['gerado_em']}")
+        for tabela, dados in manifesto["tabelas"].items():
+            meses = sorted(dados["meses"])
+            periodo = f"{meses[0]} a {meses[-1]}" if meses else "sem meses"
+            print(f"{TABELAS[tabela]['sheet']}: {dados['linhas']} linha(s), {periodo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1676 @@
+"""Definição das tabelas e backends de armazenamento do Sistema CVT.
+
+Este módulo não depende do Streamlit para poder ser usado também pela
+linha de comando (ex.: migração dos CSVs locais para SQLite):
+
+    python storage.py migrar-csv [--db cvt_local.db] [--substituir]
+    python storage.py migrar-senhas [--backend csv|sqlite]
+    python storage.py particionar [--pasta .]
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Constantes e configurações ---
+SHEET_NAME = "CVT_DB"
+CVT_SHEET = "CVT"
+REQ_SHEET = "REQUISICOES"
+USERS_SHEET = "USERS"
+CLIENTES_SHEET = "CLIENTES"
+PECAS_SHEET = "PECAS"
+
+# Arquivos CSV fallback
+CVT_CSV = "cvt_local.csv"
+REQ_CSV = "requisicoes_local.csv"
+USERS_CSV = "users_local.csv"
+CLIENTES_CSV = "clientes_local.csv"
+PECAS_CSV = "pecas_local.csv"
+
+# Banco SQLite (alternativa ao fallback CSV)
+SQLITE_DB = "cvt_local.db"
+
+# Diário das gravações pendentes de envio ao Google Sheets (outbox)
+OUTBOX_DB = "cvt_outbox.db"
+
+# Colunas das planilhas
+CVT_COLUMNS = [
+    "created_at", "tecnico", "cliente", "endereco", "elevador",
+    "servico_realizado", "obs", "pecas_requeridas", "status_cvt", "numero_cvt"
+]
+
+REQ_COLUMNS = [
+    "created_at", "tecnico", "numero_cvt", "ordem_id", "peca_codigo",
+    "peca_descricao", "quantidade", "status", "prioridade", "observacoes"
+]
+
+USERS_COLUMNS = [
+    "username", "password", "role", "nome"
+]
+
+CLIENTES_COLUMNS = [
+    "codigo", "nome", "endereco", "telefone", "email", "responsavel", "ativo"
+]
+
+PECAS_COLUMNS = [
+    "codigo", "descricao", "categoria", "campos_especificos", "ativo"
+]
+
+# Tabelas do sistema: chave interna -> planilha, CSV local, colunas e índices
+TABELAS = {
+    "cvt": {
+        "sheet": CVT_SHEET,
+        "csv": CVT_CSV,
+        "colunas": CVT_COLUMNS,
+        "indices": ["numero_cvt", "tecnico", "status_cvt", "created_at", ("tecnico", "created_at")],
+    },
+    "req": {
+        "sheet": REQ_SHEET,
+        "csv": REQ_CSV,
+        "colunas": REQ_COLUMNS,
+        "indices": [
+            "numero_cvt", "tecnico", "status", "created_at", "peca_codigo", ("tecnico", "created_at"),
+        ],
+    },
+    "users": {
+        "sheet": USERS_SHEET,
+        "csv": USERS_CSV,
+        "colunas": USERS_COLUMNS,
+        "indices": ["username"],
+    },
+    "clientes": {
+        "sheet": CLIENTES_SHEET,
+        "csv": CLIENTES_CSV,
+        "colunas": CLIENTES_COLUMNS,
+        "indices": ["codigo", "nome"],
+    },
+    "pecas": {
+        "sheet": PECAS_SHEET,
+        "csv": PECAS_CSV,
+        "colunas": PECAS_COLUMNS,
+        "indices": ["codigo"],
+    },
+}
+
+# Coluna de data usada em consultas por período (`desde`)
+COLUNA_DATA = "created_at"
+
+# Tabelas append-only divididas em partições mensais (pelo mês de COLUNA_DATA)
+TABELAS_PARTICIONADAS = ("cvt", "req")
+# Nome de partição: mês "AAAA-MM" e, após uma virada por tamanho, "_<parte>"
+PADRAO_PARTICAO = r"(\d{4}-\d{2})(?:_(\d+))?"
+
+# Colunas numéricas no SQLite (as demais são TEXT)
+COLUNAS_INTEIRAS = {"quantidade"}
+
+# Tipos das colunas em memória, aplicados uma vez na carga (tipar_tabela);
+# colunas não listadas são texto
+ESQUEMA = {
+    "cvt": {
+        "created_at": "datahora",
+        "tecnico": "categoria",
+        "status_cvt": "categoria",
+    },
+    "req": {
+        "created_at": "datahora",
+        "tecnico": "categoria",
+        "status": "categoria",
+        "prioridade": "categoria",
+        "quantidade": "inteiro",
+    },
+    "users": {
+        "role": "categoria",
+    },
+    "clientes": {
+        "ativo": "booleano",
+    },
+    "pecas": {
+        "categoria": "categoria",
+        "ativo": "booleano",
+    },
+}
+
+
+# --- Esquema tipado ---
+def _converter_coluna(serie, tipo):
+    if tipo == "datahora":
+        return pd.to_datetime(serie, errors="coerce", format="ISO8601")
+    if tipo == "inteiro":
+        return pd.to_numeric(serie, errors="coerce").fillna(0).astype("int64")
+    if tipo == "booleano":
+        return serie.astype(str).str.strip().str.upper() == "SIM"
+    texto = serie.fillna("").astype(str)
+    if tipo == "categoria":
+        return texto.astype("category")
+    return texto
+
+
+def memoria_df(df):
+    """Bytes ocupados pelo DataFrame (incluindo o conteúdo dos textos)"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def tipar_tabela(tabela, df, medir=False):
+    """Converte as colunas de `df` para os tipos do ESQUEMA da tabela.
+
+    Textos vazios ou numéricos (o Sheets converte "12" em 12) viram texto,
+    datas inválidas viram NaT. Com `medir`, a memória antes e depois fica em
+    `df.attrs["memoria"]`.
+    """
+    tipos = ESQUEMA.get(tabela, {})
+    antes = memoria_df(df) if medir else None
+    tipado = pd.DataFrame(
+        {coluna: _converter_coluna(df[coluna], tipos.get(coluna)) for coluna in df.columns},
+        index=df.index,
+    )
+    tipado.attrs = dict(df.attrs)
+    if medir:
+        tipado.attrs["memoria"] = {"antes": antes, "depois": memoria_df(tipado)}
+    return tipado
+
+
+def concatenar_tipado(tabela, df, novas):
+    """Acrescenta linhas novas (não tipadas) a um DataFrame já tipado"""
+    return unir_tipados(df, tipar_tabela(tabela, novas))
+
+
+def unir_tipados(df, novas):
+    """Concatena dois DataFrames tipados unindo as categorias, para que as
+    colunas continuem categóricas
+    """
+    uniao = {}
+    for coluna in df.columns:
+        if (
+            isinstance(df[coluna].dtype, pd.CategoricalDtype) and coluna in novas.columns
+            and isinstance(novas[coluna].dtype, pd.CategoricalDtype)
+        ):
+            categorias = df[coluna].cat.categories.union(novas[coluna].cat.categories)
+            uniao[coluna] = pd.CategoricalDtype(categorias)
+    if uniao:
+        df = df.astype(uniao)
+        novas = novas.astype(uniao)
+    resultado = pd.concat([df, novas], ignore_index=True)
+    resultado.attrs = dict(df.attrs)
+    return resultado
+
+
+# --- Interface dos backends ---
+class StorageBackend:
+    """Interface comum dos backends de armazenamento.
+
+    As linhas são sempre listas na ordem das colunas da tabela (TABELAS) e
+    as leituras retornam DataFrames. Falhas são propagadas como exceções;
+    a interface decide como exibi-las.
+    """
+
+    nome = "base"
+    remoto = False
+    # True quando `consultar` filtra no próprio backend (sem ler a tabela inteira)
+    consulta_nativa = False
+
+    def ler_tabela(self, tabela):
+        raise NotImplementedError
+
+    def inserir(self, tabela, rows):
+        raise NotImplementedError
+
+    def atualizar(self, tabela, filtros, valores):
+        """Altera `valores` nas linhas que casam com `filtros`; retorna o total"""
+        raise NotImplementedError
+
+    def consultar(self, tabela, desde=None, limite=None, ordem=None, **filtros):
+        """Linhas cujas colunas são iguais aos valores em `filtros`.
+
+        `desde` mantém as linhas com data (COLUNA_DATA) a partir do instante
+        informado, `ordem` é o nome de uma coluna (prefixo "-" para ordem
+        decrescente; sem ordem, a de gravação) e `limite` o máximo de linhas.
+        """
+        return _consultar_df(self.ler_tabela(tabela), desde, limite, ordem, filtros)
+
+    def particionada(self, tabela):
+        """True se a tabela é dividida em partições mensais neste backend"""
+        return False
+
+    def particoes(self, tabela):
+        return []
+
+    def reservar_numeros(self, contador, quantidade=1):
+        """Reserva `quantidade` números consecutivos do contador de forma
+        atômica e retorna o primeiro deles
+        """
+        raise NotImplementedError
+
+
+def _texto_data(valor):
+    """Data como texto ISO, comparável com os valores gravados em COLUNA_DATA"""
+    if isinstance(valor, (datetime.date, pd.Timestamp)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _consultar_df(df, desde=None, limite=None, ordem=None, filtros=None):
+    """Filtros, período, ordem e limite de StorageBackend.consultar aplicados a `df`"""
+    df = _filtrar_df(df, filtros or {})
+    if desde is not None:
+        df = df[df[COLUNA_DATA].astype(str) >= _texto_data(desde)]
+    if ordem:
+        coluna = ordem.lstrip("-")
+        df = df.sort_values(coluna, ascending=not ordem.startswith("-"), kind="stable")
+    if limite is not None:
+        df = df.head(limite)
+    return df
+
+
+def _filtrar_df(df, filtros):
+    for coluna, valor in filtros.items():
+        if coluna not in df.columns:
+            return df.iloc[0:0]
+        df = df[df[coluna] == valor]
+    return df
+
+
+def _aplicar_atualizacao(df, filtros, valores):
+    """Aplica `valores` às linhas filtradas de `df` (no lugar); retorna o total"""
+    mascara = pd.Series(True, index=df.index)
+    for coluna, valor in filtros.items():
+        mascara &= df[coluna] == valor
+    for coluna, valor in valores.items():
+        df.loc[mascara, coluna] = valor
+    return int(mascara.sum())
+
+
+# --- Partições mensais ---
+def mes_da_data(valor):
+    """Mês "AAAA-MM" de uma data (texto ISO, date ou Timestamp); o mês atual se inválida"""
+    if isinstance(valor, (datetime.date, pd.Timestamp)):
+        return valor.strftime("%Y-%m")
+    texto = str(valor or "")
+    if re.match(r"\d{4}-\d{2}", texto):
+        return texto[:7]
+    return datetime.date.today().strftime("%Y-%m")
+
+
+def nome_particao(mes, parte=1):
+    return mes if parte == 1 else f"{mes}_{parte}"
+
+
+def chave_particao(nome):
+    """(mes, parte) de um nome de partição, para ordenar ("2026-10_10" > "2026-10_2")"""
+    mes, parte = re.fullmatch(PADRAO_PARTICAO, nome).groups()
+    return mes, int(parte or 1)
+
+
+class ParticoesMensais:
+    """Partições mensais das tabelas append-only (TABELAS_PARTICIONADAS).
+
+    Cada mês de COLUNA_DATA vai para uma partição própria (worksheet ou
+    arquivo); quando ela atinge `particao_max_linhas` a gravação segue numa
+    nova parte do mesmo mês ("2026-10_2"). Leituras com `desde` só abrem as
+    partições do período. A tabela anterior ao particionamento (legado,
+    partição None) continua sendo lida enquanto existir: ela só tem dados
+    até o mês da primeira partição.
+
+    Os backends implementam `_listar_particoes`, `_ler_particao`,
+    `_criar_particao`, `_inserir_particao`, `_contar_particao` e
+    `_atualizar_particao`.
+    """
+
+    particionar = False
+    particao_max_linhas = None
+
+    def particionada(self, tabela):
+        return self.particionar and tabela in TABELAS_PARTICIONADAS
+
+    def particoes(self, tabela):
+        """Partições existentes da tabela, da mais antiga para a mais recente"""
+        return sorted(self._listar_particoes(tabela), key=chave_particao)
+
+    def _particoes_do_periodo(self, tabela, desde=None):
+        particoes = self.particoes(tabela)
+        if desde is None:
+            return [None] + particoes
+        mes = mes_da_data(desde)
+        selecionadas = [p for p in particoes if chave_particao(p)[0] >= mes]
+        if not particoes or chave_particao(particoes[0])[0] >= mes:
+            selecionadas.insert(0, None)
+        return selecionadas
+
+    def _ler_particionada(self, tabela, desde=None):
+        frames = [self._ler_particao(tabela, p) for p in self._particoes_do_periodo(tabela, desde)]
+        frames = [df for df in frames if len(df)]
+        if not frames:
+            return pd.DataFrame(columns=TABELAS[tabela]["colunas"])
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
+
+    def _inserir_particionada(self, tabela, rows):
+        posicao = TABELAS[tabela]["colunas"].index(COLUNA_DATA)
+        por_mes = {}
+        for row in rows:
+            por_mes.setdefault(mes_da_data(row[posicao]), []).append(list(row))
+        for mes, linhas in por_mes.items():
+            self._inserir_no_mes(tabela, mes, linhas)
+
+    def _inserir_no_mes(self, tabela, mes, linhas):
+        # Uma gravação por vez decide a partição (e cria a próxima parte)
+        with self._lock_particoes:
+            do_mes = [p for p in self.particoes(tabela) if chave_particao(p)[0] == mes]
+            atual = do_mes[-1] if do_mes else None
+            if atual is not None and self.particao_max_linhas:
+                if self._contar_particao(tabela, atual) + len(linhas) > self.particao_max_linhas:
+                    atual = None
+            if atual is None:
+                parte = chave_particao(do_mes[-1])[1] + 1 if do_mes else 1
+                atual = nome_particao(mes, parte)
+                self._criar_particao(tabela, atual)
+            self._inserir_particao(tabela, atual, linhas)
+
+    def _atualizar_particionada(self, tabela, filtros, valores):
+        return sum(
+            self._atualizar_particao(tabela, particao, filtros, valores)
+            for particao in self._particoes_do_periodo(tabela)
+        )
+
+
+# --- Backend em memória ---
+class MemoryStorage(StorageBackend):
+    """Tabelas mantidas apenas em memória (testes, benchmarks e demonstrações)"""
+
+    nome = "memoria"
+
+    def __init__(self):
+        self._dados = {tabela: [] for tabela in TABELAS}
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def ler_tabela(self, tabela):
+        with self._lock:
+            return pd.DataFrame(
+                [list(row) for row in self._dados[tabela]],
+                columns=TABELAS[tabela]["colunas"],
+            )
+
+    def inserir(self, tabela, rows):
+        with self._lock:
+            self._dados[tabela].extend(list(row) for row in rows)
+
+    def atualizar(self, tabela, filtros, valores):
+        colunas = TABELAS[tabela]["colunas"]
+        with self._lock:
+            total = 0
+            for row in self._dados[tabela]:
+                if all(row[colunas.index(c)] == v for c, v in filtros.items()):
+                    for coluna, valor in valores.items():
+                        row[colunas.index(coluna)] = valor
+                    total += 1
+            return total
+
+    def reservar_numeros(self, contador, quantidade=1):
+        with self._lock:
+            inicio = self._contadores.get(contador, 0) + 1
+            self._contadores[contador] = inicio + quantidade - 1
+            return inicio
+
+
+# --- Backend CSV ---
+@contextmanager
+def _arquivo_travado(f, exclusivo=True):
+    """Trava o arquivo aberto enquanto o bloco executa (entre processos)"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        try:
+            yield f
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        # msvcrt só oferece trava exclusiva de um intervalo de bytes
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield f
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _csv_bytes(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def append_csv(caminho, colunas, rows):
+    """Acrescenta linhas ao CSV sem reler nem reescrever o arquivo.
+
+    O cabeçalho é escrito apenas quando o arquivo está vazio e os dados
+    são sincronizados em disco (fsync) antes de liberar a trava.
+    """
+    dados = _csv_bytes(rows)
+
+    with open(caminho, "ab+") as f:
+        with _arquivo_travado(f):
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                f.write(_csv_bytes([colunas]))
+            else:
+                # Garante que a linha anterior terminou (ex.: gravação interrompida)
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write(dados)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def read_csv_local(caminho, colunas=None):
+    """Lê um CSV local aguardando gravações em andamento.
+
+    Os valores vêm como texto (sem inferência: "0123" não vira 123); os tipos
+    são aplicados por tipar_tabela.
+    """
+    if not os.path.exists(caminho) or os.path.getsize(caminho) == 0:
+        return pd.DataFrame(columns=colunas)
+    with open(caminho, "rb") as f:
+        with _arquivo_travado(f, exclusivo=False):
+            return pd.read_csv(f, dtype=str, keep_default_na=False)
+
+
+def reservar_em_arquivo(caminho, quantidade=1):
+    """Contador guardado num arquivo texto, incrementado sob trava exclusiva"""
+    with open(caminho, "a+b") as f:
+        with _arquivo_travado(f):
+            f.seek(0)
+            atual = int(f.read().strip() or 0)
+            f.seek(0)
+            f.truncate()
+            f.write(str(atual + quantidade).encode("ascii"))
+            f.flush()
+            os.fsync(f.fileno())
+    return atual + 1
+
+
+class CSVStorage(ParticoesMensais, StorageBackend):
+    """Um arquivo CSV por tabela (fallback quando o Sheets não está disponível).
+
+    Com `particionar`, CVT e REQUISICOES ganham um arquivo por mês
+    (ex.: cvt_local_2026-10.csv); o arquivo único anterior é o legado.
+    """
+
+    nome = "csv"
+
+    def __init__(self, pasta=".", particionar=False, particao_max_linhas=None):
+        self.pasta = pasta
+        self.particionar = particionar
+        self.particao_max_linhas = particao_max_linhas
+        self._lock_particoes = threading.Lock()
+
+    def caminho(self, tabela, particao=None):
+        arquivo = TABELAS[tabela]["csv"]
+        if particao is not None:
+            base, extensao = os.path.splitext(arquivo)
+            arquivo = f"{base}_{particao}{extensao}"
+        return os.path.join(self.pasta, arquivo)
+
+    def ler_tabela(self, tabela):
+        if self.particionada(tabela):
+            return self._ler_particionada(tabela)
+        return read_csv_local(self.caminho(tabela), TABELAS[tabela]["colunas"])
+
+    def consultar(self, tabela, desde=None, limite=None, ordem=None, **filtros):
+        if not self.particionada(tabela):
+            return super().consultar(tabela, desde, limite, ordem, **filtros)
+        df = self._ler_particionada(tabela, desde)
+        return _consultar_df(df, desde, limite, ordem, filtros)
+
+    def inserir(self, tabela, rows):
+        if self.particionada(tabela):
+            return self._inserir_particionada(tabela, rows)
+        append_csv(self.caminho(tabela), TABELAS[tabela]["colunas"], rows)
+
+    def atualizar(self, tabela, filtros, valores):
+        if self.particionada(tabela):
+            return self._atualizar_particionada(tabela, filtros, valores)
+        return self._atualizar_arquivo(self.caminho(tabela), filtros, valores)
+
+    def _atualizar_arquivo(self, caminho, filtros, valores):
+        if not os.path.exists(caminho) or os.path.getsize(caminho) == 0:
+            return 0
+        # Reescreve no lugar (sem os.replace) para que as travas continuem valendo
+        with open(caminho, "rb+") as f:
+            with _arquivo_travado(f):
+                f.seek(0)
+                # Lê tudo como texto: a reescrita não altera os demais valores
+                # (ex.: senha "0123" continua "0123") e aceita valores de outro tipo
+                df = pd.read_csv(f, dtype=str, keep_default_na=False)
+                filtros = {coluna: str(valor) for coluna, valor in filtros.items()}
+                total = _aplicar_atualizacao(df, filtros, valores)
+                if total:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(df.to_csv(index=False, lineterminator="\n").encode("utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                return total
+
+    def reservar_numeros(self, contador, quantidade=1):
+        caminho = os.path.join(self.pasta, f"contador_{contador}.txt")
+        return reservar_em_arquivo(caminho, quantidade)
+
+    # --- Partições (um arquivo por mês) ---
+    def _listar_particoes(self, tabela):
+        base, extensao = os.path.splitext(TABELAS[tabela]["csv"])
+        padrao = re.compile(re.escape(base) + "_(" + PADRAO_PARTICAO + ")" + re.escape(extensao))
+        try:
+            arquivos = os.listdir(self.pasta)
+        except FileNotFoundError:
+            return []
+        return [m.group(1) for m in map(padrao.fullmatch, arquivos) if m]
+
+    def _ler_particao(self, tabela, particao):
+        return read_csv_local(self.caminho(tabela, particao), TABELAS[tabela]["colunas"])
+
+    def _criar_particao(self, tabela, particao):
+        # O arquivo (com cabeçalho) nasce na primeira gravação
+        pass
+
+    def _inserir_particao(self, tabela, particao, linhas):
+        append_csv(self.caminho(tabela, particao), TABELAS[tabela]["colunas"], linhas)
+
+    def _contar_particao(self, tabela, particao):
+        caminho = self.caminho(tabela, particao)
+        if not os.path.exists(caminho):
+            return 0
+        with open(caminho, "rb") as f:
+            return max(0, sum(1 for _ in f) - 1)
+
+    def _atualizar_particao(self, tabela, particao, filtros, valores):
+        return self._atualizar_arquivo(self.caminho(tabela, particao), filtros, valores)
+
+    def particionar_legado(self, tabela):
+        """Distribui o CSV único (legado) da tabela nas partições mensais.
+
+        O arquivo original é mantido com o sufixo ".migrado". Retorna o
+        número de linhas movidas.
+        """
+        caminho = self.caminho(tabela)
+        df = read_csv_local(caminho, TABELAS[tabela]["colunas"])
+        if df.empty:
+            return 0
+        colunas = TABELAS[tabela]["colunas"]
+        for coluna in colunas:
+            if coluna not in df.columns:
+                df[coluna] = ""
+        meses = df[COLUNA_DATA].map(mes_da_data)
+        for mes, grupo in df[colunas].groupby(meses, sort=True):
+            self._inserir_no_mes(tabela, mes, list(grupo.itertuples(index=False, name=None)))
+        os.replace(caminho, f"{caminho}.migrado")
+        return len(df)
+
+
+# --- Backend SQLite ---
+def _ativar_wal(conn, espera=30):
+    """PRAGMA journal_mode=WAL com novas tentativas: com vários processos
+    abrindo um banco novo ao mesmo tempo, a troca de modo responde
+    "database is locked" sem esperar o timeout da conexão
+    """
+    limite = time.monotonic() + espera
+    while True:
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or time.monotonic() > limite:
+                raise
+            time.sleep(0.05)
+
+
+class SQLiteStorage(StorageBackend):
+    """Armazena as tabelas do sistema em um banco SQLite (modo WAL) indexado"""
+
+    nome = "sqlite"
+    consulta_nativa = True
+
+    def __init__(self, caminho=SQLITE_DB):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._criar_tabelas()
+
+    def _conexao(self):
+        # sqlite3 não compartilha conexões entre threads: uma por thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            _ativar_wal(conn)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _criar_tabelas(self):
+        conn = self._conexao()
+        with conn:
+            for nome, tabela in TABELAS.items():
+                colunas = ", ".join(
+                    f'"{c}" INTEGER' if c in COLUNAS_INTEIRAS else f'"{c}" TEXT'
+                    for c in tabela["colunas"]
+                )
+                conn.execute(f'CREATE TABLE IF NOT EXISTS "{nome}" ({colunas})')
+                for indice in tabela["indices"]:
+                    # Índices compostos são tuplas de colunas
+                    colunas_indice = indice if isinstance(indice, tuple) else (indice,)
+                    nome_indice = "_".join(colunas_indice)
+                    lista = ", ".join(f'"{c}"' for c in colunas_indice)
+                    conn.execute(
+                        f'CREATE INDEX IF NOT EXISTS "idx_{nome}_{nome_indice}" '
+                        f'ON "{nome}" ({lista})'
+                    )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS "contadores" '
+                '("nome" TEXT PRIMARY KEY, "valor" INTEGER NOT NULL)'
+            )
+
+    def ler_tabela(self, nome):
+        """Retorna a tabela inteira como DataFrame, na ordem de inserção"""
+        colunas = ", ".join(f'"{c}"' for c in TABELAS[nome]["colunas"])
+        return pd.read_sql_query(
+            f'SELECT {colunas} FROM "{nome}" ORDER BY rowid', self._conexao()
+        )
+
+    def inserir(self, nome, rows):
+        """Insere linhas (listas na ordem das colunas da tabela) numa transação"""
+        colunas = TABELAS[nome]["colunas"]
+        marcadores = ", ".join("?" for _ in colunas)
+        conn = self._conexao()
+        with conn:
+            conn.executemany(
+                f'INSERT INTO "{nome}" VALUES ({marcadores})',
+                [list(row) for row in rows],
+            )
+
+    def _where(self, nome, filtros):
+        colunas = TABELAS[nome]["colunas"]
+        for coluna in filtros:
+            if coluna not in colunas:
+                raise KeyError(coluna)
+        if not filtros:
+            return "", []
+        clausula = " AND ".join(f'"{c}" = ?' for c in filtros)
+        return f" WHERE {clausula}", list(filtros.values())
+
+    def consultar(self, nome, desde=None, limite=None, ordem=None, **filtros):
+        """Filtros, período, ordem e limite executados no SQL (usa os índices)"""
+        colunas = TABELAS[nome]["colunas"]
+        where, parametros = self._where(nome, filtros)
+        if desde is not None:
+            if COLUNA_DATA not in colunas:
+                raise KeyError(COLUNA_DATA)
+            where += " AND " if where else " WHERE "
+            where += f'"{COLUNA_DATA}" >= ?'
+            parametros.append(_texto_data(desde))
+        ordenacao = "rowid"
+        if ordem:
+            coluna = ordem.lstrip("-")
+            if coluna not in colunas:
+                raise KeyError(coluna)
+            direcao = "DESC" if ordem.startswith("-") else "ASC"
+            # Empate mantém a ordem de gravação
+            ordenacao = f'"{coluna}" {direcao}, rowid {direcao}'
+        lista = ", ".join(f'"{c}"' for c in colunas)
+        sql = f'SELECT {lista} FROM "{nome}"{where} ORDER BY {ordenacao}'
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(int(limite))
+        return pd.read_sql_query(sql, self._conexao(), params=parametros)
+
+    def atualizar(self, nome, filtros, valores):
+        colunas = TABELAS[nome]["colunas"]
+        for coluna in valores:
+            if coluna not in colunas:
+                raise KeyError(coluna)
+        where, parametros = self._where(nome, filtros)
+        atribuicoes = ", ".join(f'"{c}" = ?' for c in valores)
+        conn = self._conexao()
+        with conn:
+            cursor = conn.execute(
+                f'UPDATE "{nome}" SET {atribuicoes}{where}',
+                list(valores.values()) + parametros,
+            )
+        return cursor.rowcount
+
+    def reservar_numeros(self, contador, quantidade=1):
+        conn = self._conexao()
+        with conn:
+            # BEGIN IMMEDIATE trava a escrita antes da leitura: dois processos
+            # nunca leem o mesmo valor
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                'INSERT OR IGNORE INTO "contadores" ("nome", "valor") VALUES (?, 0)',
+                (contador,)
+            )
+            conn.execute(
+                'UPDATE "contadores" SET "valor" = "valor" + ? WHERE "nome" = ?',
+                (quantidade, contador)
+            )
+            valor = conn.execute(
+                'SELECT "valor" FROM "contadores" WHERE "nome" = ?', (contador,)
+            ).fetchone()[0]
+        return valor - quantidade + 1
+
+    def contar(self, nome):
+        return self._conexao().execute(f'SELECT COUNT(*) FROM "{nome}"').fetchone()[0]
+
+    def limpar(self, nome):
+        conn = self._conexao()
+        with conn:
+            conn.execute(f'DELETE FROM "{nome}"')
+
+
+# --- Backend Google Sheets ---
+def _numericise(valor):
+    if valor == "":
+        return ""
+    try:
+        return int(valor)
+    except ValueError:
+        try:
+            return float(valor)
+        except ValueError:
+            return valor
+
+
+def numericise_all(valores):
+    """Converte textos numéricos como o get_all_records do gspread"""
+    try:
+        from gspread.utils import numericise_all as _gspread_numericise_all
+    except ImportError:
+        return [_numericise(v) for v in valores]
+    return _gspread_numericise_all(valores, default_blank="")
+
+
+def _letra_coluna(indice):
+    """Converte índice de coluna (1 = A) para a letra usada em ranges A1"""
+    letras = ""
+    while indice > 0:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+class SheetsStorage(ParticoesMensais, StorageBackend):
+    """Tabelas em worksheets do Google Sheets (gspread ou fake_sheets).
+
+    Tabelas append-only (`incrementais`) são mantidas em memória: a primeira
+    leitura e cada reconciliação periódica baixam a planilha inteira, as
+    demais buscam apenas as linhas após a última vista. Tabelas sem
+    worksheet são delegadas ao backend `local`.
+
+    Com `particionar`, CVT e REQUISICOES ganham uma worksheet por mês
+    (ex.: "CVT_2026-10"), criada com uma grade pequena que cresce a cada
+    append. Se as células em uso mais a estimativa de um mês não cabem no
+    limite do Sheets, a partição vai para uma planilha auxiliar ("CVT_DB_2", ...).
+    """
+
+    nome = "sheets"
+    remoto = True
+
+    def __init__(self, worksheets, local=None, incrementais=("cvt", "req"),
+                 intervalo_reconciliacao=900, planilha=None, cliente=None, existentes=None,
+                 particionar=False, particao_max_linhas=100000, limite_celulas=10_000_000,
+                 particao_linhas_iniciais=100):
+        self.worksheets = worksheets
+        self.local = local or CSVStorage()
+        self.incrementais = set(incrementais)
+        self.intervalo_reconciliacao = intervalo_reconciliacao
+        self._estados = {}
+        self._lock = threading.Lock()
+
+        self.particionar = particionar and planilha is not None
+        self.particao_max_linhas = particao_max_linhas
+        self.limite_celulas = limite_celulas
+        self.particao_linhas_iniciais = particao_linhas_iniciais
+        self.cliente = cliente
+        self.planilhas = [planilha] if planilha is not None else []
+        self._particoes = {tabela: {} for tabela in TABELAS_PARTICIONADAS}
+        self._planilha_da_particao = {}
+        self._particao_do_titulo = {}
+        self._contagens = {}
+        self._lock_particoes = threading.Lock()
+        self._lock_contadores = threading.Lock()
+        self._contadores_conferidos = set()
+        if self.particionar:
+            if existentes is None:
+                existentes = planilha.worksheets()
+            self._registrar_worksheets(planilha, existentes)
+            self._descobrir_planilhas_auxiliares()
+
+    def _worksheet(self, tabela):
+        return self.worksheets.get(tabela)
+
+    def _linhas_para_df(self, cabecalho, linhas):
+        largura = len(cabecalho)
+        linhas = [
+            numericise_all((list(linha) + [""] * largura)[:largura])
+            for linha in linhas
+        ]
+        return pd.DataFrame(linhas, columns=cabecalho)
+
+    def _sincronizar_tudo(self, worksheet):
+        return self._estado_de_valores(worksheet.get_all_values())
+
+    def _estado_de_valores(self, valores):
+        cabecalho = valores[0] if valores else []
+        return {
+            "cabecalho": cabecalho,
+            "linhas_vistas": len(valores),
+            "df": self._linhas_para_df(cabecalho, valores[1:]),
+            "reconciliado_em": time.monotonic(),
+        }
+
+    def _sincronizar_novas(self, worksheet, estado):
+        # O range começa na última linha já vista (sempre dentro da grade,
+        # mesmo com a planilha cheia) e ela é descartada do resultado
+        inicio = estado["linhas_vistas"]
+        ultima_coluna = _letra_coluna(len(estado["cabecalho"]))
+        novas = worksheet.get(f"A{inicio}:{ultima_coluna}")[1:]
+        if novas:
+            df_novas = self._linhas_para_df(estado["cabecalho"], novas)
+            estado["df"] = pd.concat([estado["df"], df_novas], ignore_index=True)
+            estado["linhas_vistas"] += len(novas)
+
+    def _ler_incremental(self, chave, worksheet):
+        """Leitura incremental de uma worksheet; `chave` é (tabela, partição)"""
+        with self._lock:
+            estado = self._estados.get(chave)
+            vencido = estado is None or (
+                time.monotonic() - estado["reconciliado_em"] > self.intervalo_reconciliacao
+            )
+            if vencido or not estado["cabecalho"]:
+                estado = self._sincronizar_tudo(worksheet)
+            else:
+                try:
+                    self._sincronizar_novas(worksheet, estado)
+                except Exception:
+                    # Range fora da grade ou planilha reorganizada: reconcilia
+                    estado = self._sincronizar_tudo(worksheet)
+            self._estados[chave] = estado
+            return estado["df"]
+
+    def reconciliar(self, tabela=None):
+        """Força leitura completa na próxima chamada"""
+        with self._lock:
+            if tabela is None:
+                self._estados.clear()
+            else:
+                for chave in [c for c in self._estados if c[0] == tabela]:
+                    del self._estados[chave]
+        with self._lock_particoes:
+            self._contagens = {
+                chave: total for chave, total in self._contagens.items()
+                if tabela is not None and chave[0] != tabela
+            }
+
+    def ler_tabela(self, tabela):
+        if self.particionada(tabela):
+            return self._ler_particionada(tabela)
+        worksheet = self._worksheet(tabela)
+        if worksheet is None:
+            return self.local.ler_tabela(tabela)
+        if tabela in self.incrementais:
+            return self._ler_incremental((tabela, None), worksheet)
+        return pd.DataFrame(worksheet.get_all_records())
+
+    def consultar(self, tabela, desde=None, limite=None, ordem=None, **filtros):
+        if not self.particionada(tabela):
+            return super().consultar(tabela, desde, limite, ordem, **filtros)
+        df = self._ler_particionada(tabela, desde)
+        return _consultar_df(df, desde, limite, ordem, filtros)
+
+    def inserir(self, tabela, rows):
+        if self.particionada(tabela):
+            return self._inserir_particionada(tabela, rows)
+        worksheet = self._worksheet(tabela)
+        if worksheet is None:
+            return self.local.inserir(tabela, rows)
+        worksheet.append_rows([list(row) for row in rows])
+
+    def reservar_numeros(self, contador, quantidade=1):
+        # O Sheets não oferece incremento atômico: o contador fica no backend
+        # local do servidor (o app roda em uma única instância)
+        with self._lock_contadores:
+            inicio = self.local.reservar_numeros(contador, quantidade)
+            if contador in self._contadores_conferidos:
+                return inicio
+            # Primeira reserva do processo: o contador local pode ter sido
+            # perdido (contêiner recriado) e recomeçado abaixo dos números
+            # já gravados na planilha; nesse caso salta para depois deles
+            maior = self._maior_sequencia(contador)
+            if inicio <= maior:
+                salto = maior - inicio + 1
+                inicio = self.local.reservar_numeros(contador, salto + quantidade) + salto
+            self._contadores_conferidos.add(contador)
+            return inicio
+
+    def _maior_sequencia(self, tabela):
+        """Maior sequência ("CVT-AAAAMMDD-<sequência>") em numero_cvt da tabela;
+        particionada, basta o mês mais recente (os números só crescem)
+        """
+        if tabela not in TABELAS or "numero_cvt" not in TABELAS[tabela]["colunas"]:
+            return 0
+        df = None
+        particoes = self.particoes(tabela) if self.particionada(tabela) else []
+        if particoes:
+            df = self.consultar(tabela, desde=chave_particao(particoes[-1])[0] + "-01")
+        if df is None or df.empty:
+            df = self.ler_tabela(tabela)
+        if df.empty:
+            return 0
+        sequencias = df["numero_cvt"].astype(str).str.extract(r"-(\d+)$", expand=False)
+        maior = pd.to_numeric(sequencias, errors="coerce").max()
+        return 0 if pd.isna(maior) else int(maior)
+
+    def atualizar(self, tabela, filtros, valores):
+        if self.particionada(tabela):
+            return self._atualizar_particionada(tabela, filtros, valores)
+        worksheet = self._worksheet(tabela)
+        if worksheet is None:
+            return self.local.atualizar(tabela, filtros, valores)
+        return self._atualizar_worksheet((tabela, None), worksheet, filtros, valores)
+
+    def _atualizar_worksheet(self, chave, worksheet, filtros, valores):
+        valores_planilha = worksheet.get_all_values()
+        if not valores_planilha:
+            return 0
+        cabecalho = valores_planilha[0]
+        indices = {coluna: cabecalho.index(coluna) for coluna in list(filtros) + list(valores)}
+        alteracoes = []
+        total = 0
+        for numero_linha, linha in enumerate(valores_planilha[1:], start=2):
+            linha = numericise_all(linha + [""] * (len(cabecalho) - len(linha)))
+            if all(linha[indices[c]] == v for c, v in filtros.items()):
+                total += 1
+                for coluna, valor in valores.items():
+                    celula = f"{_letra_coluna(indices[coluna] + 1)}{numero_linha}"
+                    alteracoes.append({"range": celula, "values": [[valor]]})
+        if alteracoes:
+            worksheet.batch_update(alteracoes)
+            with self._lock:
+                self._estados.pop(chave, None)
+        return total
+
+    # --- Partições (uma worksheet por mês) ---
+    def _titulo_particao(self, tabela, particao):
+        return f"{TABELAS[tabela]['sheet']}_{particao}"
+
+    def _registrar_worksheets(self, planilha, worksheets):
+        for tabela in TABELAS_PARTICIONADAS:
+            padrao = re.compile(re.escape(TABELAS[tabela]["sheet"]) + "_(" + PADRAO_PARTICAO + ")")
+            for worksheet in worksheets:
+                m = padrao.fullmatch(worksheet.title)
+                if m:
+                    self._particoes[tabela][m.group(1)] = worksheet
+                    self._planilha_da_particao[(tabela, m.group(1))] = planilha
+                    self._particao_do_titulo[worksheet.title] = (tabela, m.group(1))
+
+    def _celulas_usadas(self, worksheet):
+        """Células ocupadas: linhas gravadas nas partições já contadas, a
+        grade (que cresce com os appends) nas demais
+        """
+        contagem = self._contagens.get(self._particao_do_titulo.get(worksheet.title))
+        if contagem is not None:
+            return min(worksheet.row_count, contagem + 1) * worksheet.col_count
+        return worksheet.row_count * worksheet.col_count
+
+    def _celulas_particao(self, tabela):
+        """Estimativa de um mês: a maior partição da tabela até agora"""
+        linhas = max(
+            [self.particao_linhas_iniciais]
+            + [n for (t, _), n in self._contagens.items() if t == tabela]
+        )
+        return (min(linhas, self.particao_max_linhas) + 1) * len(TABELAS[tabela]["colunas"])
+
+    def _comporta(self, worksheets, tabela="req"):
+        """True se a planilha com estas worksheets ainda comporta uma partição nova"""
+        usadas = sum(self._celulas_usadas(w) for w in worksheets)
+        return usadas + self._celulas_particao(tabela) <= self.limite_celulas
+
+    def _descobrir_planilhas_auxiliares(self):
+        while self.cliente is not None:
+            try:
+                planilha = self.cliente.open(f"{SHEET_NAME}_{len(self.planilhas) + 1}")
+            except Exception:
+                return
+            self.planilhas.append(planilha)
+            self._registrar_worksheets(planilha, planilha.worksheets())
+
+    def _planilha_para(self, tabela):
+        """Primeira planilha que comporta mais uma partição (cria outra se nenhuma)"""
+        for planilha in self.planilhas:
+            if self._comporta(planilha.worksheets(), tabela):
+                return planilha
+        if self.cliente is None:
+            raise RuntimeError("Planilha sem espaço para uma nova partição")
+        planilha = self.cliente.create(f"{SHEET_NAME}_{len(self.planilhas) + 1}")
+        self.planilhas.append(planilha)
+        return planilha
+
+    def _listar_particoes(self, tabela):
+        return list(self._particoes[tabela])
+
+    def _ler_particionada(self, tabela, desde=None):
+        self._carregar_em_lote(tabela, self._particoes_do_periodo(tabela, desde))
+        return super()._ler_particionada(tabela, desde)
+
+    def _carregar_em_lote(self, tabela, particoes):
+        """Partições ainda não lidas (ou vencidas): uma chamada por planilha
+        (values_batch_get) em vez de uma por worksheet
+        """
+        agora = time.monotonic()
+        por_planilha = {}
+        with self._lock:
+            for particao in particoes:
+                estado = self._estados.get((tabela, particao))
+                if particao is None or (
+                    estado is not None and agora - estado["reconciliado_em"] <= self.intervalo_reconciliacao
+                ):
+                    continue
+                planilha = self._planilha_da_particao[(tabela, particao)]
+                por_planilha.setdefault(id(planilha), (planilha, []))[1].append(particao)
+        for planilha, pendentes in por_planilha.values():
+            if len(pendentes) < 2:
+                continue
+            titulos = [self._titulo_particao(tabela, p) for p in pendentes]
+            try:
+                resposta = planilha.values_batch_get([f"'{titulo}'" for titulo in titulos])
+            except Exception:
+                # Sem leitura em lote: cada partição é lida na sua vez
+                continue
+            for particao, intervalo in zip(pendentes, resposta.get("valueRanges", [])):
+                estado = self._estado_de_valores(intervalo.get("values", []))
+                with self._lock:
+                    self._estados[(tabela, particao)] = estado
+
+    def _particao_fechada(self, particao):
+        """Legado e meses anteriores: só recebem linhas gravadas por este processo"""
+        return particao is None or chave_particao(particao)[0] < mes_da_data(None)
+
+    def _ler_particao(self, tabela, particao):
+        chave = (tabela, particao)
+        if self._particao_fechada(particao):
+            # Sem linhas novas de outros clientes: o estado vale até a
+            # reconciliação, sem consultar a API (economiza cota de leitura)
+            with self._lock:
+                estado = self._estados.get(chave)
+                if estado is not None and estado["cabecalho"] and (
+                    time.monotonic() - estado["reconciliado_em"] <= self.intervalo_reconciliacao
+                ):
+                    return estado["df"]
+        if particao is None:
+            worksheet = self._worksheet(tabela)
+            if worksheet is None:
+                return pd.DataFrame(columns=TABELAS[tabela]["colunas"])
+        else:
+            worksheet = self._particoes[tabela][particao]
+        return self._ler_incremental(chave, worksheet)
+
+    def _criar_particao(self, tabela, particao):
+        planilha = self._planilha_para(tabela)
+        worksheet = planilha.add_worksheet(
+            title=self._titulo_particao(tabela, particao),
+            rows=self.particao_linhas_iniciais + 1, cols=len(TABELAS[tabela]["colunas"]),
+        )
+        self._particoes[tabela][particao] = worksheet
+        self._planilha_da_particao[(tabela, particao)] = planilha
+        self._particao_do_titulo[worksheet.title] = (tabela, particao)
+        self._contagens[(tabela, particao)] = 0
+
+    def _inserir_particao(self, tabela, particao, linhas):
+        chave = (tabela, particao)
+        # Worksheet ainda sem cabeçalho (recém-criada ou gravação anterior
+        # falhou): ele vai junto com as linhas, numa única chamada
+        vazia = self._contar_particao(tabela, particao) == 0 and not (
+            self._estados.get(chave) or {}
+        ).get("cabecalho")
+        cabecalho = [TABELAS[tabela]["colunas"]] if vazia else []
+        self._particoes[tabela][particao].append_rows(cabecalho + linhas)
+        if chave in self._contagens:
+            self._contagens[chave] += len(linhas)
+        if self._particao_fechada(particao):
+            # Linha atrasada (ex.: outbox) num mês anterior: relê a partição
+            with self._lock:
+                self._estados.pop(chave, None)
+
+    def _contar_particao(self, tabela, particao):
+        chave = (tabela, particao)
+        if chave not in self._contagens:
+            self._contagens[chave] = len(self._ler_particao(tabela, particao))
+        return self._contagens[chave]
+
+    def _atualizar_particao(self, tabela, particao, filtros, valores):
+        if particao is None:
+            worksheet = self._worksheet(tabela)
+            if worksheet is None:
+                return 0
+        else:
+            worksheet = self._particoes[tabela][particao]
+        return self._atualizar_worksheet((tabela, particao), worksheet, filtros, valores)
+
+
+# --- Numeração ---
+class AlocadorNumeros:
+    """Entrega números únicos e crescentes sem ler a tabela inteira.
+
+    Cada processo reserva blocos de `tamanho_bloco` números no contador do
+    backend e os distribui localmente; números de um bloco não usado
+    (ex.: reinício do app) são descartados, nunca repetidos.
+    """
+
+    def __init__(self, storage, contador, tamanho_bloco=10):
+        self.storage = storage
+        self.contador = contador
+        self.tamanho_bloco = tamanho_bloco
+        self._proximo = 1
+        self._fim = 0
+        self._lock = threading.Lock()
+
+    def proximo(self):
+        with self._lock:
+            if self._proximo > self._fim:
+                self._proximo = self.storage.reservar_numeros(self.contador, self.tamanho_bloco)
+                self._fim = self._proximo + self.tamanho_bloco - 1
+            numero = self._proximo
+            self._proximo += 1
+            return numero
+
+
+# --- Outbox (gravação em segundo plano) ---
+class Outbox:
+    """Diário local e durável das gravações pendentes para o backend remoto.
+
+    Cada gravação é confirmada no SQLite (synchronous=FULL) antes de a
+    interface responder e enviada depois pelo EnviadorOutbox. A `chave` de
+    idempotência identifica a gravação: registrar a mesma chave de novo (com
+    as mesmas linhas) não cria um segundo envio.
+    """
+
+    PENDENTE = "PENDENTE"
+    ENVIADO = "ENVIADO"
+
+    def __init__(self, caminho=OUTBOX_DB, espera_maxima=300):
+        self.caminho = caminho
+        self.espera_maxima = espera_maxima
+        self._local = threading.local()
+        self._criar_tabela()
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.row_factory = sqlite3.Row
+            _ativar_wal(conn)
+            # A gravação só é confirmada ao técnico depois de chegar ao disco
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _criar_tabela(self):
+        conn = self._conexao()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS "outbox" ('
+                '"id" INTEGER PRIMARY KEY AUTOINCREMENT, '
+                '"chave" TEXT NOT NULL UNIQUE, '
+                '"tabela" TEXT NOT NULL, '
+                '"numero_cvt" TEXT, '
+                '"linhas" TEXT NOT NULL, '
+                '"status" TEXT NOT NULL, '
+                '"tentativas" INTEGER NOT NULL DEFAULT 0, '
+                '"erro" TEXT, '
+                '"criado_em" TEXT NOT NULL, '
+                '"enviado_em" TEXT, '
+                '"proxima_tentativa" REAL NOT NULL DEFAULT 0)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS "idx_outbox_status" ON "outbox" ("status")')
+            conn.execute('CREATE INDEX IF NOT EXISTS "idx_outbox_numero_cvt" ON "outbox" ("numero_cvt")')
+
+    def registrar(self, tabela, rows, chave, numero_cvt=None):
+        """Grava as linhas no diário; retorna False se a chave já existia com
+        as mesmas linhas (ValueError se com outras)
+        """
+        linhas = json.dumps([list(row) for row in rows])
+        conn = self._conexao()
+        with conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO "outbox" '
+                '("chave", "tabela", "numero_cvt", "linhas", "status", "criado_em") '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (chave, tabela, numero_cvt, linhas, self.PENDENTE, datetime.datetime.now().isoformat()),
+            )
+            if cursor.rowcount == 1:
+                return True
+            existente = conn.execute(
+                'SELECT "linhas" FROM "outbox" WHERE "chave" = ?', (chave,)
+            ).fetchone()
+        if existente is not None and existente["linhas"] != linhas:
+            raise ValueError(f"Chave {chave} já registrada no outbox com outras linhas")
+        return False
+
+    def _item(self, registro):
+        item = dict(registro)
+        item["linhas"] = json.loads(item["linhas"])
+        return item
+
+    def pendentes(self, limite=50):
+        """Gravações pendentes cuja próxima tentativa já venceu, em ordem"""
+        registros = self._conexao().execute(
+            'SELECT * FROM "outbox" WHERE "status" = ? AND "proxima_tentativa" <= ? '
+            'ORDER BY "id" LIMIT ?',
+            (self.PENDENTE, time.time(), limite),
+        ).fetchall()
+        return [self._item(r) for r in registros]
+
+    def iniciar_tentativa(self, ids):
+        """Conta a tentativa antes do envio: se o processo cair no meio, a
+        próxima tentativa sabe que precisa conferir o destino antes de reenviar
+        """
+        conn = self._conexao()
+        with conn:
+            conn.executemany(
+                'UPDATE "outbox" SET "tentativas" = "tentativas" + 1 WHERE "id" = ?',
+                [(i,) for i in ids],
+            )
+
+    def marcar_enviado(self, ids):
+        conn = self._conexao()
+        agora = datetime.datetime.now().isoformat()
+        with conn:
+            conn.executemany(
+                'UPDATE "outbox" SET "status" = ?, "enviado_em" = ?, "erro" = NULL WHERE "id" = ?',
+                [(self.ENVIADO, agora, i) for i in ids],
+            )
+
+    def marcar_falha(self, itens, erro, contada=True):
+        """Registra o erro e agenda nova tentativa com espera exponencial.
+
+        A espera vem das tentativas gravadas no diário (não das lidas pelo
+        chamador antes do envio); sem `contada` (falha antes de
+        iniciar_tentativa) a tentativa é somada aqui, no mesmo UPDATE.
+        """
+        incremento = 0 if contada else 1
+        conn = self._conexao()
+        with conn:
+            # No SET, "tentativas" é o valor anterior ao UPDATE
+            conn.executemany(
+                'UPDATE "outbox" SET "tentativas" = "tentativas" + ?, "erro" = ?, '
+                '"proxima_tentativa" = ? + min(?, 1 << min("tentativas" + ?, 30)) WHERE "id" = ?',
+                [(incremento, erro, time.time(), self.espera_maxima, incremento, item["id"]) for item in itens],
+            )
+
+    def linhas_pendentes(self, tabela):
+        """Linhas ainda não enviadas de uma tabela, com o numero_cvt de cada gravação"""
+        registros = self._conexao().execute(
+            'SELECT "numero_cvt", "linhas" FROM "outbox" '
+            'WHERE "status" = ? AND "tabela" = ? ORDER BY "id"',
+            (self.PENDENTE, tabela),
+        ).fetchall()
+        return [(r["numero_cvt"], json.loads(r["linhas"])) for r in registros]
+
+    def status_por_cvt(self, numeros):
+        """{numero_cvt: {"status", "tentativas", "erro"}} das CVTs que passaram
+        pelo outbox; uma CVT fica PENDENTE enquanto qualquer gravação dela estiver
+        """
+        numeros = list(numeros)
+        status = {}
+        for inicio in range(0, len(numeros), 500):
+            parte = numeros[inicio:inicio + 500]
+            marcadores = ", ".join("?" for _ in parte)
+            registros = self._conexao().execute(
+                'SELECT "numero_cvt", "status", "tentativas", "erro" FROM "outbox" '
+                f'WHERE "numero_cvt" IN ({marcadores})',
+                parte,
+            ).fetchall()
+            for r in registros:
+                atual = status.get(r["numero_cvt"])
+                if atual is None or atual["status"] == self.ENVIADO:
+                    status[r["numero_cvt"]] = {
+                        "status": r["status"], "tentativas": r["tentativas"], "erro": r["erro"],
+                    }
+        return status
+
+    def contar_pendentes(self):
+        return self._conexao().execute(
+            'SELECT COUNT(*) FROM "outbox" WHERE "status" = ?', (self.PENDENTE,)
+        ).fetchone()[0]
+
+    def limpar_enviados(self, dias=7):
+        """Apaga gravações já enviadas há mais de `dias` dias"""
+        limite = (datetime.datetime.now() - datetime.timedelta(days=dias)).isoformat()
+        conn = self._conexao()
+        with conn:
+            conn.execute(
+                'DELETE FROM "outbox" WHERE "status" = ? AND "enviado_em" < ?',
+                (self.ENVIADO, limite),
+            )
+
+
+# Um único envio por vez no processo, mesmo se o app recriar o enviador
+_LOCK_ENVIO = threading.Lock()
+
+
+class EnviadorOutbox(threading.Thread):
+    """Thread que envia as gravações pendentes do Outbox ao backend remoto.
+
+    Gravações da mesma tabela são agrupadas numa única chamada. Após uma
+    falha o lote é reagendado e a rodada termina; antes de reenviar uma
+    gravação já tentada, o destino é consultado pelo numero_cvt para não
+    duplicar linhas (a chamada anterior pode ter chegado ao Sheets).
+    """
+
+    def __init__(self, outbox, destino, intervalo=5, lote=50):
+        super().__init__(name="cvt-outbox", daemon=True)
+        self.outbox = outbox
+        self.destino = destino
+        self.intervalo = intervalo
+        self.lote = lote
+        self.ultimo_erro = None
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._limpo_em = 0
+
+    def acordar(self):
+        """Antecipa a próxima rodada (chamado após cada nova gravação)"""
+        self._acordar.set()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                self.enviar_pendentes()
+                if time.monotonic() - self._limpo_em > 3600:
+                    self.outbox.limpar_enviados()
+                    self._limpo_em = time.monotonic()
+            except Exception as e:
+                # Falha no próprio diário: tenta de novo na próxima rodada
+                self.ultimo_erro = str(e)
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+
+    def _ja_enviado(self, item):
+        if not item["numero_cvt"] or not item["linhas"]:
+            return False
+        # Só o mês da gravação: em tabelas particionadas lê uma partição
+        colunas = TABELAS[item["tabela"]]["colunas"]
+        desde = mes_da_data(item["linhas"][0][colunas.index(COLUNA_DATA)]) + "-01"
+        encontradas = self.destino.consultar(item["tabela"], desde=desde, numero_cvt=item["numero_cvt"])
+        # Outra gravação da mesma CVT não conta: as linhas desta precisam estar lá
+        return marcas_linhas(item["tabela"], item["linhas"]) <= marcas_df(encontradas)
+
+    def enviar_pendentes(self):
+        """Executa uma rodada de envio; retorna o número de gravações enviadas"""
+        with _LOCK_ENVIO:
+            itens = self.outbox.pendentes(self.lote)
+            grupos = {}
+            for item in itens:
+                grupos.setdefault(item["tabela"], []).append(item)
+
+            enviados = 0
+            for tabela, grupo in grupos.items():
+                iniciada = False
+                try:
+                    ja_enviados = [i for i in grupo if i["tentativas"] and self._ja_enviado(i)]
+                    if ja_enviados:
+                        self.outbox.marcar_enviado([i["id"] for i in ja_enviados])
+                        grupo = [i for i in grupo if i not in ja_enviados]
+                    if not grupo:
+                        continue
+                    self.outbox.iniciar_tentativa([i["id"] for i in grupo])
+                    iniciada = True
+                    self.destino.inserir(tabela, [linha for i in grupo for linha in i["linhas"]])
+                except Exception as e:
+                    self.ultimo_erro = str(e)
+                    self.outbox.marcar_falha(grupo, str(e), contada=iniciada)
+                    break
+                self.outbox.marcar_enviado([i["id"] for i in grupo])
+                enviados += len(grupo)
+            return enviados
+
+
+def marcas_linhas(tabela, linhas):
+    """(numero_cvt, created_at) das linhas, como texto: identifica uma
+    gravação do outbox no destino
+    """
+    colunas = TABELAS[tabela]["colunas"]
+    numero, data = colunas.index("numero_cvt"), colunas.index(COLUNA_DATA)
+    return {(str(linha[numero]), str(linha[data])) for linha in linhas}
+
+
+def marcas_df(df):
+    if df.empty or "numero_cvt" not in df.columns or COLUNA_DATA not in df.columns:
+        return set()
+    return set(zip(df["numero_cvt"].astype(str), df[COLUNA_DATA].astype(str)))
+
+
+class StorageComOutbox(StorageBackend):
+    """Backend remoto com gravação em segundo plano.
+
+    Inserções nas tabelas do outbox vão para o diário local e retornam na
+    hora; as leituras juntam ao resultado remoto as linhas ainda pendentes
+    (o técnico vê a própria CVT mesmo antes do envio). A chave de
+    idempotência é `tabela:numero_cvt:<hash das linhas>`: cada lote de uma
+    CVT é uma gravação própria e repetir o mesmo lote não duplica o envio.
+    """
+
+    remoto = True
+
+    def __init__(self, destino, outbox, tabelas=("cvt", "req"), intervalo_envio=5):
+        self.destino = destino
+        self.nome = destino.nome
+        self.outbox = outbox
+        self.tabelas = set(tabelas)
+        self.enviador = EnviadorOutbox(outbox, destino, intervalo=intervalo_envio)
+
+    def iniciar_envio(self):
+        if not self.enviador.is_alive():
+            self.enviador.start()
+        return self
+
+    def _chave(self, tabela, rows):
+        colunas = TABELAS[tabela]["colunas"]
+        numeros = {row[colunas.index("numero_cvt")] for row in rows} if "numero_cvt" in colunas else set()
+        if len(numeros) == 1:
+            numero = numeros.pop()
+            conteudo = hashlib.sha256(json.dumps(rows, default=str).encode("utf-8")).hexdigest()[:16]
+            return f"{tabela}:{numero}:{conteudo}", numero
+        # Sem um numero_cvt único não há como conferir o destino: chave avulsa
+        return f"{tabela}:{time.time_ns()}:{threading.get_ident()}", None
+
+    def inserir(self, tabela, rows):
+        if tabela not in self.tabelas:
+            return self.destino.inserir(tabela, rows)
+        rows = [list(row) for row in rows]
+        chave, numero_cvt = self._chave(tabela, rows)
+        novo = self.outbox.registrar(tabela, rows, chave, numero_cvt=numero_cvt)
+        self.enviador.acordar()
+        return novo
+
+    def _pendentes(self, tabela):
+        return self.outbox.linhas_pendentes(tabela) if tabela in self.tabelas else []
+
+    def ler_tabela(self, tabela):
+        # Pendentes antes do destino: uma gravação enviada entre as duas
+        # leituras aparece no destino (e é descartada das pendentes)
+        pendentes = self._pendentes(tabela)
+        return self._com_pendentes(tabela, self.destino.ler_tabela(tabela), pendentes)
+
+    def _com_pendentes(self, tabela, df, pendentes, desde=None, filtros=None):
+        """`df` (lido do destino) mais as linhas `pendentes` no outbox que
+        ainda não estão nele
+        """
+        if not pendentes:
+            return df
+        vistas = marcas_df(df)
+        linhas = [
+            linha for _, grupo in pendentes
+            if not marcas_linhas(tabela, grupo) <= vistas
+            for linha in grupo
+        ]
+        if not linhas:
+            return df
+        novas = pd.DataFrame(linhas, columns=TABELAS[tabela]["colunas"])
+        if desde is not None or filtros:
+            # Compara como texto, como os valores gravados no destino
+            selecionadas = _consultar_df(novas.astype(str), desde, filtros={
+                coluna: str(valor) for coluna, valor in (filtros or {}).items()
+            })
+            novas = novas.loc[selecionadas.index]
+        return pd.concat([df, novas], ignore_index=True)
+
+    def consultar(self, tabela, desde=None, limite=None, ordem=None, **filtros):
+        pendentes = self._pendentes(tabela)
+        df = self._com_pendentes(
+            tabela, self.destino.consultar(tabela, desde=desde, **filtros), pendentes, desde, filtros
+        )
+        return _consultar_df(df, limite=limite, ordem=ordem)
+
+    def particionada(self, tabela):
+        return self.destino.particionada(tabela)
+
+    def particoes(self, tabela):
+        return self.destino.particoes(tabela)
+
+    def atualizar(self, tabela, filtros, valores):
+        # Atualizações vão direto ao destino (linhas pendentes não são alteradas)
+        return self.destino.atualizar(tabela, filtros, valores)
+
+    def reservar_numeros(self, contador, quantidade=1):
+        return self.destino.reservar_numeros(contador, quantidade)
+
+    def status_sincronizacao(self, numeros):
+        return self.outbox.status_por_cvt(numeros)
+
+    def reconciliar(self, tabela=None):
+        if hasattr(self.destino, "reconciliar"):
+            self.destino.reconciliar(tabela)
+
+
+# --- Migração CSV -> SQLite ---
+def importar_csv(storage, nome, origem, substituir=False):
+    """Importa uma tabela dos CSVs locais (`origem`, um CSVStorage) para o SQLite.
+
+    CVT e REQUISICOES são lidas de todas as partições mensais, mais o CSV
+    legado se ainda existir. Tabelas que já possuem dados são mantidas
+    (retorna None), a menos que `substituir` seja verdadeiro. Retorna o
+    número de linhas importadas.
+    """
+    if storage.contar(nome) and not substituir:
+        return None
+
+    colunas = TABELAS[nome]["colunas"]
+    df = origem.ler_tabela(nome)
+    if df.empty:
+        return 0
+    for coluna in colunas:
+        if coluna not in df.columns:
+            df[coluna] = ""
+    df = df[colunas]
+    for coluna in COLUNAS_INTEIRAS.intersection(colunas):
+        df[coluna] = pd.to_numeric(df[coluna], errors="coerce").fillna(0).astype(int)
+
+    if substituir:
+        storage.limpar(nome)
+    storage.inserir(nome, df.itertuples(index=False, name=None))
+    return len(df)
+
+
+def migrar_csvs(caminho_db=SQLITE_DB, substituir=False, pasta="."):
+    """Importa todos os CSVs de fallback para o banco SQLite"""
+    storage = SQLiteStorage(caminho_db)
+    origem = CSVStorage(pasta, particionar=True)
+    return {
+        nome: importar_csv(storage, nome, origem, substituir=substituir)
+        for nome in TABELAS
+    }
+
+
+def particionar_csvs(pasta="."):
+    """Distribui os CSVs únicos de CVT e REQUISICOES nas partições mensais"""
+    storage = CSVStorage(pasta, particionar=True)
+    return {nome: storage.particionar_legado(nome) for nome in TABELAS_PARTICIONADAS}
+
+
+def migrar_senhas(storage):
+    """Substitui as senhas em texto puro do cadastro de usuários por hashes.
+
+    Retorna o número de usuários convertidos.
+    """
+    from senhas import eh_hash, gerar_hash
+
+    df = storage.ler_tabela("users")
+    total = 0
+    for usuario, senha in zip(df.get("username", []), df.get("password", [])):
+        if senha is None or (isinstance(senha, float) and pd.isna(senha)) or eh_hash(senha):
+            continue
+        total += storage.atualizar("users", {"username": usuario}, {"password": gerar_hash(senha)})
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ferramentas de armazenamento do Sistema CVT")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    migrar = sub.add_parser("migrar-csv", help="Importa os CSVs locais para o SQLite")
+    migrar.add_argument("--db", default=SQLITE_DB, help="Caminho do banco SQLite")
+    migrar.add_argument("--pasta", default=".", help="Pasta onde estão os CSVs")
+    migrar.add_argument(
+        "--substituir", action="store_true",
+        help="Apaga os dados existentes de cada tabela antes de importar",
+    )
+
+    senhas = sub.add_parser(
+        "migrar-senhas", help="Converte as senhas em texto puro do cadastro local para hash"
+    )
+    senhas.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    senhas.add_argument("--db", default=SQLITE_DB, help="Caminho do banco SQLite")
+    senhas.add_argument("--pasta", default=".", help="Pasta onde estão os CSVs")
+
+    particionar = sub.add_parser(
+        "particionar", help="Divide os CSVs de CVT e REQUISICOES em arquivos mensais"
+    )
+    particionar.add_argument("--pasta", default=".", help="Pasta onde estão os CSVs")
+
+    args = parser.parse_args()
+    if args.comando == "particionar":
+        for nome, total in particionar_csvs(args.pasta).items():
+            print(f"{TABELAS[nome]['sheet']}: {total} linha(s) distribuída(s) por mês")
+    elif args.comando == "migrar-senhas":
+        storage = SQLiteStorage(args.db) if args.backend == "sqlite" else CSVStorage(args.pasta)
+        print(f"{migrar_senhas(storage)} senha(s) convertida(s)")
+    elif args.comando == "migrar-csv":
+        resultado = migrar_csvs(args.db, substituir=args.substituir, pasta=args.pasta)
+        for nome, total in resultado.items():
+            if total is None:
+                print(f"{TABELAS[nome]['sheet']}: mantida (já possui dados; use --substituir)")
+            else:
+                print(f"{TABELAS[nome]['sheet']}: {total} linha(s) importada(s)")
+
+
+if __name__ == "__main__":
+    main()
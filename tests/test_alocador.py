@@ -0,0 +1,94 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from fake_sheets import FakeClient
+from storage import SHEET_NAME, TABELAS, AlocadorNumeros, CSVStorage, SheetsStorage, SQLiteStorage
+
+PROCESSOS = 4
+THREADS = 5
+POR_THREAD = 20
+
+
+def abrir(backend, pasta):
+    if backend == "csv":
+        return CSVStorage(pasta)
+    return SQLiteStorage(f"{pasta}/cvt.db")
+
+
+def alocar_em_threads(backend, pasta):
+    """Várias threads de um mesmo processo dividindo um alocador"""
+    alocador = AlocadorNumeros(abrir(backend, pasta), "cvt", tamanho_bloco=3)
+    numeros = []
+
+    def trabalho():
+        for _ in range(POR_THREAD):
+            numeros.append(alocador.proximo())
+
+    threads = [threading.Thread(target=trabalho) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return numeros
+
+
+def _processo(args):
+    return alocar_em_threads(*args)
+
+
+@pytest.mark.parametrize("backend", ["csv", "sqlite"])
+def test_numeros_unicos_entre_threads(backend, tmp_path):
+    numeros = alocar_em_threads(backend, str(tmp_path))
+    assert len(numeros) == THREADS * POR_THREAD
+    assert len(set(numeros)) == len(numeros)
+
+
+@pytest.mark.parametrize("backend", ["csv", "sqlite"])
+def test_numeros_unicos_entre_processos(backend, tmp_path):
+    # Cada processo com seu alocador e suas threads, todos no mesmo contador
+    with multiprocessing.get_context("spawn").Pool(PROCESSOS) as pool:
+        lotes = pool.map(_processo, [(backend, str(tmp_path))] * PROCESSOS)
+    numeros = [numero for lote in lotes for numero in lote]
+    assert len(numeros) == PROCESSOS * THREADS * POR_THREAD
+    assert len(set(numeros)) == len(numeros)
+
+    # Um alocador novo continua depois de todos os blocos já reservados
+    assert min(alocar_em_threads(backend, str(tmp_path))) > max(numeros)
+
+
+def sheets_storage(planilha, pasta_local, particionar):
+    existentes = planilha.worksheets()
+    worksheets = {
+        chave: next(w for w in existentes if w.title == tabela["sheet"])
+        for chave, tabela in TABELAS.items()
+    }
+    return SheetsStorage(
+        worksheets, local=CSVStorage(pasta_local), planilha=planilha,
+        existentes=existentes, particionar=particionar,
+    )
+
+
+@pytest.mark.parametrize("particionar", [False, True])
+def test_contador_perdido_continua_apos_a_planilha(particionar, tmp_path):
+    planilha = FakeClient().create(SHEET_NAME)
+    for tabela in TABELAS.values():
+        planilha.add_worksheet(tabela["sheet"], rows=1000, cols=20)
+    (tmp_path / "antes").mkdir()
+    (tmp_path / "depois").mkdir()
+
+    storage = sheets_storage(planilha, str(tmp_path / "antes"), particionar)
+    alocador = AlocadorNumeros(storage, "cvt", tamanho_bloco=3)
+    gravados = [alocador.proximo() for _ in range(7)]
+    storage.inserir("cvt", [
+        ["2026-10-17T10:00:00", "T1", "C", "E", "S", "Serv", "", "", "SALVO", f"CVT-20261017-{numero:07d}"]
+        for numero in gravados
+    ])
+
+    # Contêiner recriado: a planilha continua, o contador local recomeça do zero
+    reiniciado = sheets_storage(planilha, str(tmp_path / "depois"), particionar)
+    alocador = AlocadorNumeros(reiniciado, "cvt", tamanho_bloco=3)
+    novos = [alocador.proximo() for _ in range(5)]
+    assert min(novos) > max(gravados)
+    assert len(set(novos)) == len(novos)
@@ -0,0 +1,30 @@
+from busca import IndiceBusca
+
+
+def indice():
+    return IndiceBusca([
+        ("P10 - Cabo", ["P10", "Cabo de aço", "Tração"]),
+        ("P1 - Botoeira", ["P1", "Botoeira", "Comando"]),
+        ("X9 - Polia P1", ["X9", "Polia P1", "Tração"]),
+        ("Sem código", [None, "Motor"]),
+        ("P100 - Motor", ["P100", "Motor", "Tração"]),
+    ])
+
+
+def test_codigo_exato_antes_do_prefixo():
+    rotulos, total = indice().buscar("p1")
+    assert rotulos[0] == "P1 - Botoeira"
+    assert set(rotulos[1:3]) == {"P10 - Cabo", "P100 - Motor"}
+    assert "X9 - Polia P1" in rotulos
+    assert total == len(rotulos)
+
+
+def test_codigo_por_prefixo():
+    rotulos, _ = indice().buscar("P10")
+    assert rotulos[:2] == ["P10 - Cabo", "P100 - Motor"]
+
+
+def test_sem_consulta_e_sem_resultado():
+    busca = indice()
+    assert busca.buscar("") == (busca.rotulos, 5)
+    assert busca.buscar("zzzz") == ([], 0)
@@ -0,0 +1,37 @@
+from storage import REQ_COLUMNS, TABELAS, CSVStorage, SQLiteStorage, migrar_csvs
+
+
+def requisicao(numero_cvt, created_at):
+    valores = {
+        "created_at": created_at, "tecnico": "T1", "numero_cvt": numero_cvt, "ordem_id": "",
+        "peca_codigo": "P1", "peca_descricao": "P1", "quantidade": 2, "status": "PENDENTE",
+        "prioridade": "NORMAL", "observacoes": "",
+    }
+    return [valores[coluna] for coluna in REQ_COLUMNS]
+
+
+def test_migra_pasta_com_particoes_mensais(tmp_path):
+    pasta = str(tmp_path)
+    # Legado anterior ao particionamento, distribuído por mês e renomeado
+    CSVStorage(pasta).inserir("req", [requisicao("CVT-1", "2026-08-03T10:00:00")])
+    csv = CSVStorage(pasta, particionar=True)
+    assert csv.particionar_legado("req") == 1
+    csv.inserir("req", [requisicao("CVT-2", "2026-09-01T10:00:00"), requisicao("CVT-3", "2026-10-01T10:00:00")])
+    csv.inserir("cvt", [["2026-10-01T10:00:00", "T1", "C", "E", "S", "Serv", "", "", "SALVO", "CVT-3"]])
+    csv.inserir("users", [["tec", "x", "TECNICO", "Tec"]])
+
+    caminho_db = str(tmp_path / "cvt.db")
+    resultado = migrar_csvs(caminho_db, pasta=pasta)
+
+    assert resultado["req"] == 3
+    assert resultado["cvt"] == 1
+    assert resultado["users"] == 1
+    sqlite = SQLiteStorage(caminho_db)
+    assert sorted(sqlite.ler_tabela("req")["numero_cvt"]) == ["CVT-1", "CVT-2", "CVT-3"]
+    assert sqlite.ler_tabela("req")["quantidade"].tolist() == [2, 2, 2]
+    assert sqlite.contar("cvt") == 1
+
+    # Sem --substituir as tabelas com dados são mantidas, e isso é informado
+    assert migrar_csvs(caminho_db, pasta=pasta)["req"] is None
+    assert sqlite.contar("req") == 3
+    assert set(resultado) == set(TABELAS)
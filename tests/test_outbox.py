@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from storage import REQ_COLUMNS, MemoryStorage, Outbox, StorageComOutbox
+
+
+def requisicao(numero_cvt, peca, created_at):
+    valores = {
+        "created_at": created_at, "tecnico": "T1", "numero_cvt": numero_cvt, "ordem_id": "",
+        "peca_codigo": peca, "peca_descricao": peca, "quantidade": 1, "status": "PENDENTE",
+        "prioridade": "NORMAL", "observacoes": "",
+    }
+    return [valores[coluna] for coluna in REQ_COLUMNS]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    # Sem iniciar a thread: o envio é chamado direto nos testes
+    return StorageComOutbox(MemoryStorage(), Outbox(str(tmp_path / "outbox.db")))
+
+
+def test_dois_lotes_da_mesma_cvt(storage):
+    assert storage.inserir("req", [requisicao("CVT-1", "A", "2026-10-01T10:00:00")])
+    assert storage.inserir("req", [requisicao("CVT-1", "B", "2026-10-01T11:00:00")])
+    assert sorted(storage.ler_tabela("req")["peca_codigo"]) == ["A", "B"]
+
+    assert storage.enviador.enviar_pendentes() == 2
+    assert sorted(storage.destino.ler_tabela("req")["peca_codigo"]) == ["A", "B"]
+    assert sorted(storage.ler_tabela("req")["peca_codigo"]) == ["A", "B"]
+
+
+def test_reenvio_de_lote_ja_enviado_nao_duplica(storage):
+    lote_a = [requisicao("CVT-1", "A", "2026-10-01T10:00:00")]
+    lote_b = [requisicao("CVT-1", "B", "2026-10-01T11:00:00")]
+    storage.inserir("req", lote_a)
+    storage.enviador.enviar_pendentes()
+    # O mesmo lote de novo é ignorado (idempotente)
+    assert storage.inserir("req", lote_a) is False
+
+    # Lote B tentado antes (ex.: queda após o envio): outra gravação da
+    # mesma CVT no destino não o marca como enviado
+    storage.inserir("req", lote_b)
+    item = storage.outbox.pendentes()[0]
+    storage.outbox.iniciar_tentativa([item["id"]])
+    storage.enviador.enviar_pendentes()
+    assert sorted(storage.destino.ler_tabela("req")["peca_codigo"]) == ["A", "B"]
+
+
+def test_chave_repetida_com_outras_linhas(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    assert outbox.registrar("req", [["a"]], "req:CVT-1:x", numero_cvt="CVT-1")
+    assert outbox.registrar("req", [["a"]], "req:CVT-1:x", numero_cvt="CVT-1") is False
+    with pytest.raises(ValueError):
+        outbox.registrar("req", [["b"]], "req:CVT-1:x", numero_cvt="CVT-1")
+
+
+def test_envio_entre_as_leituras_nao_some(storage):
+    storage.inserir("req", [requisicao("CVT-1", "A", "2026-10-01T10:00:00")])
+    destino = storage.destino
+    ler_original = destino.ler_tabela
+
+    def ler_apos_envio(tabela):
+        # O enviador termina entre a leitura das pendentes e a do destino
+        storage.enviador.enviar_pendentes()
+        return ler_original(tabela)
+
+    destino.ler_tabela = ler_apos_envio
+    assert list(storage.ler_tabela("req")["peca_codigo"]) == ["A"]
+    assert list(storage.consultar("req", numero_cvt="CVT-1")["peca_codigo"]) == ["A"]
+
+
+def espera_e_tentativas(outbox):
+    registro = outbox._conexao().execute('SELECT "tentativas", "proxima_tentativa" FROM "outbox"').fetchone()
+    return registro["tentativas"], registro["proxima_tentativa"] - time.time()
+
+
+def test_espera_pelas_tentativas_gravadas(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"), espera_maxima=300)
+    outbox.registrar("req", [["a"]], "req:CVT-1:x", numero_cvt="CVT-1")
+    lido = outbox.pendentes()[0]
+    # Outro envio contou tentativas depois da leitura do item
+    outbox.iniciar_tentativa([lido["id"]])
+    outbox.iniciar_tentativa([lido["id"]])
+    outbox.marcar_falha([lido], "erro")
+    tentativas, espera = espera_e_tentativas(outbox)
+    assert tentativas == 2
+    assert 3 < espera <= 4
+
+    # Falha antes de iniciar_tentativa: contada no mesmo UPDATE
+    outbox.marcar_falha([lido], "erro", contada=False)
+    tentativas, espera = espera_e_tentativas(outbox)
+    assert tentativas == 3
+    assert 7 < espera <= 8
+
+    for _ in range(80):
+        outbox.marcar_falha([lido], "erro", contada=False)
+    assert 299 < espera_e_tentativas(outbox)[1] <= 300
+
+
+def test_falha_na_conferencia_aumenta_a_espera(storage):
+    storage.inserir("req", [requisicao("CVT-1", "A", "2026-10-01T10:00:00")])
+    item = storage.outbox.pendentes()[0]
+    storage.outbox.iniciar_tentativa([item["id"]])
+
+    def consultar_indisponivel(*args, **kwargs):
+        raise RuntimeError("destino fora do ar")
+
+    storage.destino.consultar = consultar_indisponivel
+    storage.enviador.enviar_pendentes()
+    assert espera_e_tentativas(storage.outbox)[0] == 2
@@ -0,0 +1,72 @@
+import pytest
+
+from fake_sheets import FakeClient
+from storage import REQ_COLUMNS, SHEET_NAME, TABELAS, CSVStorage, SheetsStorage
+
+# Cinco worksheets legadas de 1000 x 20
+CELULAS_LEGADO = 5 * 1000 * 20
+
+
+def requisicao(numero_cvt, created_at):
+    valores = {
+        "created_at": created_at, "tecnico": "T1", "numero_cvt": numero_cvt, "ordem_id": "",
+        "peca_codigo": "P1", "peca_descricao": "P1", "quantidade": 1, "status": "PENDENTE",
+        "prioridade": "NORMAL", "observacoes": "",
+    }
+    return [valores[coluna] for coluna in REQ_COLUMNS]
+
+
+@pytest.fixture
+def planilha():
+    cliente = FakeClient()
+    planilha = cliente.create(SHEET_NAME)
+    for tabela in TABELAS.values():
+        planilha.add_worksheet(tabela["sheet"], rows=1000, cols=20)
+    return cliente, planilha
+
+
+def sheets_storage(cliente, planilha, tmp_path, limite_celulas):
+    existentes = planilha.worksheets()
+    worksheets = {
+        chave: next(w for w in existentes if w.title == tabela["sheet"])
+        for chave, tabela in TABELAS.items()
+    }
+    return SheetsStorage(
+        worksheets, local=CSVStorage(str(tmp_path)), planilha=planilha, cliente=cliente,
+        existentes=existentes, particionar=True, limite_celulas=limite_celulas,
+    )
+
+
+def test_grade_da_particao_cresce_com_os_appends(planilha, tmp_path):
+    cliente, principal = planilha
+    storage = sheets_storage(cliente, principal, tmp_path, limite_celulas=CELULAS_LEGADO + 5000)
+
+    storage.inserir("req", [requisicao(f"CVT-{i}", "2026-10-01T10:00:00") for i in range(150)])
+
+    worksheet = storage._particoes["req"]["2026-10"]
+    assert worksheet.row_count == 151
+    assert [p.title for p in storage.planilhas] == [SHEET_NAME]
+    assert len(storage.consultar("req", desde="2026-10-01")) == 150
+
+
+def test_capacidade_pelas_celulas_em_uso(planilha, tmp_path):
+    cliente, principal = planilha
+    colunas = len(REQ_COLUMNS)
+    # Cabe o mês de outubro (301 linhas), mas não outro mês do mesmo tamanho
+    storage = sheets_storage(
+        cliente, principal, tmp_path, limite_celulas=CELULAS_LEGADO + 301 * colunas + 2000,
+    )
+
+    storage.inserir("req", [requisicao(f"CVT-{i}", "2026-10-01T10:00:00") for i in range(300)])
+    storage.inserir("req", [requisicao("CVT-N", "2026-11-01T10:00:00")])
+
+    assert [p.title for p in storage.planilhas] == [SHEET_NAME, f"{SHEET_NAME}_2"]
+    assert storage._planilha_da_particao[("req", "2026-10")] is principal
+    assert storage._planilha_da_particao[("req", "2026-11")] is storage.planilhas[1]
+
+    # Reinício: a planilha auxiliar é redescoberta
+    reiniciado = sheets_storage(
+        cliente, principal, tmp_path, limite_celulas=CELULAS_LEGADO + 301 * colunas + 2000,
+    )
+    assert reiniciado.particoes("req") == ["2026-10", "2026-11"]
+    assert len(reiniciado.ler_tabela("req")) == 301
@@ -0,0 +1,21 @@
+import senhas
+
+
+def test_texto_puro_paga_a_derivacao(monkeypatch):
+    derivacoes = []
+    derivar = senhas._derivar
+    monkeypatch.setattr(senhas, "_derivar", lambda *args: derivacoes.append(args) or derivar(*args))
+    senhas.verificar_ficticio("aquecimento")
+    derivacoes.clear()
+
+    assert senhas.verificar("abc", "abc")
+    assert not senhas.verificar("errada", "abc")
+    assert [iteracoes for _, _, iteracoes in derivacoes] == [senhas.ITERACOES] * 2
+
+
+def test_hash():
+    armazenado = senhas.gerar_hash("abc", iteracoes=1000)
+    assert senhas.verificar("abc", armazenado)
+    assert not senhas.verificar("abd", armazenado)
+    assert not senhas.precisa_atualizar(senhas.gerar_hash("abc"))
+    assert senhas.precisa_atualizar("abc")
@@ -0,0 +1,63 @@
+import datetime
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+pytest.importorskip("pyarrow")
+
+PASTA_APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".streamlit")
+
+
+def script(pasta_app, mes_antigo):
+    import datetime
+    import sys
+
+    import streamlit as st
+
+    sys.path.insert(0, pasta_app)
+    from snapshots import gerar_snapshots
+
+    # O app sem a chamada de main(): só as funções, como num import
+    with open(f"{pasta_app}/app.py", encoding="utf-8") as f:
+        fonte = f.read().replace("\nif __name__", "\nif False and __name__")
+    app = {"__name__": "app"}
+    exec(compile(fonte, "app.py", "exec"), app)
+
+    storage = app["get_storage"]()
+    destino = getattr(storage, "destino", storage)
+    agora = datetime.datetime.now().isoformat()
+    destino.inserir("req", [
+        [f"{mes_antigo}-05T10:00:00", "T1", "CVT-0", "", "P1", "Botoeira", 1, "PENDENTE", "NORMAL", ""],
+        [f"{mes_antigo}-05T10:00:00", "T1", "CVT-0", "", "P2", "Motor", 2, "PENDENTE", "NORMAL", ""],
+        [f"{mes_antigo}-06T10:00:00", "T2", "CVT-1", "", "P1", "Botoeira", 1, "PENDENTE", "NORMAL", ""],
+        [agora, "T1", "CVT-2", "", "P2", "Motor", 1, "PENDENTE", "NORMAL", ""],
+    ])
+    gerar_snapshots(storage, app["SNAPSHOT_PASTA"])
+    app["get_cache_tabelas"]().invalidar()
+    app["read_all_requisicoes"]()
+
+    eventos = app["get_telemetria"]().eventos
+    servidor = app["get_client_and_worksheets"]()["client"]._client.server
+    chamadas = sum(servidor.chamadas.values())
+    pecas = app["pecas_da_cvt"]("CVT-0", datetime.datetime.fromisoformat(f"{mes_antigo}-05T10:00:00"))
+    st.session_state["pecas"] = [peca["peca_codigo"] for peca in pecas]
+    st.session_state["falhas"] = eventos["snapshot_falha:req"]
+    st.session_state["chamadas"] = sum(servidor.chamadas.values()) - chamadas
+
+
+def test_pecas_de_cvt_antiga_vem_do_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CVT_FAKE_SHEETS", "1")
+    monkeypatch.setenv("CVT_SNAPSHOT_INTERVALO", "0")
+    hoje = datetime.date.today().replace(day=1)
+    mes_antigo = (hoje - datetime.timedelta(days=40)).strftime("%Y-%m")
+
+    at = AppTest.from_function(script, args=(PASTA_APP, mes_antigo), default_timeout=120)
+    at.run()
+
+    assert not at.exception
+    assert at.session_state["pecas"] == ["P1", "P2"]
+    assert at.session_state["falhas"] == 0
+    # Meses fechados lidos do snapshot: nenhuma chamada à API do Sheets
+    assert at.session_state["chamadas"] == 0